@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AnalyticsEvent
+from .models import AnalyticsEvent, ChannelDailyStat
 
 
 @admin.register(AnalyticsEvent)
@@ -8,20 +8,21 @@ class AnalyticsEventAdmin(admin.ModelAdmin):
     Admin for AnalyticsEvent model.
     """
     list_display = (
-        'id', 'timestamp', 'event_type', 'page', 'language', 'session_id'
+        'id', 'timestamp', 'event_type', 'page', 'language', 'channel', 'session_id'
     )
     
     list_filter = (
-        'event_type', 'language', 'timestamp'
+        'event_type', 'language', 'channel', 'timestamp'
     )
     
     search_fields = (
-        'page', 'session_id', 'ip_address'
+        'page', 'session_id', 'ip_address', 'referrer_domain', 'utm_campaign'
     )
     
     readonly_fields = (
         'event_type', 'page', 'language', 'referrer',
-        'ip_address', 'user_agent', 'session_id', 'metadata', 'timestamp'
+        'ip_address', 'user_agent', 'session_id', 'metadata', 'timestamp',
+        'referrer_domain', 'channel', 'utm_source', 'utm_medium', 'utm_campaign'
     )
     
     date_hierarchy = 'timestamp'
@@ -35,3 +36,22 @@ class AnalyticsEventAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         """Make events read-only."""
         return False
+
+
+
+@admin.register(ChannelDailyStat)
+class ChannelDailyStatAdmin(admin.ModelAdmin):
+    """
+    Read-only daily channel rollups.
+    """
+    list_display = ('date', 'channel', 'utm_source', 'utm_campaign', 'event_type', 'count')
+    list_filter = ('channel', 'event_type', 'date')
+    search_fields = ('utm_source', 'utm_campaign')
+    readonly_fields = ('date', 'channel', 'utm_source', 'utm_campaign', 'event_type', 'count')
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
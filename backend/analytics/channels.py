@@ -0,0 +1,110 @@
+"""
+Acquisition channel classification.
+
+Each event's referrer domain, UTM tags and channel are parsed once when it
+is tracked and stored in their own columns, so reports group by small
+indexed values instead of parsing URLs. The domain -> channel lookup is
+memoized: the number of distinct referrer domains is small.
+"""
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+
+UTM_MAX_LENGTH = 100
+
+SEARCH_DOMAINS = (
+    'google', 'yandex', 'bing.com', 'duckduckgo.com', 'yahoo.com',
+    'baidu.com', 'go.mail.ru', 'ecosia.org', 'search.brave.com',
+)
+SOCIAL_DOMAINS = (
+    'facebook.com', 'fb.com', 'instagram.com', 't.me', 'telegram.org', 'telegram.me',
+    'vk.com', 'ok.ru', 'twitter.com', 'x.com', 't.co', 'linkedin.com', 'lnkd.in',
+    'youtube.com', 'youtu.be', 'tiktok.com', 'pinterest.com', 'reddit.com',
+)
+EMAIL_DOMAINS = (
+    'mail.google.com', 'e.mail.ru', 'mail.yandex.ru', 'mail.yandex.com',
+    'outlook.live.com', 'outlook.office.com', 'mail.yahoo.com',
+)
+# utm_medium values -> channel (anything else falls back to the referrer)
+MEDIUM_CHANNELS = {
+    'cpc': 'paid', 'ppc': 'paid', 'paid': 'paid', 'paidsearch': 'paid',
+    'cpm': 'paid', 'cpv': 'paid', 'display': 'paid', 'banner': 'paid', 'paid_social': 'paid',
+    'email': 'email', 'e-mail': 'email', 'newsletter': 'email',
+    'social': 'social', 'social-network': 'social', 'social-media': 'social', 'sm': 'social',
+    'organic': 'organic',
+    'referral': 'referral',
+}
+
+
+def referrer_domain(url):
+    """Host of a URL without a leading ``www.``, or '' when there is none."""
+    try:
+        host = urlsplit(url).hostname or ''
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+@lru_cache(maxsize=1)
+def internal_hosts():
+    """Hosts of the site itself (ALLOWED_HOSTS and the frontend origins)."""
+    hosts = {host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'}
+    hosts.update(referrer_domain(origin) for origin in settings.CORS_ALLOWED_ORIGINS)
+    hosts.discard('')
+    return frozenset(hosts)
+
+
+def _matches(domain, patterns):
+    for pattern in patterns:
+        if '.' not in pattern:
+            # Bare brand name: google.com, google.co.uz, ...
+            if f'.{pattern}.' in f'.{domain}':
+                return True
+        elif domain == pattern or domain.endswith(f'.{pattern}'):
+            return True
+    return False
+
+
+@lru_cache(maxsize=4096)
+def classify_domain(domain):
+    """Channel of a referrer domain."""
+    if not domain:
+        return 'direct'
+    if domain in internal_hosts():
+        return 'internal'
+    # Webmail is checked first: mail.google.com is not a search referral
+    if _matches(domain, EMAIL_DOMAINS):
+        return 'email'
+    if _matches(domain, SEARCH_DOMAINS):
+        return 'organic'
+    if _matches(domain, SOCIAL_DOMAINS):
+        return 'social'
+    return 'referral'
+
+
+def classify(page, referrer):
+    """
+    Acquisition columns for an event.
+
+    Args:
+        page: page URL or path, possibly with utm_* query parameters
+        referrer: referrer URL
+
+    Returns:
+        dict: referrer_domain, channel, utm_source, utm_medium, utm_campaign
+    """
+    try:
+        query = parse_qs(urlsplit(page or '').query)
+    except ValueError:
+        query = {}
+    utm = {
+        field: (query.get(field) or [''])[0].strip().lower()[:UTM_MAX_LENGTH]
+        for field in ('utm_source', 'utm_medium', 'utm_campaign')
+    }
+    domain = referrer_domain(referrer or '')[:255]
+    channel = MEDIUM_CHANNELS.get(utm['utm_medium']) or classify_domain(domain)
+    if channel == 'direct' and utm['utm_source']:
+        # Tagged links opened from apps send no referrer
+        channel = 'referral'
+    return {'referrer_domain': domain, 'channel': channel, **utm}
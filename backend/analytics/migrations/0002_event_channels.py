@@ -0,0 +1,67 @@
+# Generated by Django 5.0 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('channel', models.CharField(choices=[('direct', 'Прямые заходы'), ('organic', 'Поисковые системы'), ('paid', 'Реклама'), ('social', 'Социальные сети'), ('email', 'Email'), ('referral', 'Переходы с сайтов'), ('internal', 'Внутренние переходы')], max_length=20, verbose_name='Канал')),
+                ('utm_source', models.CharField(blank=True, max_length=100, verbose_name='UTM source')),
+                ('utm_campaign', models.CharField(blank=True, max_length=100, verbose_name='UTM campaign')),
+                ('event_type', models.CharField(max_length=50, verbose_name='Тип события')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Статистика каналов',
+                'verbose_name_plural': 'Статистика каналов',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='analyticsevent',
+            name='channel',
+            field=models.CharField(blank=True, choices=[('direct', 'Прямые заходы'), ('organic', 'Поисковые системы'), ('paid', 'Реклама'), ('social', 'Социальные сети'), ('email', 'Email'), ('referral', 'Переходы с сайтов'), ('internal', 'Внутренние переходы')], max_length=20, verbose_name='Канал'),
+        ),
+        migrations.AddField(
+            model_name='analyticsevent',
+            name='referrer_domain',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='Домен реферера'),
+        ),
+        migrations.AddField(
+            model_name='analyticsevent',
+            name='utm_campaign',
+            field=models.CharField(blank=True, max_length=100, verbose_name='UTM campaign'),
+        ),
+        migrations.AddField(
+            model_name='analyticsevent',
+            name='utm_medium',
+            field=models.CharField(blank=True, max_length=100, verbose_name='UTM medium'),
+        ),
+        migrations.AddField(
+            model_name='analyticsevent',
+            name='utm_source',
+            field=models.CharField(blank=True, max_length=100, verbose_name='UTM source'),
+        ),
+        migrations.AddIndex(
+            model_name='analyticsevent',
+            index=models.Index(fields=['channel', '-timestamp'], name='analytics_a_channel_559af9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='analyticsevent',
+            index=models.Index(fields=['utm_campaign', '-timestamp'], name='analytics_a_utm_cam_0a781a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='channeldailystat',
+            constraint=models.UniqueConstraint(fields=('date', 'channel', 'utm_source', 'utm_campaign', 'event_type'), name='unique_channel_daily_stat'),
+        ),
+    ]
@@ -1,9 +1,23 @@
 from django.db import models
 
 
+CHANNEL_CHOICES = [
+    ('direct', 'Прямые заходы'),
+    ('organic', 'Поисковые системы'),
+    ('paid', 'Реклама'),
+    ('social', 'Социальные сети'),
+    ('email', 'Email'),
+    ('referral', 'Переходы с сайтов'),
+    ('internal', 'Внутренние переходы'),
+]
+
+
 class AnalyticsEvent(models.Model):
     """
     Model for tracking analytics events like page views, form interactions, etc.
+
+    Acquisition columns (referrer domain, channel, UTM tags) are parsed from
+    ``referrer`` and ``page`` once at ingest by analytics.channels.
     """
     EVENT_TYPE_CHOICES = [
         ('page_view', 'Page View'),
@@ -25,6 +39,13 @@ class AnalyticsEvent(models.Model):
     user_agent = models.TextField('User Agent', blank=True)
     session_id = models.CharField('Session ID', max_length=100, db_index=True)
     
+    # Acquisition (parsed from referrer and page at ingest)
+    referrer_domain = models.CharField('Домен реферера', max_length=255, blank=True, db_index=True)
+    channel = models.CharField('Канал', max_length=20, choices=CHANNEL_CHOICES, blank=True)
+    utm_source = models.CharField('UTM source', max_length=100, blank=True)
+    utm_medium = models.CharField('UTM medium', max_length=100, blank=True)
+    utm_campaign = models.CharField('UTM campaign', max_length=100, blank=True)
+    
     # Additional Data
     metadata = models.JSONField('Метаданные', default=dict, blank=True, help_text='Дополнительные данные события')
     
@@ -39,7 +60,39 @@ class AnalyticsEvent(models.Model):
             models.Index(fields=['-timestamp']),
             models.Index(fields=['event_type', '-timestamp']),
             models.Index(fields=['session_id', '-timestamp']),
+            models.Index(fields=['channel', '-timestamp']),
+            models.Index(fields=['utm_campaign', '-timestamp']),
         ]
     
     def __str__(self):
         return f"{self.get_event_type_display()} - {self.page} ({self.timestamp})"
+
+
+class ChannelDailyStat(models.Model):
+    """
+    Daily event counts per channel, UTM source and campaign, and event type.
+
+    Updated on every tracked event and rebuilt by backfill_analytics_channels,
+    so channel and campaign breakdowns never scan AnalyticsEvent. Rows are
+    kept when old events are cleaned up.
+    """
+    date = models.DateField('Дата')
+    channel = models.CharField('Канал', max_length=20, choices=CHANNEL_CHOICES)
+    utm_source = models.CharField('UTM source', max_length=100, blank=True)
+    utm_campaign = models.CharField('UTM campaign', max_length=100, blank=True)
+    event_type = models.CharField('Тип события', max_length=50)
+    count = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика каналов'
+        verbose_name_plural = 'Статистика каналов'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'channel', 'utm_source', 'utm_campaign', 'event_type'],
+                name='unique_channel_daily_stat',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.channel}/{self.utm_source}/{self.utm_campaign} {self.event_type}: {self.count}"
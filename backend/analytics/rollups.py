@@ -0,0 +1,129 @@
+"""
+Daily channel rollups.
+
+ChannelDailyStat holds event counts per day, channel, UTM source, UTM
+campaign and event type. The dashboard's channel and campaign breakdowns
+are answered from it instead of grouping the event log.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AnalyticsEvent, ChannelDailyStat
+
+KEY_FIELDS = ('channel', 'utm_source', 'utm_campaign', 'event_type')
+
+
+def event_key(event):
+    """Rollup key for a saved AnalyticsEvent."""
+    return (timezone.localdate(event.timestamp), *(getattr(event, field) for field in KEY_FIELDS))
+
+
+def apply_deltas(deltas):
+    """
+    Apply rollup changes.
+
+    Args:
+        deltas: mapping of rollup key -> change in count
+    """
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        lookup = dict(zip(('date',) + KEY_FIELDS, key))
+        if ChannelDailyStat.objects.filter(**lookup).update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                ChannelDailyStat.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Another worker created the row in the meantime
+            ChannelDailyStat.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def record(event):
+    """Count a newly tracked event."""
+    apply_deltas({event_key(event): 1})
+
+
+def count_queryset(queryset):
+    """
+    Aggregate an AnalyticsEvent queryset into rollup keys in a single query.
+
+    Returns:
+        Counter: rollup key -> number of events
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(day=TruncDate('timestamp'))
+        .values('day', *KEY_FIELDS)
+        .annotate(total=Count('id'))
+    )
+    return Counter({
+        (row['day'], *(row[field] for field in KEY_FIELDS)): row['total']
+        for row in rows
+    })
+
+
+def rebuild():
+    """
+    Recompute the rollups for the days that still have events.
+
+    Older rows are kept, since their events may have been cleaned up.
+
+    Returns:
+        int: number of rollup rows written
+    """
+    first = AnalyticsEvent.objects.aggregate(first=Min('timestamp'))['first']
+    if first is None:
+        return 0
+    since = timezone.localdate(first)
+    actual = count_queryset(AnalyticsEvent.objects.all())
+    with transaction.atomic():
+        ChannelDailyStat.objects.filter(date__gte=since).delete()
+        ChannelDailyStat.objects.bulk_create([
+            ChannelDailyStat(count=count, **dict(zip(('date',) + KEY_FIELDS, key)))
+            for key, count in actual.items()
+        ], batch_size=500)
+    return len(actual)
+
+
+def get_breakdowns(days=30, limit=20):
+    """
+    Page views and form submissions by channel and by campaign.
+
+    Returns:
+        tuple: (by_channel dict, by_campaign list of the top ``limit`` campaigns)
+    """
+    start = timezone.localdate() - timedelta(days=days - 1)
+    queryset = ChannelDailyStat.objects.filter(date__gte=start)
+    totals = {
+        'page_views': Sum('count', filter=Q(event_type='page_view')),
+        'form_submissions': Sum('count', filter=Q(event_type='form_submit')),
+    }
+
+    by_channel = {
+        row['channel']: {
+            'page_views': row['page_views'] or 0,
+            'form_submissions': row['form_submissions'] or 0,
+        }
+        for row in queryset.values('channel').annotate(**totals)
+    }
+    by_campaign = [
+        {
+            'utm_source': row['utm_source'],
+            'utm_campaign': row['utm_campaign'],
+            'page_views': row['page_views'] or 0,
+            'form_submissions': row['form_submissions'] or 0,
+        }
+        for row in (
+            queryset.exclude(utm_campaign='')
+            .values('utm_source', 'utm_campaign')
+            .annotate(**totals)
+            .order_by(F('page_views').desc(nulls_last=True), 'utm_campaign')[:limit]
+        )
+    ]
+    return by_channel, by_campaign
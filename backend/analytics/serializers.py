@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import AnalyticsEvent
+from . import channels
 
 
 class AnalyticsEventSerializer(serializers.ModelSerializer):
@@ -22,6 +23,11 @@ class AnalyticsEventCreateSerializer(serializers.ModelSerializer):
             'event_type', 'page', 'language',
             'referrer', 'session_id', 'metadata'
         ]
+    
+    def create(self, validated_data):
+        """Parse the referrer domain, channel and UTM tags once, at ingest."""
+        validated_data.update(channels.classify(validated_data.get('page'), validated_data.get('referrer')))
+        return super().create(validated_data)
 
 
 class DashboardStatsSerializer(serializers.Serializer):
@@ -35,4 +41,6 @@ class DashboardStatsSerializer(serializers.Serializer):
     top_pages = serializers.ListField()
     events_by_type = serializers.DictField()
     events_by_language = serializers.DictField()
+    by_channel = serializers.DictField()
+    by_campaign = serializers.ListField()
     daily_stats = serializers.ListField()
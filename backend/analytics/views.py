@@ -9,18 +9,26 @@ from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from collections import defaultdict
+import logging
+import math
 
 from .models import AnalyticsEvent
+from . import rollups
 from .serializers import (
     AnalyticsEventSerializer,
     AnalyticsEventCreateSerializer,
     DashboardStatsSerializer
 )
 from core.utils.helpers import get_client_ip, get_user_agent
+from core.pagination import TimestampCursorPagination
+from core.ratelimit import rate_limit
+
+logger = logging.getLogger('analytics')
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@rate_limit('track_event')
 def track_event(request):
     """
     Public endpoint for tracking analytics events from frontend.
@@ -33,10 +41,28 @@ def track_event(request):
         - session_id: str (required) - Session identifier
         - metadata: dict (optional) - Additional event data
     
+    Rate limited per IP with its own budget (RATE_LIMITS['track_event']).
+    
     Returns:
         201: Event tracked successfully
         400: Validation error
+        429: Rate limit exceeded
     """
+    if request.limited:
+        logger.warning(f"Event rate limit exceeded for IP: {get_client_ip(request)}")
+        return Response(
+            {
+                'success': False,
+                'error': {
+                    'code': 429,
+                    'message': 'Слишком много запросов. Попробуйте позже.',
+                    'details': {}
+                }
+            },
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(math.ceil(request.retry_after))}
+        )
+    
     serializer = AnalyticsEventCreateSerializer(data=request.data)
     
     if serializer.is_valid():
@@ -45,6 +71,7 @@ def track_event(request):
             ip_address=get_client_ip(request),
             user_agent=get_user_agent(request),
         )
+        rollups.record(event)
         
         return Response(
             {'success': True, 'event_id': event.id},
@@ -70,6 +97,8 @@ def dashboard_stats(request):
         - Page views this week
         - Top pages
         - Events breakdown by type and language
+        - Page views and form submissions by channel and by UTM campaign
+          for the last 30 days (from the daily channel rollups)
         - Daily statistics
     """
     # Calculate date ranges
@@ -137,6 +166,8 @@ def dashboard_stats(request):
             'form_submissions': day_submissions,
         })
     
+    by_channel, by_campaign = rollups.get_breakdowns(days=30)
+    
     stats_data = {
         'total_page_views': total_page_views,
         'unique_sessions': unique_sessions,
@@ -145,6 +176,8 @@ def dashboard_stats(request):
         'top_pages': top_pages,
         'events_by_type': events_by_type,
         'events_by_language': events_by_language,
+        'by_channel': by_channel,
+        'by_campaign': by_campaign,
         'daily_stats': daily_stats,
     }
     
@@ -164,6 +197,7 @@ def analytics_report(request):
         - event_type: Filter by event type
         - language: Filter by language
         - page: Filter by specific page
+        - cursor: Position in the event list (from `next`/`previous`)
     
     Returns filtered analytics events and aggregated statistics.
     """
@@ -204,8 +238,9 @@ def analytics_report(request):
         .values_list('language', 'count')
     )
     
-    # Get recent events (limit to 100)
-    recent_events = queryset.order_by('-timestamp')[:100]
+    # Get recent events (100 per page, keyset pagination via ?cursor=)
+    paginator = TimestampCursorPagination()
+    recent_events = paginator.paginate_queryset(queryset, request)
     events_serializer = AnalyticsEventSerializer(recent_events, many=True)
     
     return Response({
@@ -216,4 +251,6 @@ def analytics_report(request):
             'by_language': by_language,
         },
         'events': events_serializer.data,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
     })
@@ -2,6 +2,17 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from .models import PortfolioItem, Product, ProductImage
+from . import cache, images
+
+# Minimum variant widths for the 80-100px list previews and the 400px
+# preview in the edit form
+THUMBNAIL_WIDTH = 160
+PREVIEW_WIDTH = 640
+
+
+def preview_url(image, variants, width):
+    """URL of a small variant of an image, or of the original until variants exist."""
+    return images.variant_url(variants, width) or image.url
 
 
 @admin.register(PortfolioItem)
@@ -48,7 +59,7 @@ class PortfolioItemAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width: 80px; height: 60px; object-fit: cover; border-radius: 4px;" />',
-                obj.image.url
+                preview_url(obj.image, obj.image_variants, THUMBNAIL_WIDTH)
             )
         return '-'
     image_preview.short_description = 'Превью'
@@ -58,7 +69,7 @@ class PortfolioItemAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 400px; max-height: 300px; border-radius: 4px;" />',
-                obj.image.url
+                preview_url(obj.image, obj.image_variants, PREVIEW_WIDTH)
             )
         return 'Изображение не загружено'
     image_preview_large.short_description = 'Текущее изображение'
@@ -94,12 +105,14 @@ class PortfolioItemAdmin(admin.ModelAdmin):
     def publish_items(self, request, queryset):
         """Опубликовать выбранные элементы."""
         updated = queryset.update(is_published=True)
+        cache.invalidate()
         self.message_user(request, f'{updated} элементов опубликовано')
     publish_items.short_description = 'Опубликовать'
     
     def unpublish_items(self, request, queryset):
         """Снять с публикации."""
         updated = queryset.update(is_published=False)
+        cache.invalidate()
         self.message_user(request, f'{updated} элементов снято с публикации')
     unpublish_items.short_description = 'Снять с публикации'
 
@@ -118,7 +131,7 @@ class ProductImageInline(admin.TabularInline):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width: 100px; height: 75px; object-fit: cover; border-radius: 4px;" />',
-                obj.image.url
+                preview_url(obj.image, obj.image_variants, THUMBNAIL_WIDTH)
             )
         return '-'
     image_preview.short_description = 'Превью'
@@ -181,7 +194,7 @@ class ProductAdmin(admin.ModelAdmin):
         if obj.main_image:
             return format_html(
                 '<img src="{}" style="width: 80px; height: 60px; object-fit: cover; border-radius: 4px;" />',
-                obj.main_image.url
+                preview_url(obj.main_image, obj.main_image_variants, THUMBNAIL_WIDTH)
             )
         return '-'
     main_image_preview.short_description = 'Фото'
@@ -191,7 +204,7 @@ class ProductAdmin(admin.ModelAdmin):
         if obj.main_image:
             return format_html(
                 '<img src="{}" style="max-width: 400px; max-height: 300px; border-radius: 4px;" />',
-                obj.main_image.url
+                preview_url(obj.main_image, obj.main_image_variants, PREVIEW_WIDTH)
             )
         return 'Изображение не загружено'
     main_image_preview_large.short_description = 'Текущее изображение'
@@ -238,20 +251,24 @@ class ProductAdmin(admin.ModelAdmin):
     # Bulk actions
     def publish_products(self, request, queryset):
         updated = queryset.update(is_published=True)
+        cache.invalidate()
         self.message_user(request, f'{updated} продуктов опубликовано')
     publish_products.short_description = 'Опубликовать'
     
     def unpublish_products(self, request, queryset):
         updated = queryset.update(is_published=False)
+        cache.invalidate()
         self.message_user(request, f'{updated} продуктов снято с публикации')
     unpublish_products.short_description = 'Снять с публикации'
     
     def make_featured(self, request, queryset):
         updated = queryset.update(is_featured=True)
+        cache.invalidate()
         self.message_user(request, f'{updated} продуктов добавлено в избранное')
     make_featured.short_description = 'Добавить в избранное'
     
     def remove_featured(self, request, queryset):
         updated = queryset.update(is_featured=False)
+        cache.invalidate()
         self.message_user(request, f'{updated} продуктов убрано из избранного')
     remove_featured.short_description = 'Убрать из избранного'
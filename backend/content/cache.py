@@ -0,0 +1,43 @@
+"""
+Response cache of the content API (portfolio and products).
+
+The catalog changes a few times a week, so list and detail responses are
+cached until a PortfolioItem, Product or ProductImage changes. The catalog
+snapshot (content.snapshot) is rebuilt once the change is committed.
+"""
+import threading
+
+from django.db import transaction
+
+from core.cache import bump_generation, get_generation
+
+CACHE_NAMESPACE = 'content'
+
+
+def invalidate():
+    """Drop every cached content API response and rebuild the catalog snapshot."""
+    bump_generation(CACHE_NAMESPACE)
+    # Bump again once the change is visible: a response, search index or
+    # snapshot built by another worker before the commit read the old data
+    # under the new generation and would otherwise be kept as current.
+    # Several changes in one transaction (e.g. a product and its inline
+    # images) schedule this once, so they lead to one rebuild.
+    connection = transaction.get_connection()
+    if not any(func is committed for _, func, *_ in connection.run_on_commit):
+        transaction.on_commit(committed)
+
+
+_committed = threading.local()
+
+
+def committed():
+    from .snapshot import rebuild_if_outdated
+
+    # Every change bumps the generation right away, so if it is still the
+    # one an earlier commit hook of this thread set, that hook ran after
+    # this change was committed and already covered it (e.g. image variants
+    # saved by the hook before this one invalidated the cache themselves)
+    if getattr(_committed, 'generation', None) == get_generation(CACHE_NAMESPACE):
+        return
+    _committed.generation = bump_generation(CACHE_NAMESPACE)
+    rebuild_if_outdated()
@@ -0,0 +1,312 @@
+"""
+Responsive image variants and image metadata.
+
+Every catalog image (Product.main_image, ProductImage.image and
+PortfolioItem.image) gets downscaled copies at fixed widths in WebP and
+JPEG, stored under ``variants/`` next to the uploads. The API exposes them
+as ``srcset`` strings and the admin shows small variants instead of the
+original uploads.
+
+The same pass stores the image's displayed dimensions (after EXIF
+rotation), its dominant color and a 16px wide WebP preview as a data URI
+(LQIP) in columns next to the image, so the API can return them
+without opening files and the frontend can reserve space and paint a
+placeholder before the image loads.
+
+Variants are generated once the upload is committed. Resizing is CPU
+bound, so several images (a product with its gallery, the backfill) are
+processed in a pool of worker processes. The variant map stored on the
+row records the file it was made from:
+
+    {"source": "products/2024/05/a.jpg",
+     "webp": {"160": "variants/products/2024/05/a-160w.webp", ...},
+     "jpeg": {"160": "variants/products/2024/05/a-160w.jpg", ...}}
+
+A row whose image was replaced is regenerated, and results are only saved
+if the row still has the image they were made from.
+"""
+import base64
+import io
+import logging
+import math
+import os
+import threading
+from functools import lru_cache
+from multiprocessing import Pool
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import ExifTags, Image, ImageOps
+
+from .models import PortfolioItem, Product, ProductImage
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Model -> image field; its variants and metadata are stored in the
+# <field>_variants, <field>_width, <field>_height, <field>_color and
+# <field>_placeholder columns
+IMAGE_FIELDS = {
+    PortfolioItem: 'image',
+    Product: 'main_image',
+    ProductImage: 'image',
+}
+METADATA = ('variants', 'width', 'height', 'color', 'placeholder')
+# Variant format -> (Pillow format, file extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANTS_DIR = 'variants'
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+# Width of the LQIP; the browser scales it up behind a blur
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 40
+# The dominant color is the largest cluster of a small thumbnail
+COLOR_SAMPLE_WIDTH = 64
+COLOR_CLUSTERS = 5
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked
+    django.setup()
+
+
+def target_widths(width):
+    """
+    Variant widths for an image ``width`` pixels wide.
+
+    Images are never upscaled; an image narrower than the largest variant
+    width also gets a re-encoded copy at its own width.
+    """
+    widths = {w for w in settings.IMAGE_VARIANT_WIDTHS if w < width}
+    if width <= max(settings.IMAGE_VARIANT_WIDTHS):
+        widths.add(width)
+    return sorted(widths)
+
+
+def variant_name(name, width, extension):
+    stem = os.path.splitext(name)[0]
+    return f'{VARIANTS_DIR}/{stem}-{width}w.{extension}'
+
+
+def _flatten(image):
+    """RGB copy of an RGBA image on a white background (JPEG has no alpha)."""
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def dominant_color(image):
+    """Hex color of the largest color cluster of an RGB image."""
+    sample = image.resize(
+        (COLOR_SAMPLE_WIDTH, max(round(image.height * COLOR_SAMPLE_WIDTH / image.width), 1)),
+        Image.Resampling.BOX,
+    ) if image.width > COLOR_SAMPLE_WIDTH else image
+    quantized = sample.quantize(colors=COLOR_CLUSTERS, method=Image.Quantize.MEDIANCUT)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def placeholder(image):
+    """Tiny WebP of an image as a data URI."""
+    size = (PLACEHOLDER_WIDTH, max(round(image.height * PLACEHOLDER_WIDTH / image.width), 1))
+    buffer = io.BytesIO()
+    image.resize(size, Image.Resampling.BOX).save(buffer, 'WEBP', quality=PLACEHOLDER_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def render(name):
+    """
+    Generate and store the variants of one stored image and compute its metadata.
+
+    Runs in worker processes; uses the storage but not the database.
+
+    Args:
+        name: storage name of the source image
+
+    Returns:
+        dict: values of the variants, width, height, color and placeholder
+              columns, or None when the image cannot be read
+    """
+    if not name:
+        return {'variants': {}, 'width': None, 'height': None, 'color': '', 'placeholder': ''}
+    try:
+        with default_storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            width, height = image.size
+            if image.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+            widths = target_widths(width)
+            # Let the JPEG decoder downscale by 1/2..1/8 while decoding
+            # when even the largest variant is much smaller than the source
+            scale = widths[-1] / width
+            image.draft(None, (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Cannot generate variants of {name}: {e}")
+        return None
+
+    icc_profile = image.info.get('icc_profile')
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {'source': name, **{fmt: {} for fmt in FORMATS}}
+    # Largest first, each variant resized from the previous one
+    current = image
+    for target in reversed(widths):
+        size = (target, max(round(height * target / width), 1))
+        if current.size != size:
+            current = current.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt, (pil_format, extension, options) in FORMATS.items():
+            frame = _flatten(current) if pil_format == 'JPEG' and current.mode == 'RGBA' else current
+            buffer = io.BytesIO()
+            if icc_profile:
+                options = {**options, 'icc_profile': icc_profile}
+            frame.save(buffer, pil_format, **options)
+            path = variant_name(name, target, extension)
+            # Regenerating must keep the name: the storage would add a suffix
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[fmt][str(target)] = default_storage.save(path, ContentFile(buffer.getvalue()))
+
+    # The smallest variant is plenty for the color and the placeholder
+    flat = _flatten(current) if current.mode == 'RGBA' else current
+    return {
+        'variants': variants,
+        'width': width,
+        'height': height,
+        'color': dominant_color(flat),
+        'placeholder': placeholder(current),
+    }
+
+
+def image_name(instance):
+    return getattr(instance, IMAGE_FIELDS[type(instance)]).name or ''
+
+
+def is_outdated(instance):
+    """Whether the variants and metadata of an instance were not made from its current image."""
+    field = IMAGE_FIELDS[type(instance)]
+    name = image_name(instance)
+    if (getattr(instance, f'{field}_variants') or {}).get('source', '') != name:
+        return True
+    # Variants generated before the metadata columns existed
+    return bool(name) and getattr(instance, f'{field}_width') is None
+
+
+def generate(instances, workers=None):
+    """
+    Generate and save the variants and metadata of catalog images.
+
+    Args:
+        instances: PortfolioItem, Product or ProductImage instances
+        workers: number of processes (default: number of CPUs)
+
+    Returns:
+        int: number of rows whose variants were saved
+    """
+    tasks = [(instance, image_name(instance)) for instance in instances]
+    if not tasks:
+        return 0
+    names = [name for _, name in tasks]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    saved = 0
+
+    def save(results):
+        nonlocal saved
+        for (instance, name), result in zip(tasks, results):
+            if result is None:
+                continue
+            field = IMAGE_FIELDS[type(instance)]
+            values = {f'{field}_{key}': result[key] for key in METADATA}
+            # queryset.update() sends no signals, so this doesn't schedule
+            # another generation; a row whose image was replaced is skipped
+            saved += type(instance).objects.filter(pk=instance.pk, **{field: name}).update(**values)
+            for attname, value in values.items():
+                setattr(instance, attname, value)
+
+    if workers == 1:
+        save(render(name) for name in names)
+    else:
+        # Workers only use the storage: forked database connections stay unused
+        with Pool(workers, initializer=_init_worker) as pool:
+            save(pool.imap(render, names))
+
+    if saved:
+        cache.invalidate()
+    return saved
+
+
+_scheduled = threading.local()
+
+
+def schedule(instance):
+    """Generate the variants of an instance when the current transaction commits."""
+    pending = getattr(_scheduled, 'instances', None)
+    if pending is None:
+        pending = _scheduled.instances = {}
+    pending[(type(instance), instance.pk)] = instance
+    transaction.on_commit(generate_scheduled)
+
+
+def generate_scheduled():
+    """Generate the variants scheduled in this thread, all images in one pool."""
+    pending = getattr(_scheduled, 'instances', None)
+    if not pending:
+        # Already handled by an earlier callback of the same transaction
+        return
+    _scheduled.instances = {}
+    try:
+        generate([instance for instance in pending.values() if is_outdated(instance)])
+    except Exception as e:
+        # The upload itself is saved; the backfill command can retry
+        logger.error(f"Failed to generate image variants: {e}", exc_info=True)
+
+
+@lru_cache(maxsize=16384)
+def media_url(name):
+    """Storage URL of a file, memoized: urljoin() dominates building srcsets."""
+    return default_storage.url(name)
+
+
+def variant_url(variants, width, fmt='webp'):
+    """
+    URL of the smallest variant at least ``width`` pixels wide (the largest
+    one when all are narrower), or None when there are no variants yet.
+    """
+    available = (variants or {}).get(fmt)
+    if not available:
+        return None
+    widths = sorted(int(w) for w in available)
+    chosen = next((w for w in widths if w >= width), widths[-1])
+    return media_url(available[str(chosen)])
+
+
+def srcset(variants, build_url):
+    """
+    ``srcset`` attribute values per format.
+
+    Args:
+        variants: variant map of an image
+        build_url: callable that turns a media URL into the URL to return
+
+    Returns:
+        dict: format -> "url 160w, url 320w, ...", or None when there are no variants yet
+    """
+    if not variants or not variants.get('source'):
+        return None
+    return {
+        fmt: ', '.join(
+            f'{build_url(media_url(path))} {width}w'
+            for width, path in sorted(variants.get(fmt, {}).items(), key=lambda item: int(item[0]))
+        )
+        for fmt in FORMATS
+    }
@@ -0,0 +1,94 @@
+"""
+Data sideloaded into product responses with ``?include=``.
+
+Product pages need the gallery, related products (precomputed from
+co-views, see content.recommendations) and portfolio works of the same
+category. ``include=images,related,portfolio`` returns them in the
+product (or batch) response. The number of queries does not depend on
+the number of products: the gallery is prefetched with an ordered
+queryset (its size is annotated as ``gallery_count``), related products
+are read for all the products at once, and portfolio works for all their
+categories, with a window function keeping only the first few of each
+category.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+
+from .models import PortfolioItem, Product, ProductImage, RelatedProduct
+
+INCLUDES = ('images', 'related', 'portfolio')
+RELATED_LIMIT = 4
+PORTFOLIO_LIMIT = 6
+# Product category -> portfolio category, where the names differ
+PORTFOLIO_CATEGORIES = {
+    'woven_labels': 'woven',
+    'printed_labels': 'printed',
+}
+CATALOG_ORDER = (F('order').asc(), F('created_at').desc())
+
+
+def gallery_prefetch():
+    """Prefetch of the product gallery, in display order."""
+    return Prefetch('images', queryset=ProductImage.objects.order_by('order', 'id'))
+
+
+def first_per_category(queryset, categories, limit):
+    """The first ``limit`` published rows of each category, in catalog order."""
+    return (
+        queryset.filter(is_published=True, category__in=categories)
+        .annotate(category_position=Window(RowNumber(), partition_by=F('category'), order_by=CATALOG_ORDER))
+        .filter(category_position__lte=limit)
+        .order_by('category', 'category_position')
+    )
+
+
+def attach_related(products, limit=RELATED_LIMIT):
+    """
+    Set ``related_products`` of each product.
+
+    Related products are precomputed in RelatedProduct (see
+    content.recommendations). Products added since the last computation
+    get the first others of their category, with one more query.
+    """
+    by_product = defaultdict(list)
+    links = (
+        RelatedProduct.objects
+        .filter(product__in=[p.pk for p in products], related__is_published=True, position__lt=limit)
+        .select_related('related')
+        .order_by('product_id', 'position')
+    )
+    for link in links:
+        by_product[link.product_id].append(link.related)
+    for product in products:
+        product.related_products = by_product[product.pk]
+
+    uncomputed = [p for p in products if not p.related_products]
+    if uncomputed:
+        by_category = defaultdict(list)
+        # One extra per category: the product itself may be among the first
+        for product in first_per_category(Product.objects.all(), {p.category for p in uncomputed}, limit + 1):
+            by_category[product.category].append(product)
+        for product in uncomputed:
+            product.related_products = [p for p in by_category[product.category] if p.pk != product.pk][:limit]
+
+
+def attach_portfolio(products, limit=PORTFOLIO_LIMIT):
+    """Set ``portfolio_items`` of each product: works of its category."""
+    categories = {PORTFOLIO_CATEGORIES.get(p.category, p.category) for p in products}
+    by_category = defaultdict(list)
+    for item in first_per_category(PortfolioItem.objects.all(), categories, limit):
+        by_category[item.category].append(item)
+    for product in products:
+        product.portfolio_items = by_category[PORTFOLIO_CATEGORIES.get(product.category, product.category)]
+
+
+def attach(products, includes):
+    """Load the related products and portfolio works requested in ``includes``."""
+    if not products:
+        return
+    if 'related' in includes:
+        attach_related(products)
+    if 'portfolio' in includes:
+        attach_portfolio(products)
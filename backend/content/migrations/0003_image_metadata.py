@@ -0,0 +1,73 @@
+# Generated by Django 5.0 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0002_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolioitem',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет изображения'),
+        ),
+        migrations.AddField(
+            model_name='portfolioitem',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='portfolioitem',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью для загрузки (LQIP)'),
+        ),
+        migrations.AddField(
+            model_name='portfolioitem',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет изображения'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью для загрузки (LQIP)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='main_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет изображения'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью для загрузки (LQIP)'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-19 14:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0003_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(verbose_name='Позиция')),
+                ('score', models.FloatField(default=0, help_text='Косинусное сходство совместных просмотров', verbose_name='Сходство')),
+                ('source', models.CharField(choices=[('coview', 'Совместные просмотры'), ('category', 'Та же категория')], max_length=20, verbose_name='Источник')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='content.product', verbose_name='Продукт')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='content.product', verbose_name='Похожий продукт')),
+            ],
+            options={
+                'verbose_name': 'Похожий продукт',
+                'verbose_name_plural': 'Похожие продукты',
+                'ordering': ['product', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'position'), name='unique_related_product_position'),
+        ),
+    ]
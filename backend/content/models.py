@@ -16,6 +16,11 @@ class PortfolioItem(models.Model):
     
     # Изображение
     image = models.ImageField('Изображение', upload_to='portfolio/%Y/%m/')
+    image_variants = models.JSONField('Варианты изображения', default=dict, blank=True, editable=False)
+    image_width = models.PositiveIntegerField('Ширина изображения', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField('Высота изображения', null=True, blank=True, editable=False)
+    image_color = models.CharField('Основной цвет изображения', max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField('Превью для загрузки (LQIP)', blank=True, editable=False)
     
     # Названия на разных языках
     title_ru = models.CharField('Название (RU)', max_length=200)
@@ -74,6 +79,11 @@ class Product(models.Model):
     
     # Основное изображение
     main_image = models.ImageField('Основное изображение', upload_to='products/%Y/%m/')
+    main_image_variants = models.JSONField('Варианты изображения', default=dict, blank=True, editable=False)
+    main_image_width = models.PositiveIntegerField('Ширина изображения', null=True, blank=True, editable=False)
+    main_image_height = models.PositiveIntegerField('Высота изображения', null=True, blank=True, editable=False)
+    main_image_color = models.CharField('Основной цвет изображения', max_length=7, blank=True, editable=False)
+    main_image_placeholder = models.TextField('Превью для загрузки (LQIP)', blank=True, editable=False)
     
     # Slug для URL
     slug = models.SlugField('URL slug', unique=True, max_length=200)
@@ -161,6 +171,11 @@ class ProductImage(models.Model):
         verbose_name='Продукт'
     )
     image = models.ImageField('Изображение', upload_to='products/gallery/%Y/%m/')
+    image_variants = models.JSONField('Варианты изображения', default=dict, blank=True, editable=False)
+    image_width = models.PositiveIntegerField('Ширина изображения', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField('Высота изображения', null=True, blank=True, editable=False)
+    image_color = models.CharField('Основной цвет изображения', max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField('Превью для загрузки (LQIP)', blank=True, editable=False)
     caption = models.CharField('Подпись', max_length=200, blank=True)
     order = models.IntegerField('Порядок', default=0)
     
@@ -171,3 +186,44 @@ class ProductImage(models.Model):
     
     def __str__(self):
         return f'{self.product.name_ru} - Фото {self.id}'
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed related products of a product, in display order.
+    
+    Rebuilt by the compute_related_products command (see
+    content.recommendations): products viewed in the same sessions, topped
+    up with products of the same category.
+    """
+    SOURCE_CHOICES = [
+        ('coview', 'Совместные просмотры'),
+        ('category', 'Та же категория'),
+    ]
+    
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='related_links',
+        verbose_name='Продукт'
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий продукт'
+    )
+    position = models.PositiveSmallIntegerField('Позиция')
+    score = models.FloatField('Сходство', default=0, help_text='Косинусное сходство совместных просмотров')
+    source = models.CharField('Источник', max_length=20, choices=SOURCE_CHOICES)
+    
+    class Meta:
+        verbose_name = 'Похожий продукт'
+        verbose_name_plural = 'Похожие продукты'
+        ordering = ['product', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'position'], name='unique_related_product_position'),
+        ]
+    
+    def __str__(self):
+        return f'{self.product.name_ru} → {self.related.name_ru}'
@@ -0,0 +1,203 @@
+"""
+Related products from co-views.
+
+Products viewed in the same session are related. A periodic batch job
+(the compute_related_products command) streams product page views ordered
+by session and counts, for every pair of published products, the sessions
+that viewed both into a product x product matrix. The counts are
+normalized to cosine similarity (co-view sessions divided by the geometric
+mean of the two products' sessions), and the best neighbours of each
+product are stored in RelatedProduct.
+
+Products with too few co-viewed neighbours (new or rarely viewed ones) are
+topped up with products of the same category in catalog order, so the API
+only reads precomputed rows.
+
+Events are never held in memory: pairs of a chunk of sessions are counted
+with NumPy and added to the matrix, whose size depends only on the number
+of products. NumPy is only needed by the batch job; web workers never
+import this module.
+"""
+from collections import defaultdict
+import re
+from urllib.parse import urlsplit
+
+from django.db import transaction
+
+from analytics.models import AnalyticsEvent
+from .models import Product, RelatedProduct
+from .includes import RELATED_LIMIT
+from . import cache
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only the batch job needs it
+    np = None
+
+# Product page paths, with or without the language prefix
+PRODUCT_PAGE_RE = re.compile(r'^/(?:(?:ru|en|uz)/)?(?:products|catalog)/(?P<slug>[-\w]+)/?$')
+# Page view metadata key the frontend may send instead
+PRODUCT_METADATA_KEY = 'product'
+# Sessions viewing more products are crawlers or catalog scans; only the
+# first ones count
+MAX_SESSION_PRODUCTS = 50
+# Pairs buffered before they are added to the matrix
+FLUSH_PAIRS = 1_000_000
+MIN_COVIEWS = 2
+
+
+def product_slug(page, metadata):
+    """Slug of the product a page view is about, or None."""
+    if isinstance(metadata, dict) and isinstance(metadata.get(PRODUCT_METADATA_KEY), str):
+        return metadata[PRODUCT_METADATA_KEY]
+    match = PRODUCT_PAGE_RE.match(urlsplit(page).path)
+    return match['slug'] if match else None
+
+
+def product_views(index, since=None):
+    """
+    Stream (session id, product number) of product page views, by session.
+
+    Args:
+        index: product slug -> product number
+        since: only count views from this time on
+    """
+    queryset = AnalyticsEvent.objects.filter(event_type='page_view').exclude(session_id='')
+    if since is not None:
+        queryset = queryset.filter(timestamp__gte=since)
+    rows = queryset.order_by('session_id', 'timestamp').values_list('session_id', 'page', 'metadata')
+    for session_id, page, metadata in rows.iterator(chunk_size=5000):
+        number = index.get(product_slug(page, metadata))
+        if number is not None:
+            yield session_id, number
+
+
+class CoViewCounter:
+    """Co-view counts of a stream of product views ordered by session."""
+
+    def __init__(self, size):
+        if np is None:
+            raise RuntimeError('NumPy is required to compute related products: pip install numpy')
+        self.size = size
+        self.coviews = np.zeros(size * size, dtype=np.int32)
+        self.views = np.zeros(size, dtype=np.int64)
+        self.events = 0
+        self.sessions = 0
+        self.pairs = []
+
+    def count(self, views):
+        """
+        Count a stream of (session id, product number) pairs.
+
+        Returns:
+            self
+        """
+        current, products = None, {}
+        for session_id, number in views:
+            self.events += 1
+            if session_id != current:
+                self.add_session(products)
+                current, products = session_id, {}
+            if len(products) < MAX_SESSION_PRODUCTS:
+                products[number] = None
+        self.add_session(products)
+        self.flush()
+        return self
+
+    def add_session(self, products):
+        if not products:
+            return
+        self.sessions += 1
+        products = list(products)
+        self.views[products] += 1
+        if len(products) > 1:
+            size = self.size
+            self.pairs.extend(a * size + b for a in products for b in products if a != b)
+            if len(self.pairs) >= FLUSH_PAIRS:
+                self.flush()
+
+    def flush(self):
+        if not self.pairs:
+            return
+        cells, counts = np.unique(np.array(self.pairs, dtype=np.int64), return_counts=True)
+        self.coviews[cells] += counts.astype(np.int32)
+        self.pairs = []
+
+    def similarities(self, min_coviews=MIN_COVIEWS):
+        """Cosine similarity of every pair of products, 0 below ``min_coviews``."""
+        coviews = self.coviews.reshape(self.size, self.size)
+        scores = np.where(coviews >= min_coviews, coviews, 0).astype(np.float64)
+        norms = np.sqrt(self.views.astype(np.float64))
+        norms[norms == 0] = 1
+        scores /= norms[:, None]
+        scores /= norms[None, :]
+        np.fill_diagonal(scores, 0)
+        return scores
+
+
+def top_neighbours(scores, limit):
+    """
+    Best neighbours of every product.
+
+    Returns:
+        list: for each product, (product number, score) of up to ``limit``
+              neighbours with a positive score, best first
+    """
+    size = scores.shape[0]
+    limit = min(limit, size - 1)
+    if limit <= 0:
+        return [[] for _ in range(size)]
+    candidates = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+    return [
+        [(int(number), float(score)) for number, score in zip(row, row_scores) if score > 0]
+        for row, row_scores in zip(candidates.tolist(), candidate_scores.tolist())
+    ]
+
+
+def compute(since=None, limit=RELATED_LIMIT, min_coviews=MIN_COVIEWS):
+    """
+    Related products of every published product.
+
+    Returns:
+        tuple: (unsaved RelatedProduct rows, CoViewCounter with the statistics)
+    """
+    products = list(
+        Product.objects.filter(is_published=True)
+        .order_by('order', '-created_at')
+        .only('id', 'slug', 'category')
+    )
+    index = {product.slug: number for number, product in enumerate(products)}
+    counter = CoViewCounter(len(products)).count(product_views(index, since))
+    neighbours = top_neighbours(counter.similarities(min_coviews), limit)
+
+    by_category = defaultdict(list)
+    for number, product in enumerate(products):
+        by_category[product.category].append(number)
+
+    rows = []
+    for number, product in enumerate(products):
+        chosen = [(other, score, 'coview') for other, score in neighbours[number]]
+        taken = {number, *(other for other, _, _ in chosen)}
+        chosen += [
+            (other, 0.0, 'category') for other in by_category[product.category] if other not in taken
+        ][:limit - len(chosen)]
+        rows.extend(
+            RelatedProduct(
+                product_id=product.pk, related_id=products[other].pk,
+                position=position, score=score, source=source,
+            )
+            for position, (other, score, source) in enumerate(chosen)
+        )
+    return rows, counter
+
+
+def save(rows):
+    """Replace all related products and invalidate the content cache."""
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    cache.invalidate()
@@ -0,0 +1,255 @@
+"""
+In-memory product search with transliteration.
+
+Published products are indexed per worker: names, short descriptions,
+descriptions (all languages) and category labels are split into words and
+reduced to one canonical Latin spelling, so Cyrillic and Latin Uzbek or
+Russian spellings meet (``этикетка`` and ``etiketka``, ``ўраш`` and
+``o'rash`` are the same tokens). Every token is also indexed by its
+prefixes for typeahead.
+
+A query matches the products that contain all of its words, exactly, as a
+prefix, or, for longer words, as a prefix without the last one or two
+letters (covers most inflections: ``этикетки`` finds ``этикетка``). Matches
+are ranked by field weight and match quality, then by the catalog order.
+
+The index is rebuilt from the database when the content cache generation
+changes (see content.cache.invalidate), checked at most once per
+CHECK_INTERVAL, so publishing a product makes it searchable right away.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from core.cache import get_generation
+from .cache import CACHE_NAMESPACE
+from .images import media_url, variant_url
+from .models import Product
+
+LANGUAGES = ('ru', 'en', 'uz')
+# Field -> weight; every language of the field is indexed
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'short_description': 1.5,
+    'description': 1.0,
+}
+EXACT, PREFIX, TRUNCATED = 1.0, 0.7, 0.4
+MIN_PREFIX_LENGTH = 2
+# Query words at least this long also match with up to two letters cut off
+TRUNCATE_FROM_LENGTH = 5
+SUGGEST_IMAGE_WIDTH = 160
+CHECK_INTERVAL = 1.0
+
+WORD_RE = re.compile(r'\w+')
+APOSTROPHES = str.maketrans('', '', "'`ʻʼ‘’")
+CYRILLIC = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'j',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '', 'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'ў': 'o', 'қ': 'k', 'ғ': 'g', 'ҳ': 'h',
+}
+CYRILLIC_TABLE = str.maketrans(CYRILLIC)
+# Latin spellings of the same sound, folded to one
+LATIN_FOLDS = (('kh', 'h'), ('zh', 'j'), ('x', 'h'), ('q', 'k'), ('w', 'v'))
+
+
+def canonical(word):
+    """Canonical Latin spelling of a lowercase word."""
+    word = word.translate(APOSTROPHES).translate(CYRILLIC_TABLE)
+    for spelling, replacement in LATIN_FOLDS:
+        word = word.replace(spelling, replacement)
+    return word
+
+
+def tokenize(text):
+    """Canonical tokens of a text, in order."""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    # Apostrophes are part of Uzbek letters (o', g'), not word breaks
+    text = text.translate(APOSTROPHES)
+    return [token for token in (canonical(word) for word in WORD_RE.findall(text)) if token]
+
+
+class ProductIndex:
+    """Inverted index of a list of products."""
+
+    def __init__(self, products, generation=None):
+        self.generation = generation
+        self.ids = []
+        self.suggestions = []
+        # token -> {document: weight}
+        self.tokens = defaultdict(dict)
+        # proper prefix of a token -> {document: best weight}
+        self.prefixes = defaultdict(dict)
+
+        category_labels = dict(Product.CATEGORY_CHOICES)
+        for document, product in enumerate(products):
+            self.ids.append(product.pk)
+            image = (
+                variant_url(product.main_image_variants, SUGGEST_IMAGE_WIDTH)
+                or (media_url(product.main_image.name) if product.main_image else None)
+            )
+            self.suggestions.append({
+                language: {
+                    'slug': product.slug,
+                    'name': product.get_name(language),
+                    'category': product.category,
+                    'category_display': category_labels.get(product.category, product.category),
+                    'image_url': image,
+                }
+                for language in LANGUAGES
+            })
+            for field, weight in FIELD_WEIGHTS.items():
+                if field == 'category':
+                    texts = [category_labels.get(product.category, ''), product.category.replace('_', ' ')]
+                else:
+                    texts = [getattr(product, f'{field}_{language}') for language in LANGUAGES]
+                for text in texts:
+                    for token in tokenize(text):
+                        self.add(token, document, weight)
+
+    def add(self, token, document, weight):
+        postings = self.tokens[token]
+        if postings.get(document, 0) < weight:
+            postings[document] = weight
+        for length in range(MIN_PREFIX_LENGTH, len(token)):
+            postings = self.prefixes[token[:length]]
+            if postings.get(document, 0) < weight:
+                postings[document] = weight
+
+    def match_word(self, word):
+        """document -> score of one query word."""
+        scores = {}
+        candidates = [(self.tokens.get(word, {}), EXACT), (self.prefixes.get(word, {}), PREFIX)]
+        if len(word) >= TRUNCATE_FROM_LENGTH:
+            for cut in (1, 2):
+                stem = word[:-cut]
+                candidates.append((self.tokens.get(stem, {}), TRUNCATED))
+                candidates.append((self.prefixes.get(stem, {}), TRUNCATED))
+        for postings, quality in candidates:
+            for document, weight in postings.items():
+                score = weight * quality
+                if scores.get(document, 0) < score:
+                    scores[document] = score
+        return scores
+
+    def search(self, query, limit=None):
+        """
+        Ranked documents matching every word of the query.
+
+        Returns:
+            list: document numbers, best first (documents are in catalog order)
+        """
+        words = [word for word in dict.fromkeys(tokenize(query)) if len(word) >= MIN_PREFIX_LENGTH]
+        if not words:
+            return []
+        totals = None
+        # Rarest words first, so the candidate set shrinks quickly
+        for scores in sorted((self.match_word(word) for word in words), key=len):
+            if totals is None:
+                totals = dict(scores)
+            else:
+                totals = {document: total + scores[document] for document, total in totals.items() if document in scores}
+            if not totals:
+                return []
+        key = lambda document: (-totals[document], document)
+        if limit:
+            # Typeahead only needs the top few of possibly many matches
+            return heapq.nsmallest(limit, totals, key=key)
+        return sorted(totals, key=key)
+
+    def search_ids(self, query):
+        return [self.ids[document] for document in self.search(query)]
+
+    def suggest(self, query, language='ru', limit=8):
+        return [
+            self.suggestions[document].get(language) or self.suggestions[document]['ru']
+            for document in self.search(query, limit)
+        ]
+
+
+def build():
+    generation = get_generation(CACHE_NAMESPACE)
+    products = (
+        Product.objects.filter(is_published=True)
+        .order_by('order', '-created_at')
+        .only(
+            'id', 'slug', 'category', 'main_image', 'main_image_variants',
+            *(f'{field}_{language}' for field in ('name', 'short_description', 'description') for language in LANGUAGES),
+        )
+    )
+    return ProductIndex(products, generation)
+
+
+class _IndexHolder:
+    """Per-worker index, rebuilt when the content generation changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        index = self.index
+        if index is not None and now - self.checked_at < CHECK_INTERVAL:
+            return index
+        with self.lock:
+            if self.index is None or now - self.checked_at >= CHECK_INTERVAL:
+                generation = get_generation(CACHE_NAMESPACE)
+                if self.index is None or self.index.generation != generation:
+                    self.index = build()
+                self.checked_at = now
+            return self.index
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+            self.checked_at = 0.0
+
+
+_holder = _IndexHolder()
+
+
+def get_index():
+    return _holder.get()
+
+
+def search_products(queryset, query):
+    """
+    Narrow a Product queryset to the matches of a query.
+
+    Matches are annotated with ``search_rank`` (0 is the best match).
+    """
+    ids = get_index().search_ids(query)
+    if not ids:
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField())).none()
+    rank = Case(*(When(pk=pk, then=position) for position, pk in enumerate(ids)), output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(search_rank=rank)
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Index-backed replacement for SearchFilter on the ``search`` query parameter.
+
+    Results are ordered by relevance unless the client asks for an explicit
+    ``ordering``, so this backend must come after OrderingFilter.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        queryset = search_products(queryset, query)
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('search_rank')
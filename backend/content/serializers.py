@@ -1,8 +1,42 @@
+import re
+
 from rest_framework import serializers
+from core.serializers import FastRepresentationMixin
 from .models import PortfolioItem, Product, ProductImage
+from . import images, includes
+
+# Media paths that build_absolute_uri() returns unchanged after the origin
+SIMPLE_PATH = re.compile(r"/(?!/)[\w.~!*()'%/-]*\Z", re.ASCII)
+
+
+def get_url_builder(context):
+    """
+    build_absolute_uri() of the context request, with the origin computed
+    once per serialization rather than for every URL. Relative URLs are
+    returned as they are without a request.
+    """
+    builder = context.get('_url_builder')
+    if builder is None:
+        request = context.get('request')
+        if request is None:
+            builder = str
+        else:
+            origin = request.build_absolute_uri('/')[:-1]
+            
+            def builder(url):
+                if SIMPLE_PATH.match(url) and '/./' not in url and '/../' not in url:
+                    return origin + url
+                return request.build_absolute_uri(url)
+        context['_url_builder'] = builder
+    return builder
 
 
-class PortfolioItemSerializer(serializers.ModelSerializer):
+def build_srcset(variants, context):
+    """Значения srcset для вариантов изображения с абсолютными URL."""
+    return images.srcset(variants, get_url_builder(context))
+
+
+class PortfolioItemSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     """
     Serializer для элементов портфолио с поддержкой мультиязычности.
     """
@@ -10,11 +44,13 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
     description = serializers.SerializerMethodField()
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = PortfolioItem
         fields = [
-            'id', 'image', 'image_url',
+            'id', 'image', 'image_url', 'image_srcset',
+            'image_width', 'image_height', 'image_color', 'image_placeholder',
             'title', 'title_ru', 'title_en', 'title_uz',
             'description', 'description_ru', 'description_en', 'description_uz',
             'category', 'category_display',
@@ -34,11 +70,12 @@ class PortfolioItemSerializer(serializers.ModelSerializer):
     def get_image_url(self, obj):
         """Получить полный URL изображения."""
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return get_url_builder(self.context)(images.media_url(obj.image.name))
         return None
+    
+    def get_image_srcset(self, obj):
+        """srcset уменьшенных копий изображения по форматам (webp, jpeg)."""
+        return build_srcset(obj.image_variants, self.context)
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -46,22 +83,28 @@ class ProductImageSerializer(serializers.ModelSerializer):
     Serializer для изображений продукта.
     """
     image_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'image_url', 'caption', 'order']
+        fields = [
+            'id', 'image', 'image_url', 'image_srcset',
+            'image_width', 'image_height', 'image_color', 'image_placeholder',
+            'caption', 'order'
+        ]
     
     def get_image_url(self, obj):
         """Получить полный URL изображения."""
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return get_url_builder(self.context)(images.media_url(obj.image.name))
         return None
+    
+    def get_image_srcset(self, obj):
+        """srcset уменьшенных копий изображения по форматам (webp, jpeg)."""
+        return build_srcset(obj.image_variants, self.context)
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     """
     Упрощенный serializer для списка продуктов.
     """
@@ -69,11 +112,13 @@ class ProductListSerializer(serializers.ModelSerializer):
     short_description = serializers.SerializerMethodField()
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     main_image_url = serializers.SerializerMethodField()
+    main_image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = [
-            'id', 'slug', 'main_image', 'main_image_url',
+            'id', 'slug', 'main_image', 'main_image_url', 'main_image_srcset',
+            'main_image_width', 'main_image_height', 'main_image_color', 'main_image_placeholder',
             'name', 'name_ru', 'name_en', 'name_uz',
             'short_description', 'short_description_ru', 'short_description_en', 'short_description_uz',
             'category', 'category_display',
@@ -93,11 +138,12 @@ class ProductListSerializer(serializers.ModelSerializer):
     def get_main_image_url(self, obj):
         """Получить полный URL основного изображения."""
         if obj.main_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.main_image.url)
-            return obj.main_image.url
+            return get_url_builder(self.context)(images.media_url(obj.main_image.name))
         return None
+    
+    def get_main_image_srcset(self, obj):
+        """srcset уменьшенных копий основного изображения по форматам (webp, jpeg)."""
+        return build_srcset(obj.main_image_variants, self.context)
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -110,18 +156,22 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     features_list = serializers.SerializerMethodField()
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     main_image_url = serializers.SerializerMethodField()
+    main_image_srcset = serializers.SerializerMethodField()
     images = ProductImageSerializer(many=True, read_only=True)
+    related = serializers.SerializerMethodField()
+    related_serializer_class = ProductListSerializer
     
     class Meta:
         model = Product
         fields = [
-            'id', 'slug', 'main_image', 'main_image_url',
+            'id', 'slug', 'main_image', 'main_image_url', 'main_image_srcset',
+            'main_image_width', 'main_image_height', 'main_image_color', 'main_image_placeholder',
             'name', 'name_ru', 'name_en', 'name_uz',
             'short_description', 'short_description_ru', 'short_description_en', 'short_description_uz',
             'description', 'description_ru', 'description_en', 'description_uz',
             'category', 'category_display',
             'features', 'features_list',
-            'images', 'is_featured', 'order', 'created_at'
+            'images', 'related', 'is_featured', 'order', 'created_at'
         ]
     
     def get_name(self, obj):
@@ -142,8 +192,82 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     
     def get_main_image_url(self, obj):
         if obj.main_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.main_image.url)
-            return obj.main_image.url
+            return get_url_builder(self.context)(images.media_url(obj.main_image.name))
         return None
+    
+    def get_main_image_srcset(self, obj):
+        return build_srcset(obj.main_image_variants, self.context)
+    
+    def get_related(self, obj):
+        """Похожие продукты: совместные просмотры, затем та же категория."""
+        if not hasattr(obj, 'related_products'):
+            # Views and the snapshot attach them for all products at once
+            includes.attach_related([obj])
+        return self.related_serializer_class(obj.related_products, many=True, context=self.context).data
+
+
+class PortfolioItemCompactSerializer(PortfolioItemSerializer):
+    """
+    Компактный serializer портфолио: только поля на текущем языке (?compact=1).
+    """
+    
+    class Meta(PortfolioItemSerializer.Meta):
+        fields = [
+            'id', 'image_url', 'image_srcset',
+            'image_width', 'image_height', 'image_color', 'image_placeholder',
+            'title', 'description',
+            'category', 'category_display',
+            'order', 'created_at'
+        ]
+
+
+class ProductListCompactSerializer(ProductListSerializer):
+    """
+    Компактный serializer списка продуктов: только поля на текущем языке (?compact=1).
+    """
+    
+    class Meta(ProductListSerializer.Meta):
+        fields = [
+            'id', 'slug', 'main_image_url', 'main_image_srcset',
+            'main_image_width', 'main_image_height', 'main_image_color', 'main_image_placeholder',
+            'name', 'short_description',
+            'category', 'category_display',
+            'is_featured', 'order'
+        ]
+
+
+class ProductDetailCompactSerializer(ProductDetailSerializer):
+    """
+    Компактный детальный serializer продукта: только поля на текущем языке (?compact=1).
+    """
+    related_serializer_class = ProductListCompactSerializer
+    
+    class Meta(ProductDetailSerializer.Meta):
+        fields = [
+            'id', 'slug', 'main_image_url', 'main_image_srcset',
+            'main_image_width', 'main_image_height', 'main_image_color', 'main_image_placeholder',
+            'name', 'short_description', 'description',
+            'category', 'category_display',
+            'features_list',
+            'images', 'related', 'is_featured', 'order', 'created_at'
+        ]
+
+
+def add_included_fields(serializer, includes, compact=False):
+    """
+    Add the sideloaded fields (``?include=``) to a product serializer.
+    
+    The products must come from content.includes: ``gallery_count`` is
+    annotated, and ``related_products`` and ``portfolio_items`` attached.
+    """
+    fields = serializer.child.fields if hasattr(serializer, 'child') else serializer.fields
+    fields['gallery_count'] = serializers.IntegerField(read_only=True)
+    if 'images' in includes and 'images' not in fields:
+        fields['images'] = ProductImageSerializer(many=True, read_only=True)
+    if 'related' in includes and 'related' not in fields:
+        related_class = ProductListCompactSerializer if compact else ProductListSerializer
+        fields['related'] = related_class(source='related_products', many=True, read_only=True)
+    if 'portfolio' in includes:
+        portfolio_class = PortfolioItemCompactSerializer if compact else PortfolioItemSerializer
+        fields['portfolio'] = portfolio_class(source='portfolio_items', many=True, read_only=True)
+    return serializer
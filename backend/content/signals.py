@@ -0,0 +1,39 @@
+"""
+Signal handlers for the Content app.
+
+Generate the responsive variants of uploaded images, and invalidate the
+content API response cache whenever catalog data is saved or deleted.
+Admin bulk actions use queryset.update(), which sends no signals, so they
+invalidate the cache themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import PortfolioItem, Product, ProductImage
+from . import cache, images
+
+
+# Connected first, so variants are generated before the commit hook of the
+# invalidation below runs. Generating them invalidates the cache and
+# rebuilds the snapshot once; that hook then finds the generation unchanged
+# and skips its own rebuild (see content.cache.committed)
+@receiver(post_save, sender=PortfolioItem)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def schedule_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if images.is_outdated(instance):
+        images.schedule(instance)
+
+
+@receiver(post_save, sender=PortfolioItem)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=PortfolioItem)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_content_cache(sender, raw=False, **kwargs):
+    if raw:
+        return
+    cache.invalidate()
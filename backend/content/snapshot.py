@@ -0,0 +1,302 @@
+"""
+Memory-mapped snapshot of the published catalog.
+
+All published products (with their gallery) and portfolio items are
+serialized once per language, in the full and the compact (?compact=1)
+form, and written to a single file: a small JSON
+index followed by the pre-rendered JSON of every list and detail record.
+Every gunicorn worker maps the file read-only, so the records live once in
+the page cache instead of once per worker, and the content API serves
+lists, category filters and details from it without database queries.
+
+The snapshot is rebuilt after any catalog change is committed (see
+content.cache.invalidate) and replaced with os.replace(), so workers
+switch to the new file atomically. It records the content cache
+generation it was built for; a snapshot older than the current
+generation is not used. A worker that keeps finding it outdated well
+after the last change (no commit hook is going to rebuild it, e.g. the
+generation file was reset) rebuilds it in a background thread; a file
+lock keeps workers from building at the same time.
+
+Absolute media URLs depend on the request host, so they are stored with an
+``{{origin}}`` placeholder that is filled in when a response is served.
+"""
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.cache import generation_age, get_generation
+from .cache import CACHE_NAMESPACE
+from . import includes
+from .models import PortfolioItem, Product
+from .serializers import (
+    PortfolioItemCompactSerializer,
+    PortfolioItemSerializer,
+    ProductDetailCompactSerializer,
+    ProductDetailSerializer,
+    ProductListCompactSerializer,
+    ProductListSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PCATSNP1'
+HEADER = struct.Struct('<8sQ')
+FORMAT_VERSION = 3
+LANGUAGES = ('ru', 'en', 'uz')
+ORIGIN_PLACEHOLDER = '{{origin}}'
+# How often a worker checks whether the snapshot file was replaced (seconds)
+CHECK_INTERVAL = 1.0
+# Changes are rebuilt by their commit hook; a snapshot still outdated this
+# long after the last change is rebuilt by the worker that finds it
+REBUILD_GRACE = 10.0
+# Minimum time between two background rebuilds started by a worker
+REBUILD_RETRY = 60.0
+
+
+class _PlaceholderRequest:
+    """Stands in for the request while serializing: absolute URLs get a placeholder origin."""
+
+    def build_absolute_uri(self, location):
+        if urlsplit(location).scheme:
+            return location
+        return ORIGIN_PLACEHOLDER + location
+
+
+def build(path=None):
+    """
+    Serialize the published catalog and atomically replace the snapshot file.
+
+    Returns:
+        dict: snapshot index (generation, counts, sizes)
+    """
+    path = path or settings.CATALOG_SNAPSHOT_PATH
+    # Read before the database so changes made during the build leave the
+    # snapshot marked as outdated
+    generation = get_generation(CACHE_NAMESPACE)
+    products = list(
+        Product.objects.filter(is_published=True)
+        .prefetch_related('images')
+        .order_by('order', '-created_at')
+    )
+    includes.attach_related(products)
+    portfolio = list(PortfolioItem.objects.filter(is_published=True).order_by('order', '-created_at'))
+
+    renderer = JSONRenderer()
+    request = _PlaceholderRequest()
+    blob = bytearray()
+
+    def add(data):
+        content = renderer.render(data)
+        offset = len(blob)
+        blob.extend(content)
+        return [offset, len(content)]
+
+    languages = {}
+    for language in LANGUAGES:
+        context = {'request': request, 'language': language}
+        product_data = zip(
+            products,
+            ProductListSerializer(products, many=True, context=context).data,
+            ProductDetailSerializer(products, many=True, context=context).data,
+            ProductListCompactSerializer(products, many=True, context=context).data,
+            ProductDetailCompactSerializer(products, many=True, context=context).data,
+        )
+        portfolio_data = zip(
+            portfolio,
+            PortfolioItemSerializer(portfolio, many=True, context=context).data,
+            PortfolioItemCompactSerializer(portfolio, many=True, context=context).data,
+        )
+        languages[language] = {
+            'products': [
+                [product.slug, product.category, product.is_featured, *(add(data) for data in records)]
+                for product, *records in product_data
+            ],
+            'portfolio': [
+                [item.pk, item.category, *(add(data) for data in records)]
+                for item, *records in portfolio_data
+            ],
+        }
+
+    index = {
+        'version': FORMAT_VERSION,
+        'generation': generation,
+        'built_at': timezone.now().isoformat(),
+        'products': len(products),
+        'portfolio': len(portfolio),
+        'size': len(blob),
+        'languages': languages,
+    }
+    index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or None, prefix='.catalog-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(index_bytes)))
+            f.write(index_bytes)
+            f.write(blob)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return index
+
+
+class CatalogSnapshot:
+    """Read-only view of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+        magic, index_length = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'Not a catalog snapshot: {path}')
+        index = json.loads(self.mm[HEADER.size:HEADER.size + index_length])
+        if index.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot version: {index.get('version')}")
+        self.base = HEADER.size + index_length
+        self.generation = index['generation']
+        self.languages = index['languages']
+        self.products_by_slug = {
+            language: {entry[0]: entry for entry in data['products']}
+            for language, data in self.languages.items()
+        }
+        self.portfolio_by_id = {
+            language: {entry[0]: entry for entry in data['portfolio']}
+            for language, data in self.languages.items()
+        }
+
+    def record(self, ref):
+        offset, length = ref
+        start = self.base + offset
+        return self.mm[start:start + length]
+
+    def join(self, refs):
+        """JSON array of several records."""
+        return b'[' + b','.join(self.record(ref) for ref in refs) + b']'
+
+
+class _SnapshotHolder:
+    """Per-worker snapshot that is reopened when the file is replaced."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.rebuild_started_at = None
+
+    def get(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < CHECK_INTERVAL:
+            return self.snapshot
+        with self.lock:
+            self.checked_at = now
+            path = settings.CATALOG_SNAPSHOT_PATH
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.snapshot = None
+                return None
+            current = self.snapshot
+            if current is None or current.file_id != (stat.st_ino, stat.st_mtime_ns):
+                try:
+                    # The old map is released once no request uses it
+                    self.snapshot = CatalogSnapshot(path)
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"Failed to open catalog snapshot {path}: {e}")
+                    self.snapshot = None
+            return self.snapshot
+
+    def request_rebuild(self):
+        """Rebuild an outdated snapshot in the background, unless one is due."""
+        now = time.monotonic()
+        with self.lock:
+            if self.rebuild_started_at is not None and now - self.rebuild_started_at < REBUILD_RETRY:
+                return
+            if generation_age(CACHE_NAMESPACE) < REBUILD_GRACE:
+                return
+            self.rebuild_started_at = now
+        threading.Thread(target=_rebuild_in_background, name='catalog-snapshot', daemon=True).start()
+
+    def reset(self):
+        with self.lock:
+            self.snapshot = None
+            self.checked_at = 0.0
+            self.rebuild_started_at = None
+
+
+_holder = _SnapshotHolder()
+
+
+def get_snapshot(rebuild=True):
+    """
+    The current snapshot, or None when it is missing or outdated.
+
+    Args:
+        rebuild: start a background rebuild when the snapshot is outdated
+    """
+    snapshot = _holder.get()
+    if snapshot is not None and snapshot.generation == get_generation(CACHE_NAMESPACE):
+        return snapshot
+    if rebuild:
+        _holder.request_rebuild()
+    return None
+
+
+def rebuild_if_outdated(wait=True):
+    """
+    Rebuild the snapshot unless it already matches the current generation.
+
+    Args:
+        wait: wait for a rebuild running in another worker, then check
+              again; otherwise leave it to that worker
+    """
+    path = settings.CATALOG_SNAPSHOT_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        snapshot = _holder.get(force=True)
+        if snapshot is not None and snapshot.generation == get_generation(CACHE_NAMESPACE):
+            return
+        try:
+            index = build(path)
+        except Exception as e:
+            # The API falls back to the database until the next successful build
+            logger.error(f"Failed to build catalog snapshot: {e}", exc_info=True)
+            return
+        # This worker replaced the file: reopen it on the next request
+        _holder.checked_at = 0.0
+    logger.info(
+        f"Catalog snapshot rebuilt: {index['products']} products, "
+        f"{index['portfolio']} portfolio items, {index['size']} bytes"
+    )
+
+
+def _rebuild_in_background():
+    try:
+        rebuild_if_outdated(wait=False)
+    finally:
+        connections.close_all()
@@ -1,3 +1,140 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from core.cache import bump_generation, get_generation
+from . import cache as content_cache, search, snapshot
+from .cache import CACHE_NAMESPACE
+from .models import Product
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class ContentTestMixin:
+    """Isolated cache, media, catalog snapshot and in-memory index per test."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(
+            CACHES=LOCMEM_CACHES, CATALOG_SNAPSHOT_PATH=f'{directory}/catalog.snapshot',
+            RESPONSE_CACHE_GENERATION_DIR=f'{directory}/generations', MEDIA_ROOT=f'{directory}/media',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for holder in (search._holder, snapshot._holder):
+            holder.reset()
+            self.addCleanup(holder.reset)
+        content_cache._committed.__dict__.clear()
+
+    def create_product(self, **fields):
+        return Product.objects.create(**{
+            'slug': 'satin-label', 'name_ru': 'Атласная этикетка', 'description_ru': 'Мягкая лента',
+            'category': 'woven_labels', 'main_image': 'products/satin.jpg', 'is_published': True,
+            **fields,
+        })
+
+
+class ContentTestCase(ContentTestMixin, TestCase):
+    pass
+
+
+class ImageVariantRebuildTests(ContentTestMixin, TransactionTestCase):
+    """Saving a product with a new image rebuilds the snapshot once."""
+
+    def test_one_rebuild_per_save(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), (200, 30, 60)).save(buffer, 'JPEG')
+        image = SimpleUploadedFile('satin.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+        with mock.patch.object(snapshot, 'build', wraps=snapshot.build) as build:
+            with transaction.atomic():
+                product = self.create_product(main_image=image)
+
+        self.assertEqual(build.call_count, 1)
+        product.refresh_from_db()
+        self.assertEqual(product.main_image_variants['source'], product.main_image.name)
+        self.assertIsNotNone(snapshot.get_snapshot())
+
+
+class ResponseCacheOriginTests(ContentTestCase):
+    """Cached bodies hold absolute URLs, so each origin has its own entries."""
+
+    @override_settings(ALLOWED_HOSTS=['internal-backend', 'www.shop.example'])
+    def test_hosts_do_not_share_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_product()
+        url = '/api/content/products/'
+
+        internal = self.client.get(url, HTTP_HOST='internal-backend:8000')
+        public = self.client.get(url, HTTP_HOST='www.shop.example')
+        again = self.client.get(url, HTTP_HOST='www.shop.example')
+
+        self.assertIn(b'http://internal-backend:8000/media/', internal.content)
+        self.assertEqual(public['X-Cache'], 'MISS')
+        self.assertIn(b'http://www.shop.example/media/', public.content)
+        self.assertNotIn(b'internal-backend', public.content)
+        self.assertEqual(again['X-Cache'], 'HIT')
+
+
+class CatalogSnapshotGenerationTests(ContentTestCase):
+    """The snapshot stays usable when the response cache culls entries."""
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_product()
+
+    def test_generation_survives_cache_eviction(self):
+        self.assertIsNotNone(snapshot.get_snapshot())
+
+        cache.clear()
+        snapshot._holder.checked_at = 0.0
+
+        self.assertIsNotNone(snapshot.get_snapshot())
+
+    def test_outdated_snapshot_is_rebuilt_once(self):
+        bump_generation(CACHE_NAMESPACE)
+        with mock.patch.object(snapshot.threading, 'Thread') as thread:
+            with mock.patch.object(snapshot, 'generation_age', return_value=0):
+                self.assertIsNone(snapshot.get_snapshot())
+            thread.assert_not_called()
+
+            with mock.patch.object(snapshot, 'generation_age', return_value=snapshot.REBUILD_GRACE + 1):
+                self.assertIsNone(snapshot.get_snapshot())
+                self.assertIsNone(snapshot.get_snapshot())
+            thread.assert_called_once()
+
+        snapshot.rebuild_if_outdated(wait=False)
+        self.assertIsNotNone(snapshot.get_snapshot())
+
+    def test_search_responses_are_not_cached(self):
+        response = self.client.get('/api/content/products/', {'search': 'атласная'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertEqual(self.client.get('/api/content/products/')['X-Cache'], 'MISS')
+
+
+class SearchIndexInvalidationTests(ContentTestCase):
+    """An index built while a product change is uncommitted must not stay current."""
+
+    def test_product_saved_in_transaction_is_found_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                product = self.create_product()
+                # Another worker refreshes its index now: it reads the
+                # generation, then the rows committed so far
+                search._holder.index = search.ProductIndex(
+                    Product.objects.exclude(pk=product.pk), get_generation(CACHE_NAMESPACE)
+                )
+
+        with mock.patch.object(search, 'CHECK_INTERVAL', 0):
+            self.assertEqual(search.get_index().search_ids('атласная'), [product.pk])
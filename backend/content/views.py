@@ -2,26 +2,301 @@
 Views and API endpoints for the Content app (Portfolio & Products).
 """
 from rest_framework import viewsets, filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from django.db.models import Count, Q
+from django.utils.cache import patch_vary_headers
+from django.utils.translation.trans_real import parse_accept_lang_header
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+from functools import reduce
+import json
+import operator
 
+from core.mixins import CachedResponseMixin
 from .models import PortfolioItem, Product
+from .cache import CACHE_NAMESPACE
+from . import includes, search, snapshot
 from .serializers import (
+    add_included_fields,
+    get_url_builder,
     PortfolioItemSerializer,
+    PortfolioItemCompactSerializer,
     ProductListSerializer,
-    ProductDetailSerializer
+    ProductListCompactSerializer,
+    ProductDetailSerializer,
+    ProductDetailCompactSerializer
 )
 
+# Values accepted by django-filter's BooleanWidget
+BOOLEAN_VALUES = {'1': True, '0': False, 'true': True, 'false': False}
 
-class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
+
+class PrerenderedResponse(Response):
+    """Response whose JSON body is already rendered."""
+    
+    def __init__(self, content, **kwargs):
+        super().__init__(None, **kwargs)
+        self.prerendered = content
+    
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return self.prerendered
+
+
+class CompactPayloadMixin:
+    """
+    Opt-in compact payloads with the fields of one language only.
+    
+    With ``?compact=1`` views use serializers without the ``*_ru``, ``*_en``
+    and ``*_uz`` columns, the raw ``features`` dict and the duplicate image
+    field, and the queryset loads only the columns they read. The language
+    comes from ``lang`` or, when it is absent or unsupported, from the
+    Accept-Language header; compact responses vary on it. Without
+    ``compact`` responses are unchanged, whatever ``lang`` is.
+    """
+    compact_param = 'compact'
+    # action -> columns read by the compact serializer; {lang} is the language
+    compact_columns = {}
+    
+    def is_compact(self, request=None):
+        request = request or self.request
+        return BOOLEAN_VALUES.get(request.GET.get(self.compact_param, '').lower(), False)
+    
+    def get_language(self, request=None):
+        """Response language: ?lang=, in compact mode also Accept-Language."""
+        request = request or self.request
+        language = request.GET.get('lang')
+        if not self.is_compact(request):
+            return language or 'ru'
+        if language in snapshot.LANGUAGES:
+            return language
+        for code, _ in parse_accept_lang_header(request.META.get('HTTP_ACCEPT_LANGUAGE', '')):
+            code = code.split('-')[0].lower()
+            if code in snapshot.LANGUAGES:
+                return code
+        return 'ru'
+    
+    def get_cache_params(self, request):
+        params = super().get_cache_params(request)
+        if self.is_compact(request):
+            # The language may come from a header
+            params['lang'] = [self.get_language(request)]
+        return params
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        columns = self.compact_columns.get(self.action)
+        if columns and self.is_compact():
+            language = self.get_language()
+            queryset = queryset.only(*{column.format(lang=language) for column in columns})
+        return queryset
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.is_compact(request):
+            patch_vary_headers(response, ('Accept-Language',))
+        return response
+
+
+class FacetCountsMixin:
+    """
+    Item counts per filter value for faceted navigation.
+    
+    ``GET <list>/facets/`` takes the same filters as the list and returns,
+    for every value of each facet, the number of items the list would have
+    with that value and the other filters (so category tabs show their
+    counts under the current "featured" filter), plus the number of items
+    matching all filters. ``?facets=a,b`` limits the facets returned. All
+    counts come from one query with conditional aggregates; the response
+    is cached like the list.
+    """
+    facets_param = 'facets'
+    # Filterable model fields with choices, or boolean fields
+    facet_fields = ()
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        names = self.get_facet_names(request)
+        queryset = self.get_facet_queryset()
+        conditions = self.get_facet_conditions(request, queryset)
+        
+        def matching(excluded=None):
+            condition = reduce(operator.and_, (q for name, q in conditions.items() if name != excluded), Q())
+            return condition or None
+        
+        values = {name: self.get_facet_values(queryset.model, name) for name in names}
+        aggregates = {'count': Count('pk', filter=matching())}
+        for i, name in enumerate(names):
+            others = matching(excluded=name)
+            for j, (value, _) in enumerate(values[name]):
+                condition = Q(**{name: value})
+                aggregates[f'facet_{i}_{j}'] = Count('pk', filter=others & condition if others else condition)
+        counts = queryset.aggregate(**aggregates)
+        
+        facets = {}
+        for i, name in enumerate(names):
+            facets[name] = [
+                {'value': value, **({'label': label} if label is not None else {}), 'count': counts[f'facet_{i}_{j}']}
+                for j, (value, label) in enumerate(values[name])
+            ]
+        return Response({'count': counts['count'], 'facets': facets})
+    
+    def get_facet_names(self, request):
+        value = request.query_params.get(self.facets_param, '')
+        names = [name.strip() for name in value.split(',') if name.strip()] or list(self.facet_fields)
+        unknown = set(names) - set(self.facet_fields)
+        if unknown:
+            raise ValidationError({
+                self.facets_param: f"Unknown facets: {', '.join(sorted(unknown))}"
+            })
+        return list(dict.fromkeys(names))
+    
+    def get_facet_queryset(self):
+        """Items the facets count, before the list filters."""
+        return self.get_queryset()
+    
+    def get_facet_conditions(self, request, queryset):
+        """Active list filters, as filter name -> Q; invalid values raise 400 like the list."""
+        filterset = DjangoFilterBackend().get_filterset(request, queryset, self)
+        if filterset is None:
+            return {}
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return {
+            name: Q(**{name: value})
+            for name, value in filterset.form.cleaned_data.items()
+            if value is not None and value != ''
+        }
+    
+    def get_facet_values(self, model, name):
+        """(value, label) pairs of a facet; booleans have no label."""
+        field = model._meta.get_field(name)
+        if field.choices:
+            return [(value, str(label)) for value, label in field.flatchoices]
+        return [(True, None), (False, None)]
+
+
+class CatalogSnapshotMixin:
+    """
+    Serve lists, category filters and details from the catalog snapshot.
+    
+    Requests the snapshot can't answer (search, ordering, other parameters,
+    unknown language, invalid filter or page, unknown object) and all
+    requests while the snapshot is missing or outdated are handled from
+    the database as usual, with the same output. Used with
+    CompactPayloadMixin, which resolves the language and the mode.
+    """
+    snapshot_section = None
+    # Query parameters the snapshot can filter on, besides lang and page
+    snapshot_filters = ()
+    # Positions of the list record and the compact list record in the
+    # section's entries
+    snapshot_list_ref = None
+    snapshot_compact_list_ref = None
+    
+    def list(self, request, *args, **kwargs):
+        response = self.list_from_snapshot(request)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = self.retrieve_from_snapshot(request)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return response
+    
+    def get_snapshot(self, request, allowed):
+        """Snapshot and language for the request, or (None, None)."""
+        if set(request.query_params) - {'lang', self.compact_param, *allowed}:
+            return None, None
+        language = self.get_language(request)
+        if language not in snapshot.LANGUAGES:
+            return None, None
+        catalog = snapshot.get_snapshot()
+        if catalog is None:
+            return None, None
+        return catalog, language
+    
+    def filter_snapshot_entries(self, entries, params):
+        """Apply the snapshot filters; None when the database must answer."""
+        return entries
+    
+    def snapshot_response(self, request, content):
+        origin = request.build_absolute_uri('/')[:-1]
+        return PrerenderedResponse(content.replace(snapshot.ORIGIN_PLACEHOLDER.encode(), origin.encode()))
+    
+    def list_from_snapshot(self, request):
+        catalog, language = self.get_snapshot(request, ('page', *self.snapshot_filters))
+        if catalog is None:
+            return None
+        entries = self.filter_snapshot_entries(catalog.languages[language][self.snapshot_section], request.query_params)
+        if entries is None:
+            return None
+        
+        paginator = self.paginator
+        try:
+            page = paginator.paginate_queryset(entries, request, view=self) if paginator else None
+        except NotFound:
+            return None
+        if page is None:
+            return self.snapshot_response(request, catalog.join(self.get_list_ref(entry) for entry in entries))
+        
+        envelope = '{"count":%d,"next":%s,"previous":%s,"results":' % (
+            paginator.page.paginator.count,
+            json.dumps(paginator.get_next_link(), ensure_ascii=False),
+            json.dumps(paginator.get_previous_link(), ensure_ascii=False),
+        )
+        results = catalog.join(self.get_list_ref(entry) for entry in page)
+        return self.snapshot_response(request, envelope.encode('utf-8') + results + b'}')
+    
+    def get_list_ref(self, entry):
+        """Record of a snapshot entry in list responses."""
+        return entry[self.snapshot_compact_list_ref if self.is_compact() else self.snapshot_list_ref]
+    
+    def retrieve_from_snapshot(self, request):
+        catalog, language = self.get_snapshot(request, ())
+        if catalog is None:
+            return None
+        ref = self.get_snapshot_detail(catalog, language)
+        if ref is None:
+            return None
+        return self.snapshot_response(request, catalog.record(ref))
+    
+    def get_snapshot_detail(self, catalog, language):
+        """Record of the requested object, or None."""
+        return None
+
+
+class PortfolioItemViewSet(CompactPayloadMixin, CachedResponseMixin, CatalogSnapshotMixin, FacetCountsMixin,
+                           viewsets.ReadOnlyModelViewSet):
     """
     API для просмотра элементов портфолио.
     Только публичные опубликованные элементы.
+    Ответы кэшируются до изменения контента (ETag, 304) и отдаются
+    из снимка каталога без запросов к БД. ?compact=1 - только поля
+    на одном языке. facets/ - количество элементов по категориям.
     """
+    cache_namespace = CACHE_NAMESPACE
+    cache_default_params = {'lang': 'ru'}
+    snapshot_section = 'portfolio'
+    snapshot_filters = ('category',)
+    snapshot_list_ref = 2
+    snapshot_compact_list_ref = 3
+    compact_columns = dict.fromkeys(('list', 'retrieve'), (
+        'id', 'image', 'image_variants', 'image_width', 'image_height', 'image_color', 'image_placeholder',
+        'title_ru', 'title_{lang}', 'description_ru', 'description_{lang}',
+        'category', 'order', 'created_at',
+    ))
     serializer_class = PortfolioItemSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['category']
+    facet_fields = ('category',)
     ordering_fields = ['order', 'created_at']
     ordering = ['order', '-created_at']
     
@@ -29,43 +304,206 @@ class PortfolioItemViewSet(viewsets.ReadOnlyModelViewSet):
         """Optimize queryset for published items only."""
         return PortfolioItem.objects.filter(is_published=True).order_by('order', '-created_at')
     
+    def get_serializer_class(self):
+        if self.is_compact():
+            return PortfolioItemCompactSerializer
+        return PortfolioItemSerializer
+    
     def get_serializer_context(self):
         """Передать язык в serializer."""
         context = super().get_serializer_context()
         # Язык из query параметра ?lang=ru или заголовка
-        language = self.request.query_params.get('lang', 'ru')
-        context['language'] = language
+        context['language'] = self.get_language()
         return context
+    
+    def filter_snapshot_entries(self, entries, params):
+        """Entries are [id, category, record, compact record]."""
+        category = params.get('category')
+        if category:
+            if category not in dict(PortfolioItem.CATEGORY_CHOICES):
+                return None
+            entries = [entry for entry in entries if entry[1] == category]
+        return entries
+    
+    def get_snapshot_detail(self, catalog, language):
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, ValueError):
+            return None
+        entry = catalog.portfolio_by_id[language].get(pk)
+        return self.get_list_ref(entry) if entry else None
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CompactPayloadMixin, CachedResponseMixin, CatalogSnapshotMixin, FacetCountsMixin,
+                     viewsets.ReadOnlyModelViewSet):
     """
     API для просмотра продуктов.
     Список и детали опубликованных продуктов.
+    Ответы кэшируются до изменения контента (ETag, 304) и отдаются
+    из снимка каталога без запросов к БД. ?compact=1 - только поля
+    на одном языке. facets/ - количество продуктов по категориям и
+    избранным, suggest/ - подсказки поиска.
+    ?slugs=a,b,c - несколько продуктов одним запросом;
+    ?include=images,related,portfolio - галерея, похожие продукты и
+    работы портфолио той же категории в том же ответе.
     """
+    cache_namespace = CACHE_NAMESPACE
+    cache_default_params = {'lang': 'ru'}
+    snapshot_section = 'products'
+    snapshot_filters = ('category', 'is_featured')
+    snapshot_list_ref = 3
+    snapshot_compact_list_ref = 5
+    compact_columns = {
+        'list': (
+            'id', 'slug', 'main_image', 'main_image_variants',
+            'main_image_width', 'main_image_height', 'main_image_color', 'main_image_placeholder',
+            'name_ru', 'name_{lang}', 'short_description_ru', 'short_description_{lang}',
+            'category', 'is_featured', 'order',
+        ),
+    }
+    compact_columns['retrieve'] = compact_columns['list'] + (
+        'description_ru', 'description_{lang}', 'features', 'created_at',
+    )
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    # Index search runs last so it can order results by relevance
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, search.ProductSearchFilter]
     filterset_fields = ['category', 'is_featured']
-    search_fields = ['name_ru', 'name_en', 'name_uz', 'description_ru']
+    facet_fields = ('category', 'is_featured')
+    uncached_actions = ('suggest',)
+    # Searches are answered from the in-memory index, without the cache
+    uncached_params = (search.ProductSearchFilter.search_param,)
     ordering_fields = ['order', 'created_at']
     ordering = ['order', '-created_at']
     lookup_field = 'slug'
+    include_param = 'include'
+    batch_param = 'slugs'
+    max_batch_size = 50
     
     def get_queryset(self):
-        """Optimize queryset with prefetch_related for images."""
-        return Product.objects.filter(
-            is_published=True
-        ).prefetch_related('images').order_by('order', '-created_at')
+        """Optimize queryset with prefetch_related for images (only details and ?include=images show them)."""
+        queryset = Product.objects.filter(is_published=True).order_by('order', '-created_at')
+        requested = self.get_includes()
+        if requested:
+            queryset = queryset.annotate(gallery_count=Count('images'))
+        if self.action == 'retrieve' or 'images' in requested:
+            queryset = queryset.prefetch_related(includes.gallery_prefetch())
+        return queryset
+    
+    def get_includes(self):
+        """Sideloads requested with ?include= on lists and details."""
+        if self.action not in ('list', 'retrieve'):
+            return set()
+        value = self.request.query_params.get(self.include_param, '')
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = requested - set(includes.INCLUDES)
+        if unknown:
+            raise ValidationError({
+                self.include_param: f"Unknown includes: {', '.join(sorted(unknown))}"
+            })
+        return requested
+    
+    def get_batch_slugs(self):
+        """Slugs requested with ?slugs=, in order, or None."""
+        value = self.request.query_params.get(self.batch_param)
+        if value is None:
+            return None
+        slugs = list(dict.fromkeys(slug.strip() for slug in value.split(',') if slug.strip()))
+        if len(slugs) > self.max_batch_size:
+            raise ValidationError({
+                self.batch_param: f"At most {self.max_batch_size} slugs per request"
+            })
+        return slugs
+    
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        requested = self.get_includes()
+        if requested and args:
+            # Related products and portfolio works of all the serialized products, one query each
+            includes.attach(list(args[0]) if kwargs.get('many') else [args[0]], requested)
+            add_included_fields(serializer, requested, self.is_compact())
+        return serializer
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Список продуктов или, с ?slugs=a,b,c, продукты с этими slug.
+        
+        Пакетный ответ не разбивается на страницы: продукты идут в порядке
+        slugs, ненайденные перечислены в ``missing``.
+        """
+        slugs = self.get_batch_slugs()
+        if slugs is None:
+            return super().list(request, *args, **kwargs)
+        found = {
+            product.slug: product
+            for product in self.filter_queryset(self.get_queryset()).filter(slug__in=slugs)
+        }
+        serializer = self.get_serializer([found[slug] for slug in slugs if slug in found], many=True)
+        return Response({
+            'results': serializer.data,
+            'missing': [slug for slug in slugs if slug not in found],
+        })
+    
+    def get_facet_queryset(self):
+        """Facets count the search results when ?search= is given."""
+        queryset = super().get_facet_queryset()
+        query = self.request.query_params.get(search.ProductSearchFilter.search_param, '')
+        if query.strip():
+            queryset = queryset.filter(pk__in=search.get_index().search_ids(query))
+        return queryset
     
     def get_serializer_class(self):
         """Использовать разные serializers для списка и детальной страницы."""
         if self.action == 'retrieve':
-            return ProductDetailSerializer
-        return ProductListSerializer
+            return ProductDetailCompactSerializer if self.is_compact() else ProductDetailSerializer
+        return ProductListCompactSerializer if self.is_compact() else ProductListSerializer
     
     def get_serializer_context(self):
         """Передать язык в serializer."""
         context = super().get_serializer_context()
-        language = self.request.query_params.get('lang', 'ru')
-        context['language'] = language
+        context['language'] = self.get_language()
         return context
+    
+    def filter_snapshot_entries(self, entries, params):
+        """
+        Entries are [slug, category, is_featured, list record, detail record,
+        compact list record, compact detail record].
+        """
+        category = params.get('category')
+        if category:
+            if category not in dict(Product.CATEGORY_CHOICES):
+                return None
+            entries = [entry for entry in entries if entry[1] == category]
+        is_featured = BOOLEAN_VALUES.get((params.get('is_featured') or '').lower())
+        if is_featured is not None:
+            entries = [entry for entry in entries if entry[2] == is_featured]
+        return entries
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Подсказки для поиска по мере ввода.
+        
+        Отвечает из индекса в памяти, без запросов к БД.
+        
+        Query parameters:
+            - q: Введенный текст (кириллица или латиница)
+            - lang: Язык названий
+            - limit: Количество подсказок (default: 8, max: 20)
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 8)), 1), 20)
+        except ValueError:
+            limit = 8
+        build_url = get_url_builder({'request': request})
+        results = [
+            {**item, 'image_url': build_url(item['image_url']) if item['image_url'] else None}
+            for item in search.get_index().suggest(query, self.get_language(), limit)
+        ]
+        return Response({'query': query, 'results': results})
+    
+    def get_snapshot_detail(self, catalog, language):
+        entry = catalog.products_by_slug[language].get(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if entry is None:
+            return None
+        return entry[6] if self.is_compact() else entry[4]
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from .models import IdempotencyKey
 
-# Register your models here.
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """
+    Read-only view of stored idempotency keys.
+    """
+    list_display = ('key', 'scope', 'status', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('scope', 'status')
+    search_fields = ('key',)
+    readonly_fields = (
+        'scope', 'client', 'key', 'fingerprint', 'status', 'response_status', 'response_body',
+        'locked_at', 'expires_at', 'created_at'
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
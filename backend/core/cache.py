@@ -0,0 +1,133 @@
+"""
+Generation-keyed response cache for read-mostly API endpoints.
+
+Cached responses are stored under a key that includes the current
+generation of their namespace. Invalidation bumps the generation, so
+every entry of the namespace becomes unreachable at once without having
+to find and delete keys. Each response is also kept under a key without
+the generation for a longer time, to be served while the database is
+unavailable.
+
+Generations are kept in small files (RESPONSE_CACHE_GENERATION_DIR), not
+in the cache: a cache that culls entries when full (FileBasedCache, LRU
+memcached or Redis) would drop the counter along with the responses, and
+the catalog snapshot and search index, built for the old value, would
+never be current again. Every worker of the host reads the same file;
+bumps are serialized with a file lock and replace the file atomically.
+"""
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+ENTRY_KEY = 'response-cache:{namespace}:{generation}:{digest}'
+STALE_KEY = 'response-cache:{namespace}:stale:{digest}'
+
+
+def generation_path(namespace):
+    return os.path.join(settings.RESPONSE_CACHE_GENERATION_DIR, f'{namespace}.generation')
+
+
+def _read_generation(path):
+    try:
+        with open(path, 'rb') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _update_generation(namespace, bump):
+    path = generation_path(namespace)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        current = _read_generation(path)
+        if current is not None and not bump:
+            return current
+        # Move to the clock rather than just adding 1: if the file is lost,
+        # it must not come back to a generation that has old entries
+        generation = max((current or 0) + 1, int(time.time() * 1000))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{namespace}-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(generation))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return generation
+
+
+def get_generation(namespace):
+    generation = _read_generation(generation_path(namespace))
+    if generation is None:
+        generation = _update_generation(namespace, bump=False)
+    return generation
+
+
+def bump_generation(namespace):
+    """
+    Invalidate every cached response of a namespace.
+
+    Returns:
+        int: the new generation
+    """
+    return _update_generation(namespace, bump=True)
+
+
+def generation_age(namespace):
+    """Seconds since the generation of a namespace last changed."""
+    try:
+        return time.time() - os.stat(generation_path(namespace)).st_mtime
+    except OSError:
+        return 0.0
+
+
+def request_digest(path, params, origin=''):
+    """
+    Stable digest of a request path and its query parameters.
+
+    Args:
+        path: request path
+        params: mapping of parameter -> list of values
+        origin: scheme and host the request was made to; responses with
+                absolute URLs (media, pagination links) differ per origin
+    """
+    parts = [origin, path]
+    for name in sorted(params):
+        for value in sorted(params[name]):
+            parts.append(f'{name}={value}')
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def make_etag(content):
+    """Strong ETag of a response body."""
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def get_entry(namespace, generation, digest):
+    return cache.get(ENTRY_KEY.format(namespace=namespace, generation=generation, digest=digest))
+
+
+def get_stale_entry(namespace, digest):
+    return cache.get(STALE_KEY.format(namespace=namespace, digest=digest))
+
+
+def set_entry(namespace, generation, digest, entry):
+    """
+    Store a response entry for the generation it was computed in.
+
+    The generation must be read before the database, so that an entry built
+    from data that was changed meanwhile is stored under the old generation.
+    """
+    cache.set(
+        ENTRY_KEY.format(namespace=namespace, generation=generation, digest=digest),
+        entry,
+        settings.RESPONSE_CACHE_TIMEOUT,
+    )
+    cache.set(STALE_KEY.format(namespace=namespace, digest=digest), entry, settings.RESPONSE_CACHE_STALE_TIMEOUT)
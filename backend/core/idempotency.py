@@ -0,0 +1,229 @@
+"""
+Idempotent handling of retried POST requests.
+
+Clients send an ``Idempotency-Key`` header (or an ``idempotency_key`` form
+field) that stays the same across retries of one submission. The first
+request claims the key and runs the view; repeats get the stored response
+back without running the view again. The claim is an INSERT guarded by a
+unique constraint, so concurrent duplicates on different workers can't
+both run the view.
+
+Keys are scoped per client: the user, or the user agent for anonymous
+requests. The IP is left out on purpose, because a phone that retries
+after switching from Wi-Fi to cellular has a new one, and the retry must
+still find the stored response. Each key also stores a fingerprint of the
+request data: a key reused for a different request gets 422 instead of
+the other request's response.
+"""
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+import logging
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .utils.helpers import get_user_agent
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+KEY_RE = re.compile(r'^[\x21-\x7e]{8,255}$')
+
+# A pending claim older than this belongs to a request that died
+PENDING_TIMEOUT = timedelta(seconds=60)
+
+
+def get_request_key(request):
+    """Idempotency key from the header, or from the form as a fallback."""
+    key = request.headers.get(HEADER)
+    if key is None:
+        # The fingerprint needs the parsed body anyway
+        key = request.data.get(FORM_FIELD)
+    return key.strip() if isinstance(key, str) else None
+
+
+def get_client(request):
+    """Hash identifying the client a key belongs to."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        identity = f'user:{user.pk}'
+    else:
+        identity = f'anon:{get_user_agent(request)}'
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def file_digest(uploaded_file):
+    """SHA-256 of an upload, from the streaming handler when it computed one."""
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        uploaded_file.seek(0)
+    return digest
+
+
+def fingerprint_value(value):
+    if isinstance(value, UploadedFile):
+        return {'file': value.name, 'size': value.size, 'sha256': file_digest(value)}
+    return value
+
+
+def request_fingerprint(request):
+    """
+    SHA-256 of the request data, without the idempotency key itself.
+
+    Form data is hashed field by field (files by their content hash), so
+    the fingerprint doesn't depend on the multipart boundary or field order.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {name: [fingerprint_value(v) for v in values] for name, values in data.lists()}
+    if isinstance(data, dict):
+        data = {name: value for name, value in data.items() if name != FORM_FIELD}
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def error_response(code, message):
+    return Response(
+        {
+            'success': False,
+            'error': {
+                'code': code,
+                'message': message,
+                'details': {}
+            }
+        },
+        status=code
+    )
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def claim(scope, client, key, fingerprint):
+    """
+    Claim a key of a client for this request.
+
+    Returns:
+        tuple: (claimed record or None, existing record or None)
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                scope=scope, client=client, key=key, fingerprint=fingerprint,
+                locked_at=now, expires_at=expires_at,
+            ), None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(scope=scope, client=client, key=key).first()
+    if existing is None:
+        # Deleted by the owner after a failure; let the client retry
+        return None, None
+
+    # Take over expired keys and abandoned claims with a conditional
+    # UPDATE, so only one of several racing requests wins
+    stale = IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=now)
+    if existing.status == IdempotencyKey.STATUS_PENDING:
+        stale = IdempotencyKey.objects.filter(
+            pk=existing.pk, status=IdempotencyKey.STATUS_PENDING, locked_at__lte=now - PENDING_TIMEOUT
+        ) | stale
+    taken = stale.update(
+        status=IdempotencyKey.STATUS_PENDING,
+        fingerprint=fingerprint,
+        response_status=None,
+        response_body=None,
+        locked_at=now,
+        expires_at=expires_at,
+    )
+    if taken:
+        existing.refresh_from_db()
+        return existing, None
+    return None, existing
+
+
+def idempotent(scope):
+    """
+    Make a DRF view safe to retry with an idempotency key.
+
+    Apply below @api_view and above rate limiting, so repeats don't use up
+    the rate limit. Requests without a key run as before. 5xx and 429
+    responses are not stored, so the client can retry them. A key reused
+    with different request data gets 422.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            key = get_request_key(request)
+            if not key:
+                return view_func(request, *args, **kwargs)
+            if not KEY_RE.match(key):
+                return error_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    f'Некорректный {HEADER}: 8-255 печатных ASCII символов'
+                )
+
+            client = get_client(request)
+            fingerprint = request_fingerprint(request)
+
+            # Fast path for repeats: a single indexed lookup
+            claimed = None
+            record = IdempotencyKey.objects.filter(
+                scope=scope, client=client, key=key, status=IdempotencyKey.STATUS_COMPLETE,
+                expires_at__gt=timezone.now(),
+            ).first()
+            if record is None:
+                claimed, record = claim(scope, client, key, fingerprint)
+
+            if claimed is None:
+                if record is not None and record.fingerprint != fingerprint:
+                    logger.warning(f"Idempotency key {key} of {scope} reused with different data")
+                    return error_response(
+                        status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        'Этот ключ уже использован для другого запроса'
+                    )
+                if record is not None and record.status == IdempotencyKey.STATUS_COMPLETE:
+                    logger.info(f"Replaying stored response for {scope} key {key}")
+                    return replay(record)
+                return error_response(
+                    status.HTTP_409_CONFLICT,
+                    'Запрос с этим ключом уже обрабатывается. Повторите позже.'
+                )
+            record = claimed
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if (response.status_code >= 500 or response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+                    or not hasattr(response, 'data')):
+                record.delete()
+                return response
+
+            record.status = IdempotencyKey.STATUS_COMPLETE
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['status', 'response_status', 'response_body'])
+            return response
+        return wrapped_view
+    return decorator
@@ -0,0 +1,89 @@
+"""
+Management command to fill the acquisition columns of existing analytics
+events (referrer domain, channel, UTM tags) and rebuild the channel rollups.
+
+Events are read in id order, a chunk at a time. Within a chunk, events
+with the same classification are updated with one UPDATE, and there are
+only a few distinct classifications per chunk.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from collections import defaultdict
+from analytics.models import AnalyticsEvent
+from analytics import channels, rollups
+
+
+class Command(BaseCommand):
+    help = 'Classify historical analytics events by channel and rebuild channel rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Events processed per chunk (default: 5000)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Reclassify all events, not only those without a channel'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the channel breakdown without saving anything'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        dry_run = options.get('dry_run', False)
+
+        queryset = AnalyticsEvent.objects.all()
+        if not options.get('all'):
+            queryset = queryset.filter(channel='')
+
+        processed = 0
+        by_channel = defaultdict(int)
+        last_id = 0
+        while True:
+            chunk = list(
+                queryset.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'page', 'referrer')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+
+            groups = defaultdict(list)
+            for event_id, page, referrer in chunk:
+                values = channels.classify(page, referrer)
+                groups[tuple(sorted(values.items()))].append(event_id)
+                by_channel[values['channel']] += 1
+
+            if not dry_run:
+                with transaction.atomic():
+                    for values, ids in groups.items():
+                        AnalyticsEvent.objects.filter(id__in=ids).update(**dict(values))
+
+            processed += len(chunk)
+            self.stdout.write(f'  {processed} events processed')
+
+        for channel, count in sorted(by_channel.items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  {channel}: {count}')
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would classify {processed} events and rebuild the channel rollups. '
+                    'Run without --dry-run to save.'
+                )
+            )
+            return
+
+        written = rollups.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully classified {processed} events and rebuilt {written} channel rollup rows.'
+            )
+        )
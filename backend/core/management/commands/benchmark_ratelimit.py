@@ -0,0 +1,93 @@
+"""
+Management command to measure the overhead of a rate limit check.
+
+Runs checks against a throwaway bucket database (not the live one) from
+one or more processes and reports the latency per check in microseconds.
+All processes share the same keys, so the allowed count shows the budget
+holds across processes (keys x bucket size, however many processes run).
+"""
+from django.core.management.base import BaseCommand
+from core.ratelimit import SQLiteTokenBucket, parse_rate
+from multiprocessing import Pool
+import os
+import statistics
+import tempfile
+import time
+
+
+def run_checks(args):
+    path, iterations, keys, capacity, refill, worker = args
+    store = SQLiteTokenBucket(path)
+    timings = []
+    allowed = 0
+    for i in range(iterations):
+        key = f'bench:{(i + worker) % keys}'
+        start = time.perf_counter()
+        ok, _ = store.consume(key, capacity, refill)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+        allowed += ok
+    return timings, allowed
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the shared SQLite rate limiter (microseconds per check)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=10000,
+            help='Checks per process (default: 10000)'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Concurrent processes sharing the buckets, like gunicorn workers (default: 1)'
+        )
+        parser.add_argument(
+            '--keys',
+            type=int,
+            default=100,
+            help='Distinct client keys shared by all processes (default: 100)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=str,
+            default='5/h',
+            help='Bucket rate (default: 5/h)'
+        )
+
+    def handle(self, *args, **options):
+        capacity, refill = parse_rate(options['rate'])
+        processes = options['processes']
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ratelimit.sqlite3')
+            # Create the database up front so workers don't race on the schema
+            SQLiteTokenBucket(path).reset()
+            jobs = [
+                (path, options['iterations'], options['keys'], capacity, refill, worker)
+                for worker in range(processes)
+            ]
+
+            started = time.perf_counter()
+            if processes == 1:
+                results = [run_checks(jobs[0])]
+            else:
+                with Pool(processes) as pool:
+                    results = pool.map(run_checks, jobs)
+            elapsed = time.perf_counter() - started
+
+        timings = sorted(t for worker_timings, _ in results for t in worker_timings)
+        allowed = sum(worker_allowed for _, worker_allowed in results)
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+
+        self.stdout.write(f'Checks:     {len(timings)} ({processes} process(es), {allowed} allowed)')
+        self.stdout.write(f'Mean:       {statistics.mean(timings):.1f} µs')
+        self.stdout.write(f'Median:     {percentile(0.5):.1f} µs')
+        self.stdout.write(f'p99:        {percentile(0.99):.1f} µs')
+        self.stdout.write(f'Max:        {timings[-1]:.1f} µs')
+        self.stdout.write(
+            self.style.SUCCESS(f'Throughput: {len(timings) / elapsed:,.0f} checks/s')
+        )
@@ -0,0 +1,148 @@
+"""
+Management command to compare the fast list serializers with plain DRF.
+
+Serializes in-memory rows (nothing is read from or written to the
+database) with ProductListSerializer, PortfolioItemSerializer and
+LeadListSerializer, once through FastRepresentationMixin and once
+through the regular DRF field machinery. It reports the best time of
+several runs for each row count and checks that the rendered JSON is
+identical.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+import time
+
+from content.models import PortfolioItem, Product
+from content.serializers import PortfolioItemSerializer, ProductListSerializer
+from leads.models import Lead
+from leads.serializers import LeadListSerializer
+
+
+def make_variants(name):
+    stem = name.rsplit('.', 1)[0]
+    return {
+        'source': name,
+        'webp': {str(w): f'variants/{stem}-{w}w.webp' for w in settings.IMAGE_VARIANT_WIDTHS},
+        'jpeg': {str(w): f'variants/{stem}-{w}w.jpg' for w in settings.IMAGE_VARIANT_WIDTHS},
+    }
+
+
+def make_products(count):
+    categories = [key for key, _ in Product.CATEGORY_CHOICES]
+    products = []
+    for i in range(count):
+        image = f'products/2024/01/product-{i}.jpg'
+        products.append(Product(
+            id=i + 1, slug=f'product-{i}', main_image=image, main_image_variants=make_variants(image),
+            main_image_width=1600, main_image_height=1200, main_image_color='#a0b0c0',
+            main_image_placeholder='data:image/webp;base64,' + 'A' * 80,
+            name_ru=f'Продукт {i}', name_en=f'Product {i}', name_uz=f'Mahsulot {i}',
+            short_description_ru='Краткое описание ' * 4, short_description_en='Short description ' * 4,
+            category=categories[i % len(categories)], is_featured=i % 7 == 0, order=i,
+        ))
+    return products
+
+
+def make_portfolio(count):
+    categories = [key for key, _ in PortfolioItem.CATEGORY_CHOICES]
+    now = timezone.now()
+    items = []
+    for i in range(count):
+        image = f'portfolio/2024/01/work-{i}.jpg'
+        items.append(PortfolioItem(
+            id=i + 1, image=image, image_variants=make_variants(image),
+            image_width=1200, image_height=900, image_color='#302010',
+            image_placeholder='data:image/webp;base64,' + 'A' * 80,
+            title_ru=f'Работа {i}', title_en=f'Work {i}',
+            description_ru='Описание работы ' * 10, description_en='Work description ' * 10,
+            category=categories[i % len(categories)], order=i, created_at=now - timedelta(hours=i),
+        ))
+    return items
+
+
+def make_leads(count):
+    product_types = [key for key, _ in Lead.PRODUCT_TYPE_CHOICES]
+    statuses = [key for key, _ in Lead.STATUS_CHOICES]
+    now = timezone.now()
+    return [
+        Lead(
+            id=i + 1, name=f'Клиент {i}', company=f'Компания {i}', phone=f'+99890{i:07d}',
+            email=f'client{i}@example.com' if i % 3 else None,
+            product_type=product_types[i % len(product_types)], status=statuses[i % len(statuses)],
+            duplicate_of_id=i if i % 10 == 0 and i else None,
+            spam_score=(i % 100) / 100 if i % 4 else None,
+            created_at=now - timedelta(minutes=i), language='ru',
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the fast list serializers against the regular DRF path'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=str,
+            default='50,500,5000',
+            help='Comma-separated row counts (default: 50,500,5000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per measurement; the best one is reported (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['rows'].split(',')]
+        except ValueError:
+            raise CommandError('--rows must be a comma-separated list of numbers')
+        repeat = max(options['repeat'], 1)
+
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        request = RequestFactory().get('/', HTTP_HOST=host)
+        cases = [
+            ('ProductListSerializer', ProductListSerializer, make_products, {'request': request, 'language': 'en'}),
+            ('PortfolioItemSerializer', PortfolioItemSerializer, make_portfolio, {'request': request, 'language': 'en'}),
+            ('LeadListSerializer', LeadListSerializer, make_leads, {}),
+        ]
+        renderer = JSONRenderer()
+
+        self.stdout.write(f"{'Serializer':<26}{'Rows':>7}{'DRF, ms':>11}{'Fast, ms':>11}{'Speedup':>10}")
+        mismatches = 0
+        for label, serializer_class, factory, context in cases:
+            reference_class = type(f'Reference{serializer_class.__name__}', (serializer_class,), {
+                'fast_representation': False,
+                'Meta': serializer_class.Meta,
+            })
+            for size in sizes:
+                rows = factory(size)
+                reference, reference_ms = self.measure(reference_class, rows, context, repeat)
+                fast, fast_ms = self.measure(serializer_class, rows, context, repeat)
+                identical = renderer.render(reference) == renderer.render(fast)
+                mismatches += not identical
+                self.stdout.write(
+                    f'{label:<26}{size:>7}{reference_ms:>11.1f}{fast_ms:>11.1f}'
+                    f'{reference_ms / fast_ms:>9.1f}x' + ('' if identical else '  OUTPUT DIFFERS')
+                )
+
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'{mismatches} measurements produced different output'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Output of the fast serializers is identical.'))
+
+    def measure(self, serializer_class, rows, context, repeat):
+        """Best time of ``repeat`` runs, in milliseconds, with the last result."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = serializer_class(rows, many=True, context=context).data
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return data, best
@@ -0,0 +1,42 @@
+"""
+Management command to build the catalog snapshot served by the content API.
+
+The snapshot is rebuilt automatically after catalog changes; run this
+after deploys, restores or direct database edits.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from content import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Build the memory-mapped snapshot of the published catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only show whether the current snapshot is up to date'
+        )
+
+    def handle(self, *args, **options):
+        path = settings.CATALOG_SNAPSHOT_PATH
+
+        if options.get('dry_run', False):
+            current = snapshot.get_snapshot(rebuild=False)
+            state = 'up to date' if current is not None else 'missing or outdated'
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Snapshot {path} is {state}. '
+                    'Run without --dry-run to rebuild it.'
+                )
+            )
+            return
+
+        index = snapshot.build(path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully built {path}: {index['products']} products, "
+                f"{index['portfolio']} portfolio items, {index['size']} bytes of records."
+            )
+        )
@@ -0,0 +1,42 @@
+"""
+Management command to delete expired idempotency keys.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys whose replay window has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without actually deleting'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+
+        # Uses the expires_at index
+        expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+        count = expired.count()
+
+        if count == 0:
+            self.stdout.write(self.style.SUCCESS('No expired idempotency keys.'))
+            return
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would delete {count} expired idempotency keys. '
+                    'Run without --dry-run to actually delete.'
+                )
+            )
+            return
+
+        deleted_count, _ = expired.delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully deleted {deleted_count} expired idempotency keys.')
+        )
@@ -0,0 +1,78 @@
+"""
+Management command to compute related products from co-views.
+
+Streams product page views of the last --days days, counts the sessions
+that viewed each pair of products with NumPy, and replaces the stored
+related products (see content.recommendations). Products without enough
+co-views get products of the same category. Run it daily, e.g. from cron:
+
+    30 3 * * * cd /app/backend && python manage.py compute_related_products
+"""
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+import time
+
+from content import recommendations
+from content.includes import RELATED_LIMIT
+
+
+class Command(BaseCommand):
+    help = 'Compute related products from page views within the same sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Use page views of the last N days (default: 90, 0 for all)'
+        )
+        parser.add_argument(
+            '--min-coviews',
+            type=int,
+            default=recommendations.MIN_COVIEWS,
+            help=f'Sessions that must view both products (default: {recommendations.MIN_COVIEWS})'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute and report without saving'
+        )
+
+    def handle(self, *args, **options):
+        if recommendations.np is None:
+            raise CommandError('NumPy is required to compute related products: pip install numpy')
+        dry_run = options.get('dry_run', False)
+        days = options['days']
+        since = timezone.now() - timedelta(days=days) if days > 0 else None
+
+        started = time.monotonic()
+        rows, counter = recommendations.compute(
+            since=since, limit=RELATED_LIMIT, min_coviews=max(options['min_coviews'], 1)
+        )
+        elapsed = time.monotonic() - started
+
+        products = {row.product_id for row in rows}
+        coviewed = {row.product_id for row in rows if row.source == 'coview'}
+        self.stdout.write(
+            f'{counter.events} product page views in {counter.sessions} sessions '
+            f'({elapsed:.1f}s); {counter.size} published products'
+        )
+        self.stdout.write(
+            f'{len(coviewed)} products have co-viewed neighbours, '
+            f'{counter.size - len(coviewed)} use the same category only'
+        )
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would save {len(rows)} related products of {len(products)} products. '
+                    'Run without --dry-run to save them.'
+                )
+            )
+            return
+
+        recommendations.save(rows)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully saved {len(rows)} related products of {len(products)} products.')
+        )
@@ -1,12 +1,182 @@
 """
 Management command to export leads to CSV file.
+
+Supports plain CSV, gzip-compressed CSV and NDJSON output, size-based
+rotation and an incremental mode that only appends leads created or
+changed since the previous run.
 """
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from leads.models import Lead
+from datetime import datetime
 import csv
+import gzip
+import io
+import json
 import os
-from pathlib import Path
+
+
+CSV_HEADER = [
+    'ID', 'Дата создания', 'Имя', 'Компания', 'Телефон', 'Email',
+    'Тип продукта', 'Количество', 'Сообщение', 'Статус',
+    'Язык', 'Источник', 'IP адрес', 'Файл'
+]
+
+FORMATS = ('csv', 'csv.gz', 'ndjson')
+# Rows between size checks of compressed files, whose size lags behind
+# what zlib still buffers
+SIZE_CHECK_ROWS = 500
+
+
+class ExportFile:
+    """
+    Append-friendly export writer with size-based rotation.
+
+    The file is opened lazily on the first row, so nothing is created when
+    there is nothing to export. When the file grows past ``max_bytes`` it is
+    renamed with a timestamp suffix and a fresh file is started. The size is
+    checked at intervals estimated from the bytes per row so far (every
+    SIZE_CHECK_ROWS rows for gzip, without flushing the compressor).
+    """
+
+    def __init__(self, path, fmt, append=False, max_bytes=0):
+        self.path = path
+        self.fmt = fmt
+        self.append = append
+        self.max_bytes = max_bytes
+        self.rows_written = 0
+        self.rotated = []
+        # Rows in the current file, and the row count of its next size check
+        self._file_rows = 0
+        self._next_check = 1
+        self._raw = None
+        self._stream = None
+        self._writer = None
+
+    def _open(self):
+        output_dir = os.path.dirname(self.path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+
+        is_new = not self.append or not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._raw = open(self.path, 'wb' if is_new else 'ab')
+        self._file_rows = 0
+        self._next_check = 1
+
+        if self.fmt == 'csv.gz':
+            binary = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        else:
+            binary = self._raw
+        self._stream = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+        if self.fmt == 'ndjson':
+            self._writer = None
+            return
+
+        self._writer = csv.writer(self._stream)
+        if is_new:
+            if self.fmt == 'csv':
+                self._stream.write('\ufeff')  # UTF-8 BOM for Excel
+            self._writer.writerow(CSV_HEADER)
+
+    def _rotate(self):
+        self.close()
+        stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+        base, ext = self.path, ''
+        for suffix in ('.csv.gz', '.csv', '.ndjson'):
+            if self.path.endswith(suffix):
+                base, ext = self.path[:-len(suffix)], suffix
+                break
+        rotated_path = f'{base}.{stamp}{ext}'
+        os.replace(self.path, rotated_path)
+        self.rotated.append(rotated_path)
+        # The new file always starts empty, so it gets its own header
+        self.append = False
+
+    def write(self, lead):
+        if self._stream is None:
+            self._open()
+
+        if self.fmt == 'ndjson':
+            self._stream.write(json.dumps(lead_to_dict(lead), ensure_ascii=False))
+            self._stream.write('\n')
+        else:
+            self._writer.writerow(lead_to_row(lead))
+        self.rows_written += 1
+        self._file_rows += 1
+
+        if self.max_bytes and self._file_rows >= self._next_check:
+            self._check_size()
+
+    def _check_size(self):
+        size = self.size()
+        if size >= self.max_bytes:
+            self._rotate()
+            return
+        if self.fmt == 'csv.gz':
+            self._next_check = self._file_rows + SIZE_CHECK_ROWS
+            return
+        # Check again halfway to the limit at the current bytes per row, so
+        # the size is checked a few dozen times per file, not on every row
+        remaining_rows = (self.max_bytes - size) * self._file_rows / size
+        self._next_check = self._file_rows + max(int(remaining_rows / 2), 1)
+
+    def size(self):
+        """Bytes written to the file so far."""
+        if self.fmt == 'csv.gz':
+            # Flushing would force a gzip sync flush and hurt compression
+            return self._raw.tell()
+        self._stream.flush()
+        return self._raw.tell()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._raw.close()
+        self._raw = self._stream = self._writer = None
+
+
+def lead_to_row(lead):
+    """CSV row in the same layout as the admin export."""
+    return [
+        lead.id,
+        lead.created_at.strftime('%d.%m.%Y %H:%M'),
+        lead.name,
+        lead.company,
+        lead.phone,
+        lead.email or '',
+        lead.get_product_type_display(),
+        lead.quantity or '',
+        lead.message,
+        lead.get_status_display(),
+        lead.language,
+        lead.source or '',
+        str(lead.ip_address) if lead.ip_address else '',
+        'Да' if lead.file else 'Нет',
+    ]
+
+
+def lead_to_dict(lead):
+    """Machine-readable record for NDJSON consumers (CRM sync)."""
+    return {
+        'id': lead.id,
+        'created_at': lead.created_at.isoformat(),
+        'updated_at': lead.updated_at.isoformat(),
+        'name': lead.name,
+        'company': lead.company,
+        'phone': lead.phone,
+        'email': lead.email or '',
+        'product_type': lead.product_type,
+        'quantity': lead.quantity,
+        'message': lead.message,
+        'status': lead.status,
+        'language': lead.language,
+        'source': lead.source or '',
+        'ip_address': str(lead.ip_address) if lead.ip_address else '',
+        'file': lead.file.name if lead.file else '',
+    }
 
 
 class Command(BaseCommand):
@@ -19,6 +189,12 @@ class Command(BaseCommand):
             default='leads_export.csv',
             help='Output CSV file path (default: leads_export.csv)'
         )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=FORMATS,
+            help='Output format: csv, csv.gz or ndjson (default: guessed from --output)'
+        )
         parser.add_argument(
             '--status',
             type=str,
@@ -39,6 +215,28 @@ class Command(BaseCommand):
             action='store_true',
             help='Export all leads (default: last 30 days)'
         )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Append only leads created or changed since the last incremental run'
+        )
+        parser.add_argument(
+            '--state-file',
+            type=str,
+            help='Watermark file for --incremental (default: <output>.state.json)'
+        )
+        parser.add_argument(
+            '--max-size',
+            type=int,
+            default=0,
+            help='Rotate the output file once it reaches N megabytes (default: no rotation)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database per round trip (default: 2000)'
+        )
 
     def handle(self, *args, **options):
         output_path = options['output']
@@ -46,6 +244,9 @@ class Command(BaseCommand):
         start_date = options.get('start_date')
         end_date = options.get('end_date')
         export_all = options.get('all', False)
+        incremental = options.get('incremental', False)
+        fmt = options.get('format') or self._guess_format(output_path)
+        state_path = options.get('state_file') or f'{output_path}.state.json'
 
         # Build queryset
         queryset = Lead.objects.all()
@@ -54,67 +255,92 @@ class Command(BaseCommand):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
 
-        if not export_all:
+        if not export_all and not incremental:
             # Default: last 30 days
             if not start_date:
                 start_date = (timezone.now() - timezone.timedelta(days=30)).date()
-            else:
-                from datetime import datetime
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
 
         if start_date:
+            if isinstance(start_date, str):
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             queryset = queryset.filter(created_at__date__gte=start_date)
 
         if end_date:
-            from datetime import datetime
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
             queryset = queryset.filter(created_at__date__lte=end_date)
 
-        # Count leads
-        total_leads = queryset.count()
-        self.stdout.write(f'Exporting {total_leads} leads...')
+        watermark = None
+        if incremental:
+            watermark = self._load_watermark(state_path)
+            if watermark:
+                # Keyset condition on (updated_at, id) so rows sharing a
+                # timestamp with the previous watermark are not lost
+                queryset = queryset.filter(
+                    Q(updated_at__gt=watermark['updated_at']) |
+                    Q(updated_at=watermark['updated_at'], id__gt=watermark['id'])
+                )
+            queryset = queryset.order_by('updated_at', 'id')
+
+        export_file = ExportFile(
+            output_path,
+            fmt,
+            append=incremental,
+            max_bytes=options['max_size'] * 1024 * 1024,
+        )
 
+        last_lead = None
+        try:
+            for lead in queryset.iterator(chunk_size=options['chunk_size']):
+                export_file.write(lead)
+                last_lead = lead
+        finally:
+            export_file.close()
+
+        total_leads = export_file.rows_written
         if total_leads == 0:
             self.stdout.write(self.style.WARNING('No leads found to export.'))
             return
 
-        # Create output directory if needed
-        output_dir = os.path.dirname(output_path) if os.path.dirname(output_path) else '.'
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
+        for rotated_path in export_file.rotated:
+            self.stdout.write(f'Rotated {rotated_path}')
 
-        # Write CSV
-        with open(output_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile)
-            
-            # Header
-            writer.writerow([
-                'ID', 'Дата создания', 'Имя', 'Компания', 'Телефон', 'Email',
-                'Тип продукта', 'Количество', 'Сообщение', 'Статус',
-                'Язык', 'Источник', 'IP адрес', 'Файл'
-            ])
-            
-            # Data
-            for lead in queryset:
-                writer.writerow([
-                    lead.id,
-                    lead.created_at.strftime('%d.%m.%Y %H:%M'),
-                    lead.name,
-                    lead.company,
-                    lead.phone,
-                    lead.email or '',
-                    lead.get_product_type_display(),
-                    lead.quantity or '',
-                    lead.message,
-                    lead.get_status_display(),
-                    lead.language,
-                    lead.source or '',
-                    str(lead.ip_address) if lead.ip_address else '',
-                    'Да' if lead.file else 'Нет',
-                ])
+        if incremental:
+            # Only advance the watermark after the data is safely on disk
+            self._save_watermark(state_path, last_lead)
 
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully exported {total_leads} leads to {output_path}'
             )
         )
+
+    def _guess_format(self, output_path):
+        if output_path.endswith('.csv.gz') or output_path.endswith('.gz'):
+            return 'csv.gz'
+        if output_path.endswith('.ndjson') or output_path.endswith('.jsonl'):
+            return 'ndjson'
+        return 'csv'
+
+    def _load_watermark(self, state_path):
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            return {
+                'updated_at': parse_datetime(state['updated_at']),
+                'id': int(state['id']),
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            raise CommandError(f'Invalid watermark file {state_path}: {e}')
+
+    def _save_watermark(self, state_path, lead):
+        state = {
+            'id': lead.id,
+            'updated_at': lead.updated_at.isoformat(),
+            'exported_at': timezone.now().isoformat(),
+        }
+        tmp_path = f'{state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
@@ -0,0 +1,79 @@
+"""
+Management command to normalize contact columns and flag duplicate leads.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from leads.models import Lead
+from leads.duplicates import DuplicateIndex, normalized_fields
+
+
+class Command(BaseCommand):
+    help = 'Refresh normalized phone/email/company columns and flag duplicate leads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would change without saving'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per bulk update (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        batch_size = options['batch_size']
+        fields = ['phone_digits', 'email_normalized', 'company_key', 'duplicate_of', 'duplicate_reason']
+
+        index = DuplicateIndex()
+        pending = []
+        changed = 0
+        duplicates = 0
+
+        queryset = Lead.objects.order_by('created_at', 'id').only(
+            'id', 'phone', 'email', 'company', *fields
+        )
+        with transaction.atomic():
+            # A single pass in creation order: each lead is only compared with
+            # earlier leads from its own block
+            for lead in queryset.iterator(chunk_size=batch_size):
+                values = normalized_fields(lead.phone, lead.email, lead.company)
+                original, reason = index.add(
+                    lead.id, values['phone_digits'], values['email_normalized'],
+                    lead.company, values['company_key'],
+                )
+                values['duplicate_of_id'] = original
+                values['duplicate_reason'] = reason
+                if original:
+                    duplicates += 1
+
+                if any(getattr(lead, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(lead, field, value)
+                    pending.append(lead)
+                    changed += 1
+
+                if len(pending) >= batch_size:
+                    if not dry_run:
+                        Lead.objects.bulk_update(pending, fields)
+                    pending = []
+
+            if pending and not dry_run:
+                Lead.objects.bulk_update(pending, fields)
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: {duplicates} duplicates found, {changed} leads would be updated. '
+                    'Run without --dry-run to save.'
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Successfully flagged {duplicates} duplicates ({changed} leads updated).'
+                )
+            )
@@ -0,0 +1,70 @@
+"""
+Management command to generate the responsive variants and metadata
+(dimensions, dominant color, LQIP placeholder) of catalog images.
+
+New uploads get them automatically; run this once for images uploaded
+before they existed, after changing IMAGE_VARIANT_WIDTHS (with --all), or
+after restoring media files. Images are processed in parallel.
+"""
+from django.core.management.base import BaseCommand
+import os
+import time
+
+from content import images
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/JPEG variants and metadata of product and portfolio images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate the variants of every image, not only missing or outdated ones'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Resizing processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the images that need variants or metadata'
+        )
+
+    def handle(self, *args, **options):
+        regenerate = options.get('all', False)
+        dry_run = options.get('dry_run', False)
+
+        pending = []
+        for model in images.IMAGE_FIELDS:
+            instances = [
+                instance for instance in model.objects.order_by('pk')
+                if regenerate or images.is_outdated(instance)
+            ]
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {len(instances)} images')
+            pending.extend(instances)
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Variants of {len(pending)} images would be generated. '
+                    'Run without --dry-run to generate them.'
+                )
+            )
+            return
+
+        started = time.monotonic()
+        saved = images.generate(pending, workers=max(options['workers'], 1))
+        elapsed = time.monotonic() - started
+
+        failed = len(pending) - saved
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f'{failed} images were skipped: unreadable, or changed meanwhile')
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully generated variants of {saved} images in {elapsed:.1f}s.')
+        )
@@ -0,0 +1,341 @@
+"""
+Management command to import leads from CSV or NDJSON files.
+
+The file is streamed in batches. Rows are validated with the contact
+form rules (LeadCreateSerializer) in a pool of worker processes, and
+valid rows are inserted with COPY on PostgreSQL or bulk_create elsewhere,
+one transaction per batch. Rejected rows are written with their errors to
+an NDJSON side file. Files produced by export_leads can be imported back.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from collections import Counter, deque
+from datetime import datetime
+from multiprocessing import Pool
+import csv
+import django
+import gzip
+import io
+import ipaddress
+import json
+import os
+import time
+
+from leads.models import Lead
+from leads import counters, search
+from .export_leads import CSV_HEADER
+
+
+FORMATS = ('csv', 'ndjson')
+
+# Column names accepted besides the model field names (export_leads headers)
+HEADER_ALIASES = dict(zip(CSV_HEADER, [
+    'id', 'created_at', 'name', 'company', 'phone', 'email',
+    'product_type', 'quantity', 'message', 'status',
+    'language', 'source', 'ip_address', 'file',
+]))
+FORM_FIELDS = (
+    'name', 'company', 'phone', 'email', 'product_type',
+    'quantity', 'message', 'language', 'source', 'session_id',
+)
+# Display values are accepted for choice fields, as written by the CSV export
+PRODUCT_TYPES = {label: key for key, label in Lead.PRODUCT_TYPE_CHOICES}
+PRODUCT_TYPES.update({key: key for key, _ in Lead.PRODUCT_TYPE_CHOICES})
+STATUSES = {label: key for key, label in Lead.STATUS_CHOICES}
+STATUSES.update({key: key for key, _ in Lead.STATUS_CHOICES})
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked
+    django.setup()
+
+
+def parse_created_at(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed = datetime.strptime(value, '%d.%m.%Y %H:%M')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def prepare_row(raw):
+    """
+    Map a raw row to serializer input and the extra imported columns.
+
+    Returns:
+        tuple: (serializer data, extra model values, errors)
+    """
+    row = {}
+    for column, value in raw.items():
+        field = HEADER_ALIASES.get(column, column)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in ('', None):
+            row[field] = value
+
+    data = {field: row[field] for field in FORM_FIELDS if field in row}
+    extra = {}
+    errors = {}
+
+    if 'product_type' in data:
+        data['product_type'] = PRODUCT_TYPES.get(data['product_type'], data['product_type'])
+    if 'status' in row:
+        status = STATUSES.get(row['status'])
+        if status is None:
+            errors['status'] = [f"Неизвестный статус: {row['status']}"]
+        extra['status'] = status
+    if 'created_at' in row:
+        try:
+            extra['created_at'] = parse_created_at(str(row['created_at']))
+        except ValueError:
+            errors['created_at'] = [f"Некорректная дата: {row['created_at']}"]
+    if 'ip_address' in row:
+        try:
+            extra['ip_address'] = str(ipaddress.ip_address(row['ip_address']))
+        except ValueError:
+            pass
+    return data, extra, errors
+
+
+def validate_chunk(chunk):
+    """
+    Validate a batch of rows (runs in a worker process).
+
+    Args:
+        chunk: list of (line number, raw row or parse error string)
+
+    Returns:
+        tuple: (valid [(line, model values)], rejected [(line, raw row, errors)])
+    """
+    from leads.serializers import LeadCreateSerializer
+    from rest_framework.exceptions import ValidationError
+
+    # One serializer for the whole batch, like ListSerializer does: building
+    # the fields of a ModelSerializer costs more than validating a row
+    serializer = LeadCreateSerializer()
+    valid, rejected = [], []
+    for line, raw in chunk:
+        if isinstance(raw, str):
+            rejected.append((line, None, {'row': [raw]}))
+            continue
+        data, extra, errors = prepare_row(raw)
+        try:
+            values = serializer.run_validation(data)
+        except ValidationError as e:
+            detail = e.detail if isinstance(e.detail, dict) else {'row': e.detail}
+            errors.update({field: [str(m) for m in messages] for field, messages in detail.items()})
+        if errors:
+            rejected.append((line, raw, errors))
+            continue
+        values = dict(values)
+        values.update({key: value for key, value in extra.items() if value is not None})
+        valid.append((line, values))
+    return valid, rejected
+
+
+def read_rows(path, fmt):
+    """Yield (line number, row dict or parse error) from a CSV or NDJSON file."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError as e:
+                    yield line, f'Invalid JSON: {e}'
+                    continue
+                yield line, row if isinstance(row, dict) else 'Expected a JSON object'
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Import leads from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            type=str,
+            help='CSV or NDJSON file, optionally gzip-compressed'
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=FORMATS,
+            help='Input format (default: guessed from the file name)'
+        )
+        parser.add_argument(
+            '--rejects',
+            type=str,
+            help='NDJSON file for rejected rows (default: <input>.rejects.ndjson)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows validated and inserted per batch (default: 5000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Validation processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and write rejects without inserting anything'
+        )
+
+    def handle(self, *args, **options):
+        path = options['input']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        fmt = options.get('format') or self._guess_format(path)
+        rejects_path = options.get('rejects') or f'{path}.rejects.ndjson'
+        dry_run = options.get('dry_run', False)
+        workers = max(options['workers'], 1)
+
+        self.imported = 0
+        self.rejected = 0
+        self.rejects_file = None
+        self.rejects_path = rejects_path
+        started = time.monotonic()
+
+        chunks = chunked(read_rows(path, fmt), options['batch_size'])
+        try:
+            if workers == 1:
+                for chunk in chunks:
+                    self._handle_batch(*validate_chunk(chunk), dry_run)
+            else:
+                # Workers must not inherit open database connections
+                connections.close_all()
+                with Pool(workers, initializer=_init_worker) as pool:
+                    # Keep a bounded number of batches in flight so memory use
+                    # doesn't grow with the file size; results stay in order
+                    pending = deque()
+                    for chunk in chunks:
+                        pending.append(pool.apply_async(validate_chunk, (chunk,)))
+                        if len(pending) >= workers * 2:
+                            self._handle_batch(*pending.popleft().get(), dry_run)
+                    while pending:
+                        self._handle_batch(*pending.popleft().get(), dry_run)
+        finally:
+            if self.rejects_file is not None:
+                self.rejects_file.close()
+
+        elapsed = time.monotonic() - started
+        if self.rejected:
+            self.stdout.write(self.style.WARNING(f'{self.rejected} rows rejected, see {rejects_path}'))
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: {self.imported} valid rows would be imported ({elapsed:.1f}s). '
+                    'Run without --dry-run to import.'
+                )
+            )
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully imported {self.imported} leads in {elapsed:.1f}s. '
+                'Run find_duplicate_leads to flag duplicates among them.'
+            )
+        )
+
+    def _guess_format(self, path):
+        name = path[:-3] if path.endswith('.gz') else path
+        if name.endswith('.ndjson') or name.endswith('.jsonl'):
+            return 'ndjson'
+        return 'csv'
+
+    def _handle_batch(self, valid, rejected, dry_run):
+        if rejected:
+            if self.rejects_file is None:
+                self.rejects_file = open(self.rejects_path, 'w', encoding='utf-8')
+            for line, raw, errors in rejected:
+                self.rejects_file.write(
+                    json.dumps({'line': line, 'row': raw, 'errors': errors}, ensure_ascii=False, default=str)
+                )
+                self.rejects_file.write('\n')
+            self.rejected += len(rejected)
+
+        if valid and not dry_run:
+            self._insert([values for _, values in valid])
+        self.imported += len(valid)
+
+    def _insert(self, rows):
+        now = timezone.now()
+        leads = []
+        for values in rows:
+            lead = Lead(**values)
+            lead.created_at = values.get('created_at') or now
+            lead.updated_at = now
+            lead.status_changed_at = lead.created_at
+            leads.append(lead)
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                self._copy(leads)
+            else:
+                # auto_now_add overwrites created_at on insert, so restore
+                # the imported dates with one executemany (bulk_update builds
+                # a CASE per row and costs more than the insert itself)
+                Lead.objects.bulk_create(leads)
+                field = Lead._meta.get_field('created_at')
+                dated = []
+                for lead, values in zip(leads, rows):
+                    if 'created_at' in values:
+                        lead.created_at = lead.status_changed_at = values['created_at']
+                        value = field.get_db_prep_save(lead.created_at, connection)
+                        dated.append((value, value, lead.pk))
+                if dated:
+                    with connection.cursor() as cursor:
+                        cursor.executemany(
+                            f'UPDATE {Lead._meta.db_table} SET created_at = %s, status_changed_at = %s WHERE id = %s',
+                            dated,
+                        )
+                search.index_leads(leads)
+            counters.apply_deltas(Counter(counters.lead_counter_key(lead) for lead in leads))
+
+    def _copy(self, leads):
+        """Insert with COPY; much faster than INSERT for large batches on PostgreSQL."""
+        fields = [field for field in Lead._meta.concrete_fields if not field.primary_key]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for lead in leads:
+            row = []
+            for field in fields:
+                value = field.get_db_prep_save(getattr(lead, field.attname), connection)
+                row.append('\\N' if value is None else value)
+            writer.writerow(row)
+        buffer.seek(0)
+
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        sql = f"COPY {Lead._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        with connection.cursor() as cursor:
+            raw_cursor = cursor.cursor
+            if hasattr(raw_cursor, 'copy_expert'):
+                raw_cursor.copy_expert(sql, buffer)  # psycopg2
+            else:
+                with raw_cursor.copy(sql) as copy:  # psycopg 3
+                    copy.write(buffer.getvalue())
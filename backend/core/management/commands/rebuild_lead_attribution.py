@@ -0,0 +1,58 @@
+"""
+Management command to precompute daily lead attribution.
+
+Run it daily (e.g. from cron shortly after midnight). By default the
+last two days are recomputed so leads and events that arrived late
+are included. Older days can only be rebuilt while their analytics
+events are still kept (see cleanup_old_analytics).
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from collections import Counter
+from datetime import timedelta
+from leads import attribution
+
+
+class Command(BaseCommand):
+    help = 'Precompute first-touch and last-touch lead attribution per day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=2,
+            help='Number of days up to today to recompute (default: 2)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute and show the attribution without saving it'
+        )
+
+    def handle(self, *args, **options):
+        days = max(options['days'], 1)
+        dry_run = options.get('dry_run', False)
+        end = timezone.localdate()
+        start = end - timedelta(days=days - 1)
+
+        if dry_run:
+            stats = attribution.compute_attribution(start, end)
+            sources = Counter()
+            for (_, model, source, _), (count, _) in stats.items():
+                if model == 'first':
+                    sources[source] += count
+            leads = sum(sources.values())
+            for source, count in sources.most_common(10):
+                self.stdout.write(f'  {source}: {count}')
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: {leads} leads from {start} to {end} would give {len(stats)} attribution rows. '
+                    'Run without --dry-run to save them.'
+                )
+            )
+            return
+
+        written = attribution.rebuild_attribution(start, end)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {written} attribution rows from {start} to {end}.')
+        )
@@ -0,0 +1,44 @@
+"""
+Management command to rebuild the daily lead counters from the Lead table.
+"""
+from django.core.management.base import BaseCommand
+from leads import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily lead counters and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted counters without rewriting them'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+
+        if dry_run:
+            drift = counters.drift_report()
+            for (date, status, product_type, language), (stored, actual) in sorted(drift.items()):
+                self.stdout.write(
+                    f'{date} {status}/{product_type}/{language}: '
+                    f'stored {stored}, actual {actual}'
+                )
+            if drift:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'DRY RUN: {len(drift)} counters have drifted. '
+                        'Run without --dry-run to rebuild them.'
+                    )
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS('All counters are in sync.'))
+            return
+
+        drift = counters.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully rebuilt lead counters ({drift} counters had drifted).'
+            )
+        )
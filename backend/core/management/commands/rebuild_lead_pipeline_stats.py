@@ -0,0 +1,36 @@
+"""
+Management command to rebuild the daily status transition aggregates
+from the lead status history.
+"""
+from django.core.management.base import BaseCommand
+from leads import history
+from leads.models import LeadStatusChange, LeadStatusTransitionStat
+
+
+class Command(BaseCommand):
+    help = 'Recompute pipeline metrics aggregates from the status history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only show the sizes of the history and the aggregates'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: {LeadStatusChange.objects.count()} status changes, '
+                    f'{LeadStatusTransitionStat.objects.count()} aggregate rows. '
+                    'Run without --dry-run to rebuild the aggregates.'
+                )
+            )
+            return
+
+        written = history.rebuild_stats()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {written} pipeline aggregate rows.')
+        )
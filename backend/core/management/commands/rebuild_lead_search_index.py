@@ -0,0 +1,17 @@
+"""
+Management command to rebuild the lead full-text search index.
+"""
+from django.core.management.base import BaseCommand
+from leads import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for leads'
+
+    def handle(self, *args, **options):
+        if search.rebuild_index():
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt the lead search index.'))
+        else:
+            self.stdout.write(
+                self.style.WARNING('This database backend has no full-text index; icontains is used.')
+            )
@@ -0,0 +1,98 @@
+"""
+Management command to train the lead spam model.
+
+Rejected leads are spam examples; contacted, qualified and closed leads
+are legitimate ones. Every fifth lead is held out to report precision,
+recall and scoring time before the model is retrained on all leads and
+saved to settings.LEAD_SPAM_MODEL_PATH. Running workers pick the new
+model up within a minute.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from leads.models import Lead
+from leads import spam
+import time
+
+
+class Command(BaseCommand):
+    help = 'Train the naive Bayes spam model from reviewed leads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-samples',
+            type=int,
+            default=20,
+            help='Minimum leads per class required to train (default: 20)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Evaluate the model without saving it'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        threshold = settings.LEAD_SPAM_THRESHOLD
+
+        queryset = (
+            Lead.objects
+            .filter(status__in=spam.SPAM_STATUSES + spam.HAM_STATUSES)
+            .only('id', 'name', 'company', 'message', 'email', 'status')
+        )
+        examples = [
+            (lead.id, lead.status in spam.SPAM_STATUSES, spam.lead_features(lead))
+            for lead in queryset.iterator(chunk_size=2000)
+        ]
+        spam_count = sum(1 for _, is_spam, _ in examples if is_spam)
+        ham_count = len(examples) - spam_count
+        self.stdout.write(f'Training data: {spam_count} spam (rejected), {ham_count} legitimate leads')
+
+        if min(spam_count, ham_count) < options['min_samples']:
+            raise CommandError(
+                f'Need at least {options["min_samples"]} leads of each class; '
+                'reject more spam leads in the admin first.'
+            )
+
+        # Holdout evaluation
+        train = [example for example in examples if example[0] % 5]
+        test = [example for example in examples if not example[0] % 5]
+        model = spam.SpamModel.train(
+            (buckets for _, is_spam, buckets in train if is_spam),
+            (buckets for _, is_spam, buckets in train if not is_spam),
+        )
+        true_positive = false_positive = false_negative = 0
+        for _, is_spam, buckets in test:
+            predicted = model.score_buckets(buckets) >= threshold
+            true_positive += predicted and is_spam
+            false_positive += predicted and not is_spam
+            false_negative += is_spam and not predicted
+        precision = true_positive / max(true_positive + false_positive, 1)
+        recall = true_positive / max(true_positive + false_negative, 1)
+        self.stdout.write(
+            f'Holdout ({len(test)} leads, threshold {threshold}): '
+            f'precision {precision:.2%}, recall {recall:.2%}, '
+            f'{false_positive} legitimate leads flagged'
+        )
+
+        model = spam.SpamModel.train(
+            (buckets for _, is_spam, buckets in examples if is_spam),
+            (buckets for _, is_spam, buckets in examples if not is_spam),
+        )
+
+        # Scoring cost including feature extraction, as done per request
+        sample = list(queryset[:200])
+        start = time.perf_counter()
+        for lead in sample:
+            model.score_buckets(spam.lead_features(lead))
+        if sample:
+            per_lead = (time.perf_counter() - start) / len(sample) * 1_000_000
+            self.stdout.write(f'Scoring time: {per_lead:.0f} µs per lead')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN: Model not saved.'))
+            return
+
+        model.save(settings.LEAD_SPAM_MODEL_PATH)
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully saved spam model to {settings.LEAD_SPAM_MODEL_PATH}')
+        )
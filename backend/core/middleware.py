@@ -0,0 +1,263 @@
+"""
+Admission control for traffic spikes.
+
+Each worker tracks moving averages (exponentially weighted) of the
+latency of its recent database queries and of the time requests waited
+before it picked them up, plus the number of requests it is currently
+serving. When any of them goes above the configured thresholds, the
+worker samples and then sheds low-priority requests (analytics events)
+so that the contact form keeps its database time.
+
+The wait is measured from the ``X-Request-Start`` header set by the
+reverse proxy (nginx: ``proxy_set_header X-Request-Start "t=${msec}";``).
+It is the load signal of gunicorn's sync workers: they serve one request
+at a time, so their in-flight count never goes above 1 and the in-flight
+thresholds only matter for threaded (gthread) or async workers. Protected paths are
+always admitted. The worker steps back down only once load falls below
+the thresholds by a margin and a minimum time has passed (hysteresis),
+so it doesn't flap between states.
+"""
+from collections import Counter
+import logging
+import math
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+STATE_NORMAL = 'normal'
+STATE_SAMPLE = 'sample'
+STATE_SHED = 'shed'
+STATES = (STATE_NORMAL, STATE_SAMPLE, STATE_SHED)
+
+SHED_HEADER = 'X-Load-Shed'
+REQUEST_START_HEADER = 'HTTP_X_REQUEST_START'
+# Longer waits are clock trouble or a forged header, not queueing
+MAX_QUEUE_MS = 60_000
+
+
+def parse_request_start(value):
+    """
+    Time a request reached the proxy, from an ``X-Request-Start`` header.
+
+    Accepts ``t=<seconds>`` (nginx ``${msec}``) as well as milliseconds or
+    microseconds since the epoch, with or without the ``t=`` prefix.
+
+    Returns:
+        float or None: UNIX time in seconds
+    """
+    value = (value or '').strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        start = float(value)
+    except ValueError:
+        return None
+    if start > 1e14:
+        return start / 1e6
+    if start > 1e11:
+        return start / 1e3
+    return start
+
+
+class AdmissionController:
+    """
+    Per-process load tracker and admission decisions.
+
+    Safe to share between the threads of a worker.
+    """
+
+    def __init__(self, config=None):
+        config = config or settings.ADMISSION_CONTROL
+        self.latency_thresholds = (config['LATENCY_SAMPLE_MS'], config['LATENCY_SHED_MS'])
+        self.queue_thresholds = (config['QUEUE_SAMPLE_MS'], config['QUEUE_SHED_MS'])
+        self.in_flight_thresholds = (config['IN_FLIGHT_SAMPLE'], config['IN_FLIGHT_SHED'])
+        self.sample_rate = config['SAMPLE_RATE']
+        self.recovery_ratio = config['RECOVERY_RATIO']
+        self.min_dwell = config['MIN_DWELL_SECONDS']
+        self.alpha = config['LATENCY_ALPHA']
+        self.sheddable_paths = tuple(config['SHEDDABLE_PATHS'])
+        self.protected_paths = tuple(config['PROTECTED_PATHS'])
+
+        self._lock = threading.Lock()
+        self.state = STATE_NORMAL
+        self.state_since = time.monotonic()
+        self.in_flight = 0
+        self.latency_ms = 0.0
+        self.last_sample = time.monotonic()
+        self.queue_ms = 0.0
+        self.last_queue_sample = time.monotonic()
+        self.shed = Counter()
+        self.sampled_out = Counter()
+        self.transitions = Counter()
+
+    def record_query(self, duration_ms):
+        """Feed the duration of one database query into the average."""
+        with self._lock:
+            self.latency_ms = self._current_latency(time.monotonic())
+            self.latency_ms += self.alpha * (duration_ms - self.latency_ms)
+            self.last_sample = time.monotonic()
+
+    def record_queue(self, wait_ms):
+        """Feed the time one request waited before this worker took it."""
+        with self._lock:
+            self.queue_ms = self._current_queue(time.monotonic())
+            self.queue_ms += self.alpha * (wait_ms - self.queue_ms)
+            self.last_queue_sample = time.monotonic()
+
+    def _decayed(self, value, last_sample, now):
+        # Without recent samples there is no evidence of load, so the
+        # average decays instead of keeping a worker stuck shedding
+        idle = now - last_sample
+        if idle <= self.min_dwell:
+            return value
+        return value * math.exp(-(idle - self.min_dwell) / self.min_dwell)
+
+    def _current_latency(self, now):
+        return self._decayed(self.latency_ms, self.last_sample, now)
+
+    def _current_queue(self, now):
+        return self._decayed(self.queue_ms, self.last_queue_sample, now)
+
+    def _pressure(self, now, ratio=1.0):
+        """Highest state whose thresholds (scaled by ratio) are exceeded."""
+        latency = self._current_latency(now)
+        queue = self._current_queue(now)
+        level = 0
+        for index, (latency_limit, queue_limit, in_flight_limit) in enumerate(
+            zip(self.latency_thresholds, self.queue_thresholds, self.in_flight_thresholds), start=1
+        ):
+            if (latency > latency_limit * ratio or queue > queue_limit * ratio
+                    or self.in_flight > in_flight_limit * ratio):
+                level = index
+        return level
+
+    def _update_state(self, now):
+        current = STATES.index(self.state)
+        target = self._pressure(now)
+        if target < current:
+            # Step down one level at a time, only once load is clearly lower
+            if now - self.state_since < self.min_dwell:
+                return
+            target = max(target, self._pressure(now, self.recovery_ratio), current - 1)
+            if target == current:
+                return
+        if target != current:
+            previous, self.state = self.state, STATES[target]
+            self.state_since = now
+            self.transitions[self.state] += 1
+            logger.warning(
+                f"Admission control {previous} -> {self.state} "
+                f"(db latency {self.latency_ms:.1f} ms, queue {self.queue_ms:.1f} ms, "
+                f"in flight {self.in_flight})"
+            )
+
+    def classify(self, path):
+        if path.startswith(self.protected_paths):
+            return 'protected'
+        if path.startswith(self.sheddable_paths):
+            return 'sheddable'
+        return 'normal'
+
+    def admit(self, path):
+        """
+        Decide whether to serve a request and count it as in flight.
+
+        Returns:
+            str or None: None if admitted, otherwise 'shed' or 'sampled'
+        """
+        kind = self.classify(path)
+        with self._lock:
+            self._update_state(time.monotonic())
+            if kind == 'sheddable' and self.state != STATE_NORMAL:
+                if self.state == STATE_SHED:
+                    self.shed[path] += 1
+                    return 'shed'
+                if random.random() >= self.sample_rate:
+                    self.sampled_out[path] += 1
+                    return 'sampled'
+            self.in_flight += 1
+        return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        """Current state and counters of this worker."""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'pid': os.getpid(),
+                'state': self.state,
+                'state_seconds': round(now - self.state_since, 1),
+                'db_latency_ms': round(self._current_latency(now), 2),
+                'queue_ms': round(self._current_queue(now), 2),
+                'in_flight': self.in_flight,
+                'shed': dict(self.shed),
+                'sampled_out': dict(self.sampled_out),
+                'shed_total': sum(self.shed.values()) + sum(self.sampled_out.values()),
+                'transitions': dict(self.transitions),
+            }
+
+
+_controller = None
+
+
+def get_controller():
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+
+class AdmissionControlMiddleware:
+    """
+    Shed or sample low-priority requests when this worker is overloaded.
+
+    Shed requests get an empty 204 response with an ``X-Load-Shed`` header,
+    so analytics clients treat them as delivered and don't retry.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.ADMISSION_CONTROL['ENABLED']
+        self.controller = get_controller()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        self.record_queue_time(request)
+        decision = self.controller.admit(request.path)
+        if decision is not None:
+            response = HttpResponse(status=204)
+            response[SHED_HEADER] = decision
+            return response
+
+        try:
+            with connection.execute_wrapper(self.time_query):
+                return self.get_response(request)
+        finally:
+            self.controller.release()
+
+    def record_queue_time(self, request):
+        start = parse_request_start(request.META.get(REQUEST_START_HEADER))
+        if start is None:
+            return
+        wait_ms = max((time.time() - start) * 1000, 0.0)
+        if wait_ms <= MAX_QUEUE_MS:
+            self.controller.record_queue(wait_ms)
+
+    def time_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.controller.record_query((time.perf_counter() - start) * 1000)
@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-19 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50, verbose_name='Область')),
+                ('key', models.CharField(max_length=255, verbose_name='Ключ')),
+                ('status', models.CharField(choices=[('pending', 'В обработке'), ('complete', 'Завершен')], default='pending', max_length=20, verbose_name='Статус')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='HTTP статус')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='Ответ')),
+                ('locked_at', models.DateTimeField(verbose_name='Захвачен')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Ключ идемпотентности',
+                'verbose_name_plural': 'Ключи идемпотентности',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('scope', 'key'), name='unique_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='idempotencykey',
+            name='unique_idempotency_key',
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='client',
+            field=models.CharField(default='', max_length=64, verbose_name='Клиент'),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='fingerprint',
+            field=models.CharField(default='', max_length=64, verbose_name='Отпечаток запроса'),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('scope', 'client', 'key'), name='unique_idempotency_client_key'),
+        ),
+    ]
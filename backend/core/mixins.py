@@ -0,0 +1,183 @@
+"""
+Reusable view mixins.
+"""
+import logging
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DatabaseError
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.exceptions import ValidationError
+
+from core import cache as response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SparseFieldsetMixin:
+    """
+    Let clients request a subset of serializer fields with `?fields=a,b,c`.
+
+    The serializer drops the other fields and, when every requested field
+    maps to a model column, the queryset is narrowed with `.only()`.
+    Fields needed for ordering and cursor pagination are always loaded.
+    """
+    fields_param = 'fields'
+
+    def get_requested_fields(self):
+        if self.request is None or self.request.method not in ('GET', 'HEAD'):
+            return None
+        value = self.request.query_params.get(self.fields_param, '')
+        requested = [name.strip() for name in value.split(',') if name.strip()]
+        return requested or None
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        requested = self.get_requested_fields()
+        if requested:
+            fields = serializer.child.fields if hasattr(serializer, 'child') else serializer.fields
+            unknown = set(requested) - set(fields)
+            if unknown:
+                raise ValidationError({
+                    self.fields_param: f"Unknown fields: {', '.join(sorted(unknown))}"
+                })
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        requested = self.get_requested_fields()
+        if not requested:
+            return queryset
+        columns = self.get_sparse_columns(queryset.model, requested)
+        return queryset.only(*columns) if columns else queryset
+
+    def get_sparse_columns(self, model, requested):
+        """Model columns behind the requested fields, or None if unknown."""
+        serializer_fields = self.get_serializer_class()().fields
+        ordering = list(getattr(self, 'ordering', None) or [])
+        ordering += self.request.query_params.get('ordering', '').split(',')
+        columns = {'pk'}
+        for name in list(requested) + [o.strip().lstrip('-') for o in ordering if o.strip()]:
+            field = serializer_fields.get(name)
+            source = field.source if field is not None else name
+            if source.startswith('get_') and source.endswith('_display'):
+                source = source[len('get_'):-len('_display')]
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            columns.add(model_field.name)
+        return columns
+
+
+class CachedResponseMixin:
+    """
+    Cache rendered JSON responses of GET requests in the Django cache.
+
+    Responses are keyed by origin (scheme and host: bodies contain absolute
+    media and pagination URLs), path and query parameters (language,
+    filters, ordering, page) within ``cache_namespace``; call
+    core.cache.bump_generation(namespace) when the underlying data changes.
+    Responses carry a strong ETag and conditional requests get 304. When
+    the database is unavailable, the last good response is served with a
+    ``Warning: 110`` header instead of an error.
+    """
+    cache_namespace = None
+    # Query parameter values assumed when absent, so both spellings share an entry
+    cache_default_params = {}
+    cached_headers = ('Vary', 'Allow')
+    # Viewset actions that are not cached (e.g. typeahead, with many distinct queries)
+    uncached_actions = ()
+    # Query parameters whose requests are not cached (e.g. free-text search):
+    # their distinct values are unbounded and would crowd out the other entries
+    uncached_params = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        digest = response_cache.request_digest(
+            request.path, self.get_cache_params(request), origin=request.build_absolute_uri('/')[:-1]
+        )
+        namespace = self.cache_namespace
+        generation = response_cache.get_generation(namespace)
+
+        entry = response_cache.get_entry(namespace, generation, digest)
+        if entry is not None:
+            return self.cached_response(request, entry, 'HIT')
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except DatabaseError as e:
+            entry = response_cache.get_stale_entry(namespace, digest)
+            if entry is None:
+                raise
+            logger.warning(f"Serving stale {request.path} while the database is unavailable: {e}")
+            response = self.cached_response(request, entry, 'STALE')
+            response['Warning'] = '110 - "Response is Stale"'
+            return response
+
+        if response.status_code != 200 or getattr(response, 'accepted_renderer', None) is None:
+            return response
+        if response.accepted_renderer.format != 'json':
+            return response
+
+        response.render()
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {name: response[name] for name in self.cached_headers if response.has_header(name)},
+            'etag': response_cache.make_etag(response.content),
+        }
+        response_cache.set_entry(namespace, generation, digest, entry)
+        response['ETag'] = entry['etag']
+        response['X-Cache'] = 'MISS'
+        if self.etag_matches(request, entry['etag']):
+            return self.not_modified(entry['etag'])
+        return response
+
+    def get_cache_params(self, request):
+        """
+        Query parameters the response depends on, as name -> list of values.
+
+        Views whose output also depends on headers add the resolved values here.
+        """
+        params = {name: request.GET.getlist(name) for name in request.GET}
+        for name, value in self.cache_default_params.items():
+            params.setdefault(name, [value])
+        return params
+
+    def is_cacheable_request(self, request):
+        # Browsers asking for HTML get the browsable API, which is not cached
+        return (
+            self.cache_namespace is not None
+            and request.method in ('GET', 'HEAD')
+            and getattr(self, 'action_map', {}).get(request.method.lower()) not in self.uncached_actions
+            and 'format' not in request.GET
+            and not any(request.GET.get(name) for name in self.uncached_params)
+            and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+        )
+
+    def etag_matches(self, request, etag):
+        header = request.META.get('HTTP_IF_NONE_MATCH')
+        return bool(header) and (header.strip() == '*' or etag in parse_etags(header))
+
+    def not_modified(self, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    def cached_response(self, request, entry, state):
+        if self.etag_matches(request, entry['etag']):
+            return self.not_modified(entry['etag'])
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+        response['ETag'] = entry['etag']
+        response['X-Cache'] = state
+        return response
@@ -1,3 +1,42 @@
 from django.db import models
 
-# Create your models here.
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a request made with an Idempotency-Key.
+
+    The row is inserted as "pending" before the view runs; the unique
+    (scope, client, key) constraint lets exactly one worker claim a key.
+    Keys are scoped per client, so one client can't read another's stored
+    response by guessing its key, and ``fingerprint`` tells a retry from a
+    different request reusing the key. Once the view finishes, the response
+    is stored and returned for repeats until ``expires_at``.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В обработке'),
+        (STATUS_COMPLETE, 'Завершен'),
+    ]
+
+    scope = models.CharField('Область', max_length=50)
+    client = models.CharField('Клиент', max_length=64, default='')  # Hash of the user, or of the user agent
+    key = models.CharField('Ключ', max_length=255)
+    fingerprint = models.CharField('Отпечаток запроса', max_length=64, default='')  # SHA-256 of the request data
+    status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    response_status = models.PositiveSmallIntegerField('HTTP статус', blank=True, null=True)
+    response_body = models.JSONField('Ответ', blank=True, null=True)
+    locked_at = models.DateTimeField('Захвачен')
+    expires_at = models.DateTimeField('Истекает', db_index=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'client', 'key'], name='unique_idempotency_client_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.get_status_display()})"
@@ -0,0 +1,76 @@
+"""
+Pagination classes for large, append-mostly listings.
+
+Cursor pagination seeks on the ordering key instead of using OFFSET and
+skips COUNT(*) unless the client explicitly asks for a total.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination with an opt-in total.
+
+    Query parameters:
+        - cursor: Opaque position returned in `next`/`previous`
+        - page_size: Results per page (max: 200)
+        - with_total: `1` for an exact count cached for a minute,
+          `estimate` for the planner's row estimate of the table
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    total_query_param = 'with_total'
+    total_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total = None
+        mode = request.query_params.get(self.total_query_param)
+        if mode == 'estimate':
+            self.total = self.get_estimated_total(queryset)
+        elif mode in ('1', 'true'):
+            self.total = self.get_cached_total(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_cached_total(self, queryset):
+        sql, params = queryset.order_by().query.sql_with_params()
+        key = 'pagination-total:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        return cache.get_or_set(key, lambda: queryset.order_by().count(), self.total_cache_timeout)
+
+    def get_estimated_total(self, queryset):
+        """Use PostgreSQL table statistics for unfiltered listings."""
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+        return self.get_cached_total(queryset)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.total is not None:
+            payload['count'] = self.total
+        payload['results'] = data
+        return Response(payload)
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """Newest first, keyed on (-created_at, -id)."""
+    ordering = ('-created_at', '-id')
+
+
+class TimestampCursorPagination(KeysetCursorPagination):
+    """Newest analytics events first, keyed on (-timestamp, -id)."""
+    ordering = ('-timestamp', '-id')
+    page_size = 100
@@ -0,0 +1,172 @@
+"""
+Rate limiting shared by all worker processes.
+
+Token buckets live in a small SQLite database in WAL mode. Every check is a
+single UPSERT ... RETURNING statement, which SQLite runs atomically under
+its write lock, so gunicorn workers (and threads) share one budget per key
+without Redis or memcached.
+"""
+from functools import wraps
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+from .utils.helpers import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+RATE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Idle buckets are full again after at most a day, so they can be dropped
+PRUNE_AFTER = 86400
+PRUNE_PROBABILITY = 0.001
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# Refill the bucket for the elapsed time, then take one token if there is
+# one. `allowed` records whether this check got a token.
+CONSUME_SQL = """
+INSERT INTO buckets (key, tokens, updated, allowed)
+VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + MAX(0, :now - updated) * :refill)
+        - (MIN(:capacity, tokens + MAX(0, :now - updated) * :refill) >= 1),
+    allowed = MIN(:capacity, tokens + MAX(0, :now - updated) * :refill) >= 1,
+    updated = MAX(updated, :now)
+RETURNING allowed, tokens
+"""
+
+
+def parse_rate(rate):
+    """
+    Parse a rate such as '5/h', '60/m' or '100/10s'.
+
+    Returns:
+        tuple: (capacity, refill rate in tokens per second)
+    """
+    match = RATE_RE.match(rate or '')
+    if not match:
+        raise ValueError(f'Invalid rate: {rate!r}')
+    count, multiplier, unit = match.groups()
+    period = int(multiplier or 1) * PERIODS[unit]
+    return int(count), int(count) / period
+
+
+class SQLiteTokenBucket:
+    """
+    Token bucket store backed by a SQLite file in WAL mode.
+
+    Connections are opened lazily per thread and re-opened after a fork, so
+    an instance created before gunicorn forks its workers is safe to use.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def consume(self, key, capacity, refill):
+        """
+        Take one token from a bucket.
+
+        Args:
+            key: bucket key, e.g. 'contact_submit:203.0.113.7'
+            capacity: bucket size (burst)
+            refill: tokens added per second
+
+        Returns:
+            tuple: (allowed, seconds until the next token is available)
+        """
+        now = time.time()
+        connection = self._connection()
+        allowed, tokens = connection.execute(CONSUME_SQL, {
+            'key': key, 'capacity': capacity, 'refill': refill, 'now': now,
+        }).fetchone()
+        if random.random() < PRUNE_PROBABILITY:
+            connection.execute('DELETE FROM buckets WHERE updated < ?', [now - PRUNE_AFTER])
+        retry_after = 0 if allowed else (1 - tokens) / refill
+        return bool(allowed), retry_after
+
+    def reset(self, key=None):
+        """Drop one bucket, or all of them."""
+        if key is None:
+            self._connection().execute('DELETE FROM buckets')
+        else:
+            self._connection().execute('DELETE FROM buckets WHERE key = ?', [key])
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = SQLiteTokenBucket(settings.RATE_LIMIT_DB)
+    return _store
+
+
+def is_limited(scope, key, rate=None):
+    """
+    Check and consume the budget of ``key`` in ``scope``.
+
+    The rate defaults to settings.RATE_LIMITS[scope]. If the store can't be
+    used the request is let through rather than failing the endpoint.
+
+    Returns:
+        tuple: (limited, retry_after seconds)
+    """
+    rate = rate or settings.RATE_LIMITS[scope]
+    capacity, refill = parse_rate(rate)
+    try:
+        allowed, retry_after = get_store().consume(f'{scope}:{key}', capacity, refill)
+    except sqlite3.Error as e:
+        logger.error(f"Rate limit store unavailable: {e}")
+        return False, 0
+    return not allowed, retry_after
+
+
+def rate_limit(scope, rate=None, key=get_client_ip, methods=('POST',)):
+    """
+    Decorator that flags requests over the scope's budget.
+
+    Like django-ratelimit with block=False, the view still runs and checks
+    ``request.limited``; ``request.retry_after`` holds the wait in seconds.
+    Each scope has its own budget per key (client IP by default).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            request.limited = False
+            request.retry_after = 0
+            if settings.RATE_LIMIT_ENABLED and request.method in methods:
+                request.limited, request.retry_after = is_limited(scope, key(request) or '', rate)
+            return view_func(request, *args, **kwargs)
+        return wrapped_view
+    return decorator
@@ -0,0 +1,131 @@
+"""
+Fast read representations for model serializers.
+
+DRF builds a representation field by field: get_attribute() walks the
+source, calls callables and checks for missing attributes, then
+to_representation() is dispatched and None and pk-only checks run for
+every value. On list endpoints this machinery costs more than the data.
+
+FastRepresentationMixin compiles the readable fields of a serializer once
+into (name, getter) pairs: plain attribute reads with the conversion of
+the field type for model columns, direct calls for SerializerMethodFields
+and ``get_*_display``, and the pk column for related fields. Rows are
+built as plain dicts. Fields the plan has no shortcut for are read
+through DRF as usual, so the output is the same as without the mixin.
+"""
+from datetime import datetime
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields, relations
+from rest_framework.fields import SkipField
+from rest_framework.settings import api_settings
+
+# Field classes whose representation is str(value)
+STRING_FIELDS = {fields.CharField, fields.EmailField, fields.SlugField, fields.URLField}
+NUMBER_FIELDS = {fields.IntegerField: int, fields.FloatField: float}
+
+
+def _drf_getter(field):
+    """The regular DRF path for one field."""
+    def get(instance):
+        attribute = field.get_attribute(instance)
+        check = attribute.pk if isinstance(attribute, relations.PKOnlyObject) else attribute
+        return None if check is None else field.to_representation(attribute)
+    return get
+
+
+def _converted(read, convert):
+    def get(instance):
+        value = read(instance)
+        return None if value is None else convert(value)
+    return get
+
+
+def _datetime_converter(field):
+    """ISO 8601 in the current time zone, as DateTimeField renders it by default."""
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != fields.ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not isinstance(value, datetime) or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _choice_converter(field):
+    choices = field.choice_strings_to_values
+
+    def convert(value):
+        if value == '':
+            return value
+        return choices.get(str(value), value)
+    return convert
+
+
+class FastRepresentationMixin:
+    """
+    Build read representations from a precompiled per-serializer plan.
+
+    Mix into a ModelSerializer ahead of it. Set ``fast_representation =
+    False`` on a subclass to get the regular DRF path (used by the
+    benchmark_serializers command).
+    """
+    fast_representation = True
+
+    def to_representation(self, instance):
+        if not self.fast_representation:
+            return super().to_representation(instance)
+        plan = getattr(self, '_representation_plan', None)
+        if plan is None:
+            # Compiled on first use, after views have dropped unwanted fields
+            plan = self._representation_plan = [
+                (field.field_name, self._compile_getter(field)) for field in self._readable_fields
+            ]
+        try:
+            return {name: get(instance) for name, get in plan}
+        except SkipField:
+            return super().to_representation(instance)
+
+    def _compile_getter(self, field):
+        if isinstance(field, fields.SerializerMethodField):
+            return getattr(self, field.method_name)
+
+        model = self.Meta.model
+        if len(field.source_attrs) != 1:
+            return _drf_getter(field)
+        source = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            model_field = None
+
+        if model_field is None:
+            # get_FOO_display() and other model methods
+            if callable(getattr(model, source, None)) and type(field) in STRING_FIELDS:
+                return _converted(lambda instance: getattr(instance, source)(), str)
+            return _drf_getter(field)
+
+        if not model_field.concrete or model_field.many_to_many:
+            return _drf_getter(field)
+        if model_field.is_relation:
+            if type(field) is relations.PrimaryKeyRelatedField and field.pk_field is None:
+                return attrgetter(model_field.attname)
+            return _drf_getter(field)
+
+        read = attrgetter(model_field.attname)
+        field_class = type(field)
+        if field_class in STRING_FIELDS:
+            return _converted(read, str)
+        if field_class in NUMBER_FIELDS:
+            return _converted(read, NUMBER_FIELDS[field_class])
+        if field_class is fields.ChoiceField:
+            return _converted(read, _choice_converter(field))
+        if field_class is fields.DateTimeField:
+            return _converted(read, _datetime_converter(field))
+        # Files, JSON, booleans, ...: the field's own conversion
+        return _converted(read, field.to_representation)
@@ -1,3 +1,115 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from leads.models import Lead
+from .middleware import AdmissionController, parse_request_start
+
+
+class AdmissionQueueTimeTests(SimpleTestCase):
+    """Queue time drives shedding where in-flight counts can't (sync workers)."""
+
+    def test_parse_request_start(self):
+        self.assertEqual(parse_request_start('t=1700000000.250'), 1700000000.25)
+        self.assertEqual(parse_request_start('1700000000250'), 1700000000.25)
+        self.assertEqual(parse_request_start('t=1700000000250000'), 1700000000.25)
+        self.assertIsNone(parse_request_start('soon'))
+        self.assertIsNone(parse_request_start(None))
+
+    def test_long_queue_sheds_analytics(self):
+        controller = AdmissionController({**settings.ADMISSION_CONTROL, 'LATENCY_ALPHA': 1.0})
+        track, submit = '/api/analytics/track/', '/api/leads/submit/'
+
+        controller.record_queue(settings.ADMISSION_CONTROL['QUEUE_SHED_MS'] * 2)
+
+        self.assertEqual(controller.admit(track), 'shed')
+        self.assertIsNone(controller.admit(submit))
+        self.assertEqual(controller.in_flight, 1)
+
+
+class MetricsAccessTests(TestCase):
+    def setUp(self):
+        self.url = reverse('core:metrics')
+
+    def test_anonymous_is_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_non_staff_is_refused(self):
+        self.client.force_login(get_user_model().objects.create_user('viewer', password='secret'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_gets_prometheus_text(self):
+        self.client.force_login(get_user_model().objects.create_user('ops', password='secret', is_staff=True))
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'paradise_admission_queue_ms', response.content)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   RATE_LIMIT_ENABLED=False)
+class IdempotencyKeyTests(TestCase):
+    """Keys replay retries of the same client and request only."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = reverse('leads:contact-submit')
+        self.data = {
+            'name': 'Тест', 'company': 'ООО Тест', 'phone': '+998901234567', 'product_type': 'woven',
+        }
+
+    def submit(self, data, user_agent='browser-a', ip='203.0.113.7'):
+        return self.client.post(
+            self.url, data, HTTP_IDEMPOTENCY_KEY='retry-key-0001', HTTP_USER_AGENT=user_agent, REMOTE_ADDR=ip,
+        )
+
+    def test_retry_replays_the_response(self):
+        first = self.submit(self.data)
+        second = self.submit(self.data)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Lead.objects.count(), 1)
+
+    def test_retry_from_another_network(self):
+        first = self.submit(self.data)
+        second = self.submit(self.data, ip='198.51.100.23')
+
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Lead.objects.count(), 1)
+
+    def test_retry_with_a_file(self):
+        def upload(content):
+            return SimpleUploadedFile('brief.pdf', b'%PDF-1.4 ' + content)
+
+        self.assertEqual(self.submit({**self.data, 'file': upload(b'one')}).status_code, 201)
+        self.assertEqual(self.submit({**self.data, 'file': upload(b'one')})['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.submit({**self.data, 'file': upload(b'two')}).status_code, 422)
+
+    def test_reused_key_with_different_data(self):
+        self.submit(self.data)
+        response = self.submit({**self.data, 'company': 'ООО Другая'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Lead.objects.count(), 1)
+
+    def test_keys_are_per_client(self):
+        self.submit(self.data)
+        response = self.submit(self.data, user_agent='browser-b')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Lead.objects.count(), 2)
@@ -8,4 +8,5 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.health_check, name='health_check'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
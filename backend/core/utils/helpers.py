@@ -1,6 +1,7 @@
 """
 Helper utility functions for IP extraction, user agent parsing, etc.
 """
+from django.conf import settings
 
 
 def get_client_ip(request):
@@ -47,3 +48,70 @@ def get_session_id(request):
     if not request.session.session_key:
         request.session.create()
     return request.session.session_key
+
+
+def get_phone_digits(phone):
+    """
+    Normalize a phone number to its digits for indexed lookups.
+    
+    Args:
+        phone: Phone number as entered by the user
+    
+    Returns:
+        str: Digits only, e.g. '+998 (90) 123-45-67' -> '998901234567'
+    """
+    return ''.join(c for c in (phone or '') if c.isdigit())
+
+
+def normalize_phone(phone, country_code=None):
+    """
+    Normalize a phone number to E.164 digits (without the leading '+').
+    
+    Local numbers without a country code get the default country code
+    (settings.DEFAULT_PHONE_COUNTRY_CODE, Uzbekistan by default).
+    
+    Args:
+        phone: Phone number as entered by the user
+        country_code: Optional country code override
+    
+    Returns:
+        str: E.164 digits, e.g. '90 123 45 67' -> '998901234567'
+    """
+    digits = get_phone_digits(phone)
+    if not digits:
+        return ''
+    country_code = country_code or settings.DEFAULT_PHONE_COUNTRY_CODE
+    if digits.startswith('00'):
+        return digits[2:]
+    if (phone or '').strip().startswith('+'):
+        return digits
+    if len(digits) == 10 and digits.startswith('8') and country_code == '998':
+        # Legacy trunk prefix: 8 90 1234567
+        return country_code + digits[1:]
+    if len(digits) == 9:
+        return country_code + digits
+    return digits
+
+
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    # Uzbek Cyrillic
+    'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+
+
+def transliterate(text):
+    """
+    Transliterate Russian/Uzbek Cyrillic text to lowercase Latin.
+    
+    Args:
+        text: Text in any script
+    
+    Returns:
+        str: Lowercase text with Cyrillic letters replaced by Latin ones
+    """
+    return ''.join(CYRILLIC_TO_LATIN.get(c, c) for c in (text or '').lower())
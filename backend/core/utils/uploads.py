@@ -0,0 +1,159 @@
+"""
+Streaming upload handling for public file uploads.
+
+Uploaded files are written to a temporary file chunk by chunk, hashed with
+SHA-256 on the fly and rejected as soon as they exceed the size limit or
+their first bytes don't match the declared extension. Accepted files are
+stored under their content hash, so identical uploads are stored once.
+"""
+from functools import wraps
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of each allowed file type
+MAGIC_SIGNATURES = {
+    '.pdf': (b'%PDF',),
+    '.doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    '.docx': (b'PK\x03\x04',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.gif': (b'GIF87a', b'GIF89a'),
+}
+MAGIC_LENGTH = max(len(sig) for sigs in MAGIC_SIGNATURES.values() for sig in sigs)
+
+
+def get_extension(file_name):
+    return os.path.splitext(file_name or '')[1].lower()
+
+
+class StreamingHashUploadHandler(FileUploadHandler):
+    """
+    Upload handler that streams files to disk with early rejection.
+
+    On rejection the reason is stored in ``request.upload_error`` and the
+    rest of the request body is discarded without being buffered.
+    """
+
+    def __init__(self, request=None, max_size=None, allowed_extensions=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.LEAD_FILE_MAX_SIZE
+        self.allowed_extensions = allowed_extensions or settings.ALLOWED_UPLOAD_EXTENSIONS
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.extension = get_extension(self.file_name)
+        if self.extension not in self.allowed_extensions:
+            self.reject(
+                f"Недопустимый формат файла. Разрешены: {', '.join(self.allowed_extensions)}"
+            )
+        if self.content_length and self.content_length > self.max_size:
+            self.reject_size()
+
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.header = b''
+        self.header_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject_size()
+
+        if not self.header_checked:
+            self.header += raw_data[:MAGIC_LENGTH - len(self.header)]
+            if len(self.header) >= MAGIC_LENGTH:
+                self.check_header()
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.header_checked:
+            self.check_header()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hasher.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        self.discard()
+
+    def check_header(self):
+        self.header_checked = True
+        signatures = MAGIC_SIGNATURES.get(self.extension, ())
+        if not any(self.header.startswith(signature) for signature in signatures):
+            self.reject('Содержимое файла не соответствует его расширению')
+
+    def reject_size(self):
+        limit_mb = self.max_size // (1024 * 1024)
+        self.reject(f"Размер файла не должен превышать {limit_mb} МБ")
+
+    def reject(self, message):
+        logger.warning(f"Upload rejected ({self.file_name}): {message}")
+        if self.request is not None:
+            self.request.upload_error = message
+        self.discard()
+        # Let Django drain the body so the client still gets our 400 response
+        raise StopUpload(connection_reset=False)
+
+    def discard(self):
+        file = getattr(self, 'file', None)
+        if file is not None:
+            try:
+                file.close()
+            except OSError:
+                pass
+        # The closed file stays on the handler: MultiPartParser closes
+        # ``handler.file`` of every handler after a StopUpload
+
+
+def streaming_uploads(view_func):
+    """
+    Use StreamingHashUploadHandler for a view's multipart uploads.
+
+    Must wrap the view outside of DRF's @api_view so the handlers are set
+    before the request body is parsed.
+    """
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        request.upload_handlers = [StreamingHashUploadHandler(request)]
+        return view_func(request, *args, **kwargs)
+    return wrapped_view
+
+
+def store_content_addressed(uploaded_file, prefix):
+    """
+    Save an uploaded file under its SHA-256, reusing an existing copy.
+
+    Args:
+        uploaded_file: File from StreamingHashUploadHandler (has ``sha256``)
+        prefix: Storage directory, e.g. 'leads/files'
+
+    Returns:
+        str: Storage name to assign to a FileField
+    """
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        uploaded_file.seek(0)
+
+    name = f'{prefix}/{digest[:2]}/{digest}{get_extension(uploaded_file.name)}'
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, uploaded_file)
@@ -1,16 +1,21 @@
 """
 Core views for Paradise Accessories backend.
-Includes health check endpoint and error handlers.
+Includes health check and metrics endpoints and error handlers.
 """
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.db import connection
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 import logging
 
+from .middleware import STATES, get_controller
+
+STATE_LEVELS = {state: level for level, state in enumerate(STATES)}
+
 logger = logging.getLogger(__name__)
 
 
@@ -71,6 +76,11 @@ def health_check(request):
         }
         overall_healthy = False
     
+    # Admission control (this worker only)
+    admission = get_controller().snapshot()
+    admission['status'] = 'healthy' if admission['state'] == 'normal' else 'degraded'
+    health_status['checks']['admission'] = admission
+    
     # Update overall status
     if not overall_healthy:
         health_status['status'] = 'unhealthy'
@@ -79,6 +89,53 @@ def health_check(request):
     return Response(health_status, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, BasicAuthentication])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """
+    Prometheus text metrics for the worker that serves the request.
+    
+    Staff users only; Prometheus scrapes it with basic_auth of a staff
+    account. Every gunicorn worker keeps its own counters, so each series
+    is labelled with the worker pid; sum over ``worker`` for totals.
+    """
+    if not settings.ENABLE_HEALTH_CHECK:
+        return HttpResponse(status=503)
+    
+    snapshot = get_controller().snapshot()
+    worker = snapshot['pid']
+    lines = [
+        '# HELP paradise_admission_state Current admission state (0 normal, 1 sample, 2 shed)',
+        '# TYPE paradise_admission_state gauge',
+        f'paradise_admission_state{{worker="{worker}"}} {STATE_LEVELS[snapshot["state"]]}',
+        '# HELP paradise_admission_db_latency_ms Moving average of DB query time',
+        '# TYPE paradise_admission_db_latency_ms gauge',
+        f'paradise_admission_db_latency_ms{{worker="{worker}"}} {snapshot["db_latency_ms"]}',
+        '# HELP paradise_admission_queue_ms Moving average of the wait since X-Request-Start',
+        '# TYPE paradise_admission_queue_ms gauge',
+        f'paradise_admission_queue_ms{{worker="{worker}"}} {snapshot["queue_ms"]}',
+        '# HELP paradise_admission_in_flight Requests being served',
+        '# TYPE paradise_admission_in_flight gauge',
+        f'paradise_admission_in_flight{{worker="{worker}"}} {snapshot["in_flight"]}',
+        '# HELP paradise_admission_rejected_total Requests answered without running the view',
+        '# TYPE paradise_admission_rejected_total counter',
+    ]
+    for reason, counts in (('shed', snapshot['shed']), ('sampled', snapshot['sampled_out'])):
+        for path, count in sorted(counts.items()):
+            lines.append(
+                f'paradise_admission_rejected_total{{worker="{worker}",reason="{reason}",path="{path}"}} {count}'
+            )
+    lines += [
+        '# HELP paradise_admission_transitions_total State changes by new state',
+        '# TYPE paradise_admission_transitions_total counter',
+    ]
+    for state, count in sorted(snapshot['transitions'].items()):
+        lines.append(f'paradise_admission_transitions_total{{worker="{worker}",state="{state}"}} {count}')
+    
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def custom_404_handler(request, exception):
     """
     Custom 404 handler for API endpoints.
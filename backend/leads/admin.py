@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Lead
+from .models import Lead, LeadAttributionDaily, LeadBulkOperation, LeadStatusChange, LeadTag
+from . import services
+from .search import search_leads
 
 
 @admin.register(Lead)
@@ -10,11 +12,11 @@ class LeadAdmin(admin.ModelAdmin):
     """
     list_display = (
         'id', 'created_at', 'name', 'company', 'phone',
-        'product_type_badge', 'status_badge', 'language', 'has_file'
+        'product_type_badge', 'status_badge', 'language', 'has_file', 'spam_score'
     )
     
     list_filter = (
-        'status', 'product_type', 'language', 'created_at'
+        'status', 'product_type', 'language', 'duplicate_reason', 'tags', 'created_at'
     )
     
     search_fields = (
@@ -22,7 +24,8 @@ class LeadAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = (
-        'created_at', 'updated_at', 'ip_address', 'user_agent'
+        'created_at', 'updated_at', 'status_changed_at', 'ip_address', 'user_agent',
+        'session_id', 'duplicate_of', 'duplicate_reason', 'spam_score'
     )
     
     fieldsets = (
@@ -33,23 +36,27 @@ class LeadAdmin(admin.ModelAdmin):
             'fields': ('product_type', 'quantity', 'message', 'file')
         }),
         ('Управление', {
-            'fields': ('status',)
+            'fields': ('status', 'tags', 'duplicate_of', 'duplicate_reason', 'spam_score')
         }),
         ('Метаданные', {
-            'fields': ('language', 'source', 'ip_address', 'user_agent'),
+            'fields': ('language', 'source', 'session_id', 'ip_address', 'user_agent'),
             'classes': ('collapse',)
         }),
         ('Временные метки', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'status_changed_at'),
             'classes': ('collapse',)
         }),
     )
     
+    filter_horizontal = ('tags',)
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     list_per_page = 50
     
-    actions = ['mark_as_contacted', 'mark_as_qualified', 'mark_as_closed', 'export_to_csv']
+    actions = [
+        'mark_as_contacted', 'mark_as_qualified', 'mark_as_closed',
+        'mark_as_rejected', 'mark_as_new', 'export_to_csv'
+    ]
     
     def product_type_badge(self, obj):
         """Display product type as colored badge."""
@@ -76,6 +83,7 @@ class LeadAdmin(admin.ModelAdmin):
             'qualified': '#2196F3',
             'closed': '#4CAF50',
             'rejected': '#9E9E9E',
+            'spam': '#795548',
         }
         color = colors.get(obj.status, '#999')
         return format_html(
@@ -92,25 +100,49 @@ class LeadAdmin(admin.ModelAdmin):
         return format_html('<span style="color: #ccc;">✗</span>')
     has_file.short_description = 'Файл'
     
+    def save_model(self, request, obj, form, change):
+        """Attribute status changes to the admin user for the status history."""
+        obj._status_changed_by = request.user
+        obj._status_change_origin = 'admin'
+        super().save_model(request, obj, form, change)
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of icontains over every field."""
+        if not search_term.strip():
+            return queryset, False
+        return search_leads(queryset, search_term), False
+    
     # Custom actions
     def mark_as_contacted(self, request, queryset):
         """Mark selected leads as contacted."""
-        updated = queryset.update(status='contacted')
+        updated = services.update_status(queryset, 'contacted', user=request.user, origin='admin')
         self.message_user(request, f'{updated} заявок отмечено как "Связались"')
     mark_as_contacted.short_description = 'Отметить как "Связались"'
     
     def mark_as_qualified(self, request, queryset):
         """Mark selected leads as qualified."""
-        updated = queryset.update(status='qualified')
+        updated = services.update_status(queryset, 'qualified', user=request.user, origin='admin')
         self.message_user(request, f'{updated} заявок отмечено как "Квалифицирован"')
     mark_as_qualified.short_description = 'Отметить как "Квалифицирован"'
     
     def mark_as_closed(self, request, queryset):
         """Mark selected leads as closed."""
-        updated = queryset.update(status='closed')
+        updated = services.update_status(queryset, 'closed', user=request.user, origin='admin')
         self.message_user(request, f'{updated} заявок отмечено как "Закрыт"')
     mark_as_closed.short_description = 'Отметить как "Закрыт"'
     
+    def mark_as_rejected(self, request, queryset):
+        """Reject selected leads; rejected leads train the spam model."""
+        updated = services.update_status(queryset, 'rejected', user=request.user, origin='admin')
+        self.message_user(request, f'{updated} заявок отмечено как "Отклонен"')
+    mark_as_rejected.short_description = 'Отклонить (спам)'
+    
+    def mark_as_new(self, request, queryset):
+        """Return selected leads (e.g. wrongly flagged as spam) to new."""
+        updated = services.update_status(queryset, 'new', user=request.user, origin='admin')
+        self.message_user(request, f'{updated} заявок отмечено как "Новый"')
+    mark_as_new.short_description = 'Вернуть в "Новый" (не спам)'
+    
     def export_to_csv(self, request, queryset):
         """Export selected leads to CSV."""
         import csv
@@ -142,3 +174,72 @@ class LeadAdmin(admin.ModelAdmin):
         
         return response
     export_to_csv.short_description = 'Экспортировать в CSV'
+
+
+@admin.register(LeadTag)
+class LeadTagAdmin(admin.ModelAdmin):
+    """
+    Admin for lead tags.
+    """
+    list_display = ('name', 'created_at')
+    search_fields = ('name',)
+
+
+@admin.register(LeadStatusChange)
+class LeadStatusChangeAdmin(admin.ModelAdmin):
+    """
+    Read-only status history (append-only).
+    """
+    list_display = ('changed_at', 'lead', 'from_status', 'to_status', 'duration_hours', 'user', 'origin')
+    list_filter = ('to_status', 'from_status', 'origin', 'changed_at')
+    list_select_related = ('lead', 'user')
+    readonly_fields = ('lead', 'from_status', 'to_status', 'changed_at', 'duration_seconds', 'user', 'origin')
+    date_hierarchy = 'changed_at'
+
+    def duration_hours(self, obj):
+        return round(obj.duration_seconds / 3600, 1)
+    duration_hours.short_description = 'Часов в статусе'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LeadBulkOperation)
+class LeadBulkOperationAdmin(admin.ModelAdmin):
+    """
+    Read-only audit log of bulk lead operations.
+    """
+    list_display = ('created_at', 'action', 'user', 'affected')
+    list_filter = ('action', 'created_at')
+    readonly_fields = ('action', 'user', 'criteria', 'changes', 'lead_ids', 'affected', 'created_at')
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LeadAttributionDaily)
+class LeadAttributionDailyAdmin(admin.ModelAdmin):
+    """
+    Read-only daily attribution aggregates (rebuilt by rebuild_lead_attribution).
+    """
+    list_display = ('date', 'model', 'source', 'landing_page', 'leads')
+    list_filter = ('model', 'date')
+    search_fields = ('source', 'landing_page')
+    readonly_fields = ('date', 'model', 'source', 'landing_page', 'leads', 'total_seconds')
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
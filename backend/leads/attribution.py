@@ -0,0 +1,186 @@
+"""
+Lead attribution from analytics sessions.
+
+The contact form sends the analytics session id with the lead. Per-lead
+journeys (landing page, referrer, pages viewed, time to convert) are read
+with correlated subqueries that seek the (session_id, -timestamp) index of
+AnalyticsEvent, so their cost depends on the page of leads shown, not on
+the size of the event log. First-touch and last-touch aggregates are
+precomputed per day into LeadAttributionDaily by rebuild_lead_attribution.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from analytics import channels
+from analytics.models import AnalyticsEvent
+from .models import Lead, LeadAttributionDaily
+
+DIRECT = 'direct'
+# Leads without a session or whose session has no events before the lead
+UNKNOWN = 'unknown'
+SESSION_BATCH_SIZE = 500
+
+
+def annotate_journeys(queryset):
+    """
+    Annotate leads with the analytics journey that led to them.
+
+    Adds ``landing_page``, ``referrer`` and ``first_seen`` (from the first
+    event of the session) and ``pages_viewed`` (page views up to the lead).
+    """
+    events = AnalyticsEvent.objects.filter(
+        session_id=OuterRef('session_id'),
+        timestamp__lte=OuterRef('created_at'),
+    )
+    first_event = events.order_by('timestamp')
+    # Filtering on event_type in the aggregate rather than in WHERE keeps
+    # the planner on the session index instead of the event_type one
+    page_views = (
+        events.order_by()
+        .values('session_id')
+        .annotate(count=Count('id', filter=Q(event_type='page_view')))
+        .values('count')
+    )
+    return queryset.annotate(
+        landing_page=Subquery(first_event.values('page')[:1]),
+        referrer=Subquery(first_event.values('referrer')[:1]),
+        first_seen=Subquery(first_event.values('timestamp')[:1]),
+        pages_viewed=Coalesce(Subquery(page_views, output_field=IntegerField()), Value(0)),
+    )
+
+
+def landing_path(page):
+    """Page path without query string and fragment."""
+    return (urlsplit(page).path or '/')[:500]
+
+
+def _touch(event, internal):
+    _, page, referrer = event
+    host = channels.referrer_domain(referrer)
+    return (host if host and host not in internal else DIRECT), landing_path(page)
+
+
+def _day_bounds(start, end):
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    )
+
+
+def compute_attribution(start, end):
+    """
+    First-touch and last-touch attribution of leads created from ``start``
+    to ``end`` (local dates, inclusive). Spam leads are left out.
+
+    The first touch is the first event of the lead's session; the last
+    touch is the last event before the lead that came from another site,
+    or the first event when there is none.
+
+    Returns:
+        dict: (date, model, source, landing page) -> [leads, seconds to convert]
+    """
+    start_at, end_at = _day_bounds(start, end)
+    leads = list(
+        Lead.objects
+        .filter(created_at__gte=start_at, created_at__lt=end_at)
+        .exclude(status='spam')
+        .values_list('session_id', 'created_at')
+    )
+
+    sessions = sorted({session_id for session_id, _ in leads if session_id})
+    events = defaultdict(list)
+    for i in range(0, len(sessions), SESSION_BATCH_SIZE):
+        rows = (
+            AnalyticsEvent.objects
+            .filter(session_id__in=sessions[i:i + SESSION_BATCH_SIZE], timestamp__lt=end_at)
+            .order_by('session_id', 'timestamp')
+            .values_list('session_id', 'timestamp', 'page', 'referrer')
+        )
+        for session_id, *event in rows.iterator(chunk_size=2000):
+            events[session_id].append(event)
+
+    internal = channels.internal_hosts()
+    stats = defaultdict(lambda: [0, 0.0])
+    for session_id, created_at in leads:
+        date = timezone.localdate(created_at)
+        journey = [event for event in events.get(session_id, ()) if event[0] <= created_at]
+        if not journey:
+            for model in ('first', 'last'):
+                stats[(date, model, UNKNOWN, '')][0] += 1
+            continue
+
+        seconds = max((created_at - journey[0][0]).total_seconds(), 0.0)
+        first = _touch(journey[0], internal)
+        external = [event for event in journey if _touch(event, internal)[0] != DIRECT]
+        last = _touch(external[-1], internal) if external else first
+        for model, touch in (('first', first), ('last', last)):
+            stat = stats[(date, model, *touch)]
+            stat[0] += 1
+            stat[1] += seconds
+    return stats
+
+
+def rebuild_attribution(start, end):
+    """
+    Recompute the daily attribution rows for a range of dates.
+
+    Returns:
+        int: number of rows written
+    """
+    rows = [
+        LeadAttributionDaily(
+            date=date,
+            model=model,
+            source=source[:255],
+            landing_page=landing_page,
+            leads=count,
+            total_seconds=seconds,
+        )
+        for (date, model, source, landing_page), (count, seconds) in compute_attribution(start, end).items()
+    ]
+    with transaction.atomic():
+        LeadAttributionDaily.objects.filter(date__gte=start, date__lte=end).delete()
+        LeadAttributionDaily.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def get_attribution_summary(days=30, limit=20):
+    """
+    First-touch and last-touch attribution over the last ``days`` days.
+
+    Returns:
+        dict: per model, leads and average hours to convert by source and
+              by landing page (top ``limit`` each)
+    """
+    start = timezone.localdate() - timedelta(days=days - 1)
+    queryset = LeadAttributionDaily.objects.filter(date__gte=start)
+
+    def rows(model, field):
+        grouped = (
+            queryset.filter(model=model)
+            .values(field)
+            .annotate(count=Sum('leads'), seconds=Sum('total_seconds'))
+            .order_by('-count', field)[:limit]
+        )
+        return [
+            {
+                field: row[field],
+                'leads': row['count'],
+                'avg_hours_to_convert': round(row['seconds'] / row['count'] / 3600, 2) if row['count'] else None,
+            }
+            for row in grouped
+        ]
+
+    total = queryset.filter(model='first').aggregate(total=Sum('leads'))['total'] or 0
+    return {
+        'days': days,
+        'total_leads': total,
+        'first_touch': {'by_source': rows('first', 'source'), 'by_landing_page': rows('first', 'landing_page')},
+        'last_touch': {'by_source': rows('last', 'source'), 'by_landing_page': rows('last', 'landing_page')},
+    }
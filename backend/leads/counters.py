@@ -0,0 +1,178 @@
+"""
+Daily lead counters.
+
+Each LeadDailyCounter row holds the number of leads created on a given day
+that currently have a given status, product type and language. Statistics
+are answered from this small table instead of counting the Lead table.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Lead, LeadDailyCounter
+
+
+def counter_key(created_at, status, product_type, language):
+    """Build the counter key for a lead's values."""
+    return (timezone.localdate(created_at), status, product_type, language)
+
+
+def lead_counter_key(lead):
+    """Counter key for a saved Lead instance."""
+    return counter_key(lead.created_at, lead.status, lead.product_type, lead.language)
+
+
+def apply_deltas(deltas):
+    """
+    Apply counter changes.
+
+    Args:
+        deltas: mapping of counter key -> change in count
+    """
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        date, status, product_type, language = key
+        lookup = {
+            'date': date,
+            'status': status,
+            'product_type': product_type,
+            'language': language,
+        }
+        updated = LeadDailyCounter.objects.filter(**lookup).update(count=F('count') + delta)
+        if updated:
+            continue
+        try:
+            with transaction.atomic():
+                LeadDailyCounter.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Another worker created the row in the meantime
+            LeadDailyCounter.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def count_queryset(queryset):
+    """
+    Aggregate a Lead queryset into counter keys in a single query.
+
+    Returns:
+        Counter: counter key -> number of leads
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'product_type', 'language')
+        .annotate(total=Count('id'))
+    )
+    result = Counter()
+    for row in rows:
+        key = (row['day'], row['status'], row['product_type'], row['language'])
+        result[key] += row['total']
+    return result
+
+
+def rebuild():
+    """
+    Recompute all counters from the Lead table.
+
+    Returns:
+        int: number of counter cells that had drifted
+    """
+    actual = count_queryset(Lead.objects.all())
+    with transaction.atomic():
+        stored = Counter({
+            (row.date, row.status, row.product_type, row.language): row.count
+            for row in LeadDailyCounter.objects.select_for_update()
+        })
+        drift = sum(1 for key in set(actual) | set(stored) if actual[key] != stored[key])
+        LeadDailyCounter.objects.all().delete()
+        LeadDailyCounter.objects.bulk_create([
+            LeadDailyCounter(
+                date=date, status=status, product_type=product_type,
+                language=language, count=count,
+            )
+            for (date, status, product_type, language), count in actual.items()
+            if count
+        ], batch_size=500)
+    return drift
+
+
+def drift_report():
+    """Compare stored counters with the Lead table without changing anything."""
+    actual = count_queryset(Lead.objects.all())
+    stored = Counter({
+        (row.date, row.status, row.product_type, row.language): row.count
+        for row in LeadDailyCounter.objects.all()
+    })
+    return {
+        key: (stored[key], actual[key])
+        for key in set(actual) | set(stored)
+        if actual[key] != stored[key]
+    }
+
+
+def get_stats(days=30):
+    """
+    Build lead statistics from the counters table.
+
+    Args:
+        days: length of the daily time series
+
+    Returns:
+        dict: totals by status, product type and language, windowed totals
+              and a zero-filled daily series (oldest first)
+    """
+    today = timezone.localdate()
+    week_start = timezone.localdate(timezone.now() - timedelta(days=7))
+    month_start = timezone.localdate(timezone.now() - timedelta(days=30))
+    series_start = today - timedelta(days=days - 1)
+
+    by_status = Counter()
+    by_product_type = Counter()
+    by_language = Counter()
+    totals = (
+        LeadDailyCounter.objects
+        .values('status', 'product_type', 'language')
+        .annotate(total=Sum('count'))
+    )
+    for row in totals:
+        by_status[row['status']] += row['total']
+        by_product_type[row['product_type']] += row['total']
+        by_language[row['language']] += row['total']
+
+    daily = {
+        series_start + timedelta(days=i): {status: 0 for status, _ in Lead.STATUS_CHOICES}
+        for i in range(days)
+    }
+    leads_this_week = 0
+    leads_this_month = 0
+    recent = (
+        LeadDailyCounter.objects
+        .filter(date__gte=min(series_start, month_start))
+        .values('date', 'status')
+        .annotate(total=Sum('count'))
+    )
+    for row in recent:
+        if row['date'] >= week_start:
+            leads_this_week += row['total']
+        if row['date'] >= month_start:
+            leads_this_month += row['total']
+        if row['date'] in daily:
+            day = daily[row['date']]
+            day[row['status']] = day.get(row['status'], 0) + row['total']
+
+    return {
+        'total_leads': sum(by_status.values()),
+        'by_status': dict(by_status),
+        'by_product_type': {key: value for key, value in by_product_type.items() if value},
+        'by_language': {key: value for key, value in by_language.items() if value},
+        'leads_this_week': leads_this_week,
+        'leads_this_month': leads_this_month,
+        'daily': [
+            {'date': date.isoformat(), 'total': sum(counts.values()), **counts}
+            for date, counts in sorted(daily.items())
+        ],
+    }
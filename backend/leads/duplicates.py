@@ -0,0 +1,152 @@
+"""
+Duplicate lead detection.
+
+A lead is a duplicate when an earlier lead has the same normalized phone
+or email (exact, indexed lookups), or a company name in the same block
+(``company_key``) with a trigram similarity above
+settings.LEAD_DUPLICATE_COMPANY_SIMILARITY. Blocking keeps fuzzy matching
+to a handful of candidates instead of comparing every pair.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import Q
+
+from core.utils.helpers import normalize_phone, transliterate
+
+# Legal-form words that carry no identity ("ООО Paradise" == "Paradise LLC")
+LEGAL_FORMS = {
+    'ooo', 'oao', 'zao', 'ao', 'pao', 'ip', 'chp', 'mchj', 'xk', 'aj', 'qk',
+    'llc', 'ltd', 'inc', 'jsc', 'co', 'corp', 'company', 'group',
+}
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+BLOCK_KEY_LENGTH = 4
+# Only the most recent leads of a block are compared
+MAX_BLOCK_CANDIDATES = 50
+
+REASON_PHONE = 'phone'
+REASON_EMAIL = 'email'
+REASON_COMPANY = 'company'
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def normalize_company(company):
+    """Lowercase, transliterate and drop punctuation and legal forms."""
+    words = NON_ALNUM_RE.sub(' ', transliterate(company)).split()
+    return ' '.join(word for word in words if word not in LEGAL_FORMS)
+
+
+def company_block_key(company):
+    """Blocking key: the first letters of the normalized company name."""
+    return normalize_company(company).replace(' ', '')[:BLOCK_KEY_LENGTH]
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def normalized_fields(phone, email, company):
+    """Values for the indexed normalized columns of a lead."""
+    return {
+        'phone_digits': normalize_phone(phone),
+        'email_normalized': normalize_email(email),
+        'company_key': company_block_key(company),
+    }
+
+
+def find_duplicate(phone_digits, email_normalized, company, company_key, exclude_id=None):
+    """
+    Find the original lead that a new lead duplicates.
+
+    Runs at most two indexed queries.
+
+    Returns:
+        tuple: (original lead id or None, reason)
+    """
+    from .models import Lead
+
+    queryset = Lead.objects.order_by('created_at', 'id')
+    if exclude_id is not None:
+        queryset = queryset.exclude(id=exclude_id)
+
+    exact = Q()
+    if phone_digits:
+        exact |= Q(phone_digits=phone_digits)
+    if email_normalized:
+        exact |= Q(email_normalized=email_normalized)
+    if exact:
+        match = queryset.filter(exact).values('id', 'duplicate_of_id', 'phone_digits').first()
+        if match:
+            reason = REASON_PHONE if phone_digits and match['phone_digits'] == phone_digits else REASON_EMAIL
+            return match['duplicate_of_id'] or match['id'], reason
+
+    if company_key:
+        target = trigrams(normalize_company(company))
+        candidates = (
+            queryset.filter(company_key=company_key)
+            .order_by('-created_at')
+            .values_list('id', 'duplicate_of_id', 'company')[:MAX_BLOCK_CANDIDATES]
+        )
+        best_id, best_score = None, settings.LEAD_DUPLICATE_COMPANY_SIMILARITY
+        for lead_id, duplicate_of_id, candidate in candidates:
+            score = similarity(target, trigrams(normalize_company(candidate)))
+            if score >= best_score:
+                best_id, best_score = duplicate_of_id or lead_id, score
+        if best_id:
+            return best_id, REASON_COMPANY
+
+    return None, ''
+
+
+class DuplicateIndex:
+    """
+    In-memory index for batch deduplication of historical leads.
+
+    Leads must be added in creation order; each one is matched against the
+    leads added before it using the same rules as find_duplicate().
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold if threshold is not None else settings.LEAD_DUPLICATE_COMPANY_SIMILARITY
+        self.by_phone = {}
+        self.by_email = {}
+        self.blocks = {}
+
+    def add(self, lead_id, phone_digits, email_normalized, company, company_key):
+        """Register a lead and return (original lead id or None, reason)."""
+        original, reason = None, ''
+        if phone_digits and phone_digits in self.by_phone:
+            original, reason = self.by_phone[phone_digits], REASON_PHONE
+        elif email_normalized and email_normalized in self.by_email:
+            original, reason = self.by_email[email_normalized], REASON_EMAIL
+
+        grams = trigrams(normalize_company(company))
+        block = self.blocks.setdefault(company_key, []) if company_key else None
+        if original is None and block:
+            best_score = self.threshold
+            for candidate_id, candidate_grams in block:
+                score = similarity(grams, candidate_grams)
+                if score >= best_score:
+                    original, reason, best_score = candidate_id, REASON_COMPANY, score
+
+        root = original or lead_id
+        if phone_digits:
+            self.by_phone.setdefault(phone_digits, root)
+        if email_normalized:
+            self.by_email.setdefault(email_normalized, root)
+        if block is not None:
+            block.insert(0, (root, grams))
+            del block[MAX_BLOCK_CANDIDATES:]
+        return original, reason
@@ -0,0 +1,170 @@
+"""
+Lead status history and pipeline metrics.
+
+Every status change appends a LeadStatusChange row and adds to the daily
+LeadStatusTransitionStat aggregate in the same transaction. Pipeline
+metrics are read from the aggregate, so their cost depends on the number
+of days and statuses, not on the size of the history.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Lead, LeadStatusChange, LeadStatusTransitionStat
+
+
+def record_transitions(rows, to_status, changed_at, user=None, origin='system'):
+    """
+    Log status changes of several leads to the same status.
+
+    Args:
+        rows: iterable of (lead id, previous status, time the previous status was set)
+        to_status: new status
+        changed_at: time of the change
+        user: user who made the change, if any
+        origin: 'admin', 'api', 'bulk' or 'system'
+
+    Returns:
+        int: number of logged transitions
+    """
+    if user is not None and not user.is_authenticated:
+        user = None
+
+    changes = []
+    stats = defaultdict(lambda: [0, 0.0])
+    date = timezone.localdate(changed_at)
+    for lead_id, from_status, since in rows:
+        if from_status == to_status:
+            continue
+        duration = max((changed_at - since).total_seconds(), 0.0) if since else 0.0
+        changes.append(LeadStatusChange(
+            lead_id=lead_id,
+            from_status=from_status,
+            to_status=to_status,
+            changed_at=changed_at,
+            duration_seconds=duration,
+            user=user,
+            origin=origin,
+        ))
+        stat = stats[(date, from_status, to_status)]
+        stat[0] += 1
+        stat[1] += duration
+
+    if changes:
+        with transaction.atomic():
+            LeadStatusChange.objects.bulk_create(changes, batch_size=1000)
+            apply_stats(stats)
+    return len(changes)
+
+
+def apply_stats(stats):
+    """
+    Add to the daily transition aggregates.
+
+    Args:
+        stats: mapping of (date, from_status, to_status) -> (count, seconds)
+    """
+    for (date, from_status, to_status), (count, seconds) in stats.items():
+        lookup = {'date': date, 'from_status': from_status, 'to_status': to_status}
+        changes = {'count': F('count') + count, 'total_seconds': F('total_seconds') + seconds}
+        if LeadStatusTransitionStat.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                LeadStatusTransitionStat.objects.create(count=count, total_seconds=seconds, **lookup)
+        except IntegrityError:
+            # Another worker created the row in the meantime
+            LeadStatusTransitionStat.objects.filter(**lookup).update(**changes)
+
+
+def rebuild_stats():
+    """
+    Recompute the daily aggregates from the log.
+
+    Returns:
+        int: number of aggregate rows written
+    """
+    rows = (
+        LeadStatusChange.objects.order_by()
+        .annotate(date=TruncDate('changed_at'))
+        .values('date', 'from_status', 'to_status')
+        .annotate(count=Count('id'), total_seconds=Sum('duration_seconds'))
+    )
+    stats = [
+        LeadStatusTransitionStat(
+            date=row['date'],
+            from_status=row['from_status'],
+            to_status=row['to_status'],
+            count=row['count'],
+            total_seconds=row['total_seconds'] or 0.0,
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        LeadStatusTransitionStat.objects.all().delete()
+        LeadStatusTransitionStat.objects.bulk_create(stats, batch_size=500)
+    return len(stats)
+
+
+def get_pipeline_metrics(days=30):
+    """
+    Time in status and stage conversion over the last ``days`` days.
+
+    Returns:
+        dict: per-status exits, average hours spent and share of exits to
+              each next status; per-transition counts; the number of leads
+              in each status now and since when the oldest has waited
+    """
+    start = timezone.localdate() - timedelta(days=days - 1)
+    rows = (
+        LeadStatusTransitionStat.objects
+        .filter(date__gte=start)
+        .values('from_status', 'to_status')
+        .annotate(count=Sum('count'), total_seconds=Sum('total_seconds'))
+    )
+
+    stages = {}
+    transitions = []
+    for row in rows:
+        stage = stages.setdefault(row['from_status'], {'exits': 0, 'total_seconds': 0.0, 'next': {}})
+        stage['exits'] += row['count']
+        stage['total_seconds'] += row['total_seconds']
+        stage['next'][row['to_status']] = row['count']
+        transitions.append({
+            'from': row['from_status'],
+            'to': row['to_status'],
+            'count': row['count'],
+            'avg_hours': round(row['total_seconds'] / row['count'] / 3600, 2) if row['count'] else None,
+        })
+
+    time_in_status = {}
+    conversion = {}
+    for status, stage in stages.items():
+        exits = stage['exits']
+        time_in_status[status] = {
+            'exits': exits,
+            'avg_hours': round(stage['total_seconds'] / exits / 3600, 2) if exits else None,
+        }
+        conversion[status] = {
+            to_status: round(count / exits, 4) for to_status, count in stage['next'].items()
+        }
+
+    # Uses the (status, status_changed_at) index
+    current = {
+        row['status']: {'count': row['count'], 'oldest_since': row['oldest']}
+        for row in Lead.objects.order_by().values('status').annotate(
+            count=Count('id'), oldest=Min('status_changed_at')
+        )
+    }
+
+    return {
+        'days': days,
+        'time_in_status': time_in_status,
+        'conversion': conversion,
+        'transitions': sorted(transitions, key=lambda t: (t['from'], -t['count'])),
+        'current': current,
+    }
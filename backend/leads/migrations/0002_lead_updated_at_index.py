@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-19 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['updated_at', 'id'], name='leads_lead_updated_b0762e_idx'),
+        ),
+    ]
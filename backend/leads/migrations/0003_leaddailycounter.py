@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-19 13:20
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def build_counters(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    LeadDailyCounter = apps.get_model('leads', 'LeadDailyCounter')
+    rows = (
+        Lead.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'product_type', 'language')
+        .annotate(total=Count('id'))
+    )
+    LeadDailyCounter.objects.bulk_create([
+        LeadDailyCounter(
+            date=row['day'], status=row['status'], product_type=row['product_type'],
+            language=row['language'], count=row['total'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0002_lead_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadDailyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус')),
+                ('product_type', models.CharField(max_length=100, verbose_name='Тип продукта')),
+                ('language', models.CharField(max_length=10, verbose_name='Язык')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Счетчик заявок',
+                'verbose_name_plural': 'Счетчики заявок',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaddailycounter',
+            constraint=models.UniqueConstraint(fields=('date', 'status', 'product_type', 'language'), name='unique_lead_daily_counter'),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0 on 2026-10-19 13:21
+
+from django.db import migrations, models
+
+
+POSTGRES_SEARCH_VECTOR = """
+    setweight(to_tsvector('russian'::regconfig, coalesce(name, '') || ' ' || coalesce(company, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(name, '') || ' ' || coalesce(company, '')), 'A') ||
+    setweight(to_tsvector('simple'::regconfig,
+        coalesce(name, '') || ' ' || coalesce(company, '') || ' ' || coalesce(email, '')), 'B') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(message, '')), 'C') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(message, '')), 'C') ||
+    setweight(to_tsvector('simple'::regconfig, coalesce(message, '')), 'D')
+"""
+
+
+def fill_phone_digits(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    batch = []
+    for lead in Lead.objects.only('id', 'phone').iterator(chunk_size=2000):
+        lead.phone_digits = ''.join(c for c in lead.phone if c.isdigit())
+        batch.append(lead)
+        if len(batch) >= 2000:
+            Lead.objects.bulk_update(batch, ['phone_digits'])
+            batch = []
+    if batch:
+        Lead.objects.bulk_update(batch, ['phone_digits'])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE leads_lead ADD COLUMN search_vector tsvector '
+            f'GENERATED ALWAYS AS ({POSTGRES_SEARCH_VECTOR}) STORED'
+        )
+        schema_editor.execute(
+            'CREATE INDEX leads_lead_search_vector_idx ON leads_lead USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE leads_lead_fts USING fts5('
+            "name, company, email, message, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO leads_lead_fts (rowid, name, company, email, message) '
+            "SELECT id, name, company, COALESCE(email, ''), message FROM leads_lead"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS leads_lead_search_vector_idx')
+        schema_editor.execute('ALTER TABLE leads_lead DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS leads_lead_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0003_leaddailycounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=50, verbose_name='Телефон (цифры)'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0 on 2026-10-19 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0004_lead_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='company_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=10, verbose_name='Ключ компании'),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='leads.lead', verbose_name='Дубликат заявки'),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='duplicate_reason',
+            field=models.CharField(blank=True, choices=[('phone', 'Телефон'), ('email', 'Email'), ('company', 'Похожая компания')], max_length=20, verbose_name='Причина дубликата'),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='email_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254, verbose_name='Email (нормализованный)'),
+        ),
+        migrations.AlterField(
+            model_name='lead',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=50, verbose_name='Телефон (E.164)'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0 on 2026-10-19 13:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0005_lead_duplicates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Тег заявки',
+                'verbose_name_plural': 'Теги заявок',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeadBulkOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('update', 'Изменение'), ('delete', 'Удаление'), ('tag', 'Добавление тегов'), ('untag', 'Удаление тегов')], max_length=20, verbose_name='Действие')),
+                ('criteria', models.JSONField(blank=True, default=dict, verbose_name='Условия выбора')),
+                ('changes', models.JSONField(blank=True, default=dict, verbose_name='Изменения')),
+                ('lead_ids', models.JSONField(blank=True, default=list, verbose_name='ID заявок')),
+                ('affected', models.IntegerField(default=0, verbose_name='Затронуто заявок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lead_bulk_operations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Массовая операция',
+                'verbose_name_plural': 'Массовые операции',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='leads', to='leads.leadtag', verbose_name='Теги'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-19 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0006_lead_tags_bulk_operations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='spam_score',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Вероятность спама'),
+        ),
+        migrations.AlterField(
+            model_name='lead',
+            name='status',
+            field=models.CharField(choices=[('new', 'Новый'), ('contacted', 'Связались'), ('qualified', 'Квалифицирован'), ('closed', 'Закрыт'), ('rejected', 'Отклонен'), ('spam', 'Спам')], default='new', max_length=20, verbose_name='Статус'),
+        ),
+    ]
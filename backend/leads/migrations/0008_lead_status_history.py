@@ -0,0 +1,84 @@
+# Generated by Django 5.0 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_status_changed_at(apps, schema_editor):
+    # The exact time is unknown for existing leads; the last update is the
+    # best estimate for leads that have left "new"
+    Lead = apps.get_model('leads', 'Lead')
+    Lead.objects.filter(status='new').update(status_changed_at=models.F('created_at'))
+    Lead.objects.exclude(status='new').update(status_changed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0007_lead_spam'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('new', 'Новый'), ('contacted', 'Связались'), ('qualified', 'Квалифицирован'), ('closed', 'Закрыт'), ('rejected', 'Отклонен'), ('spam', 'Спам')], max_length=20, verbose_name='Из статуса')),
+                ('to_status', models.CharField(choices=[('new', 'Новый'), ('contacted', 'Связались'), ('qualified', 'Квалифицирован'), ('closed', 'Закрыт'), ('rejected', 'Отклонен'), ('spam', 'Спам')], max_length=20, verbose_name='В статус')),
+                ('changed_at', models.DateTimeField(db_index=True, verbose_name='Дата изменения')),
+                ('duration_seconds', models.FloatField(verbose_name='Время в статусе (сек)')),
+                ('origin', models.CharField(choices=[('admin', 'Админка'), ('api', 'API'), ('bulk', 'Массовая операция'), ('system', 'Система')], default='system', max_length=20, verbose_name='Источник изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение статуса',
+                'verbose_name_plural': 'История статусов',
+                'ordering': ['-changed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeadStatusTransitionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('from_status', models.CharField(max_length=20, verbose_name='Из статуса')),
+                ('to_status', models.CharField(max_length=20, verbose_name='В статус')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('total_seconds', models.FloatField(default=0, verbose_name='Суммарное время (сек)')),
+            ],
+            options={
+                'verbose_name': 'Статистика переходов',
+                'verbose_name_plural': 'Статистика переходов',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='lead',
+            name='leads_lead_status_e23abe_idx',
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Статус изменен'),
+        ),
+        migrations.RunPython(fill_status_changed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['status', 'status_changed_at'], name='leads_lead_status_4a0b66_idx'),
+        ),
+        migrations.AddField(
+            model_name='leadstatuschange',
+            name='lead',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_changes', to='leads.lead', verbose_name='Заявка'),
+        ),
+        migrations.AddField(
+            model_name='leadstatuschange',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lead_status_changes', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='leadstatustransitionstat',
+            constraint=models.UniqueConstraint(fields=('date', 'from_status', 'to_status'), name='unique_lead_status_transition_stat'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0008_lead_status_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='session_id',
+            field=models.CharField(blank=True, db_index=True, help_text='Сессия аналитики, из которой отправлена заявка', max_length=100, verbose_name='Session ID'),
+        ),
+        migrations.CreateModel(
+            name='LeadAttributionDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('model', models.CharField(choices=[('first', 'Первое касание'), ('last', 'Последнее касание')], max_length=10, verbose_name='Модель')),
+                ('source', models.CharField(help_text='Домен реферера, direct или unknown', max_length=255, verbose_name='Источник')),
+                ('landing_page', models.CharField(blank=True, max_length=500, verbose_name='Страница входа')),
+                ('leads', models.IntegerField(default=0, verbose_name='Заявок')),
+                ('total_seconds', models.FloatField(default=0, verbose_name='Суммарное время до заявки (сек)')),
+            ],
+            options={
+                'verbose_name': 'Атрибуция заявок',
+                'verbose_name_plural': 'Атрибуция заявок',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['model', 'date'], name='leads_leada_model_908bc6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+from leads.duplicates import normalized_fields
+
+BATCH_SIZE = 2000
+COLUMNS = ['phone_digits', 'email_normalized', 'company_key']
+
+
+def fill_normalized_fields(apps, schema_editor):
+    # 0005 redefined phone_digits as E.164 and added the email and company
+    # keys; leads created before it still have digits-only or blank values.
+    # Uses the current normalization code, as saving a lead would.
+    Lead = apps.get_model('leads', 'Lead')
+    batch = []
+    leads = Lead.objects.only('id', 'phone', 'email', 'company', *COLUMNS).order_by('pk')
+    for lead in leads.iterator(chunk_size=BATCH_SIZE):
+        values = normalized_fields(lead.phone, lead.email, lead.company)
+        if all(getattr(lead, column) == value for column, value in values.items()):
+            continue
+        for column, value in values.items():
+            setattr(lead, column, value)
+        batch.append(lead)
+        if len(batch) >= BATCH_SIZE:
+            Lead.objects.bulk_update(batch, COLUMNS)
+            batch = []
+    if batch:
+        Lead.objects.bulk_update(batch, COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0009_lead_attribution'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_normalized_fields, migrations.RunPython.noop),
+    ]
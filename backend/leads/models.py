@@ -1,4 +1,22 @@
+from django.conf import settings
 from django.db import models
+from .duplicates import normalized_fields
+
+
+class LeadTag(models.Model):
+    """
+    Free-form label attached to leads (e.g. by the CRM integration).
+    """
+    name = models.CharField('Название', max_length=50, unique=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Тег заявки'
+        verbose_name_plural = 'Теги заявок'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
 
 
 class Lead(models.Model):
@@ -11,6 +29,7 @@ class Lead(models.Model):
         ('qualified', 'Квалифицирован'),
         ('closed', 'Закрыт'),
         ('rejected', 'Отклонен'),
+        ('spam', 'Спам'),
     ]
     
     PRODUCT_TYPE_CHOICES = [
@@ -21,11 +40,20 @@ class Lead(models.Model):
         ('other', 'Другое'),
     ]
     
+    DUPLICATE_REASON_CHOICES = [
+        ('phone', 'Телефон'),
+        ('email', 'Email'),
+        ('company', 'Похожая компания'),
+    ]
+    
     # Contact Information
     name = models.CharField('Имя', max_length=200)
     company = models.CharField('Компания', max_length=200)
+    company_key = models.CharField('Ключ компании', max_length=10, blank=True, db_index=True, editable=False)
     phone = models.CharField('Телефон', max_length=50)
+    phone_digits = models.CharField('Телефон (E.164)', max_length=50, blank=True, db_index=True, editable=False)
     email = models.EmailField('Email', blank=True, null=True)
+    email_normalized = models.CharField('Email (нормализованный)', max_length=254, blank=True, db_index=True, editable=False)
     
     # Request Details
     product_type = models.CharField('Тип продукта', max_length=100, choices=PRODUCT_TYPE_CHOICES)
@@ -35,9 +63,25 @@ class Lead(models.Model):
     
     # Lead Management
     status = models.CharField('Статус', max_length=20, choices=STATUS_CHOICES, default='new')
+    status_changed_at = models.DateTimeField('Статус изменен', blank=True, null=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='duplicates',
+        verbose_name='Дубликат заявки'
+    )
+    duplicate_reason = models.CharField('Причина дубликата', max_length=20, choices=DUPLICATE_REASON_CHOICES, blank=True)
+    spam_score = models.FloatField('Вероятность спама', blank=True, null=True, editable=False)
+    tags = models.ManyToManyField(LeadTag, blank=True, related_name='leads', verbose_name='Теги')
     
     # Metadata
     source = models.CharField('Источник', max_length=100, blank=True, help_text='Откуда пришла заявка')
+    session_id = models.CharField(
+        'Session ID', max_length=100, blank=True, db_index=True,
+        help_text='Сессия аналитики, из которой отправлена заявка'
+    )
     language = models.CharField('Язык', max_length=10, default='ru')
     ip_address = models.GenericIPAddressField('IP адрес', blank=True, null=True)
     user_agent = models.TextField('User Agent', blank=True)
@@ -52,13 +96,20 @@ class Lead(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['status']),
+            models.Index(fields=['status', 'status_changed_at']),
             models.Index(fields=['product_type']),
+            models.Index(fields=['updated_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.name} - {self.company} ({self.get_status_display()})"
     
+    def save(self, *args, **kwargs):
+        """Keep the normalized lookup columns in sync for search and deduplication."""
+        for field, value in normalized_fields(self.phone, self.email, self.company).items():
+            setattr(self, field, value)
+        super().save(*args, **kwargs)
+    
     def get_product_type_display_en(self):
         """Get product type in English for notifications."""
         mapping = {
@@ -69,3 +120,175 @@ class Lead(models.Model):
             'other': 'Other',
         }
         return mapping.get(self.product_type, self.product_type)
+
+
+class LeadDailyCounter(models.Model):
+    """
+    Pre-aggregated lead counts per creation day, status, product type and language.
+
+    Maintained by signals and bulk status updates so statistics never have to
+    scan the Lead table. Use the rebuild_lead_counters command to fix drift.
+    """
+    date = models.DateField('Дата')
+    status = models.CharField('Статус', max_length=20)
+    product_type = models.CharField('Тип продукта', max_length=100)
+    language = models.CharField('Язык', max_length=10)
+    count = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчик заявок'
+        verbose_name_plural = 'Счетчики заявок'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'status', 'product_type', 'language'],
+                name='unique_lead_daily_counter',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.product_type}/{self.language}: {self.count}"
+
+
+class LeadStatusChange(models.Model):
+    """
+    Append-only log of lead status transitions.
+
+    ``duration_seconds`` is the time the lead spent in ``from_status``.
+    Written by leads.history for single saves and bulk updates alike.
+    """
+    ORIGIN_CHOICES = [
+        ('admin', 'Админка'),
+        ('api', 'API'),
+        ('bulk', 'Массовая операция'),
+        ('system', 'Система'),
+    ]
+
+    lead = models.ForeignKey(
+        Lead,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='status_changes',
+        verbose_name='Заявка'
+    )
+    from_status = models.CharField('Из статуса', max_length=20, choices=Lead.STATUS_CHOICES)
+    to_status = models.CharField('В статус', max_length=20, choices=Lead.STATUS_CHOICES)
+    changed_at = models.DateTimeField('Дата изменения', db_index=True)
+    duration_seconds = models.FloatField('Время в статусе (сек)')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='lead_status_changes',
+        verbose_name='Пользователь'
+    )
+    origin = models.CharField('Источник изменения', max_length=20, choices=ORIGIN_CHOICES, default='system')
+
+    class Meta:
+        verbose_name = 'Изменение статуса'
+        verbose_name_plural = 'История статусов'
+        ordering = ['-changed_at']
+
+    def __str__(self):
+        return f"#{self.lead_id}: {self.from_status} -> {self.to_status} ({self.changed_at:%d.%m.%Y %H:%M})"
+
+
+class LeadStatusTransitionStat(models.Model):
+    """
+    Daily aggregate of status transitions, maintained alongside the log.
+
+    Pipeline metrics (time in status, stage conversion) are read from this
+    table instead of scanning LeadStatusChange.
+    """
+    date = models.DateField('Дата')
+    from_status = models.CharField('Из статуса', max_length=20)
+    to_status = models.CharField('В статус', max_length=20)
+    count = models.IntegerField('Количество', default=0)
+    total_seconds = models.FloatField('Суммарное время (сек)', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика переходов'
+        verbose_name_plural = 'Статистика переходов'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'from_status', 'to_status'],
+                name='unique_lead_status_transition_stat',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.from_status} -> {self.to_status}: {self.count}"
+
+
+class LeadAttributionDaily(models.Model):
+    """
+    Daily first-touch and last-touch attribution of new leads.
+
+    Precomputed by the rebuild_lead_attribution command from the analytics
+    sessions the leads were submitted from, so attribution reports never
+    read the event log.
+    """
+    MODEL_CHOICES = [
+        ('first', 'Первое касание'),
+        ('last', 'Последнее касание'),
+    ]
+
+    date = models.DateField('Дата')
+    model = models.CharField('Модель', max_length=10, choices=MODEL_CHOICES)
+    source = models.CharField('Источник', max_length=255, help_text='Домен реферера, direct или unknown')
+    landing_page = models.CharField('Страница входа', max_length=500, blank=True)
+    leads = models.IntegerField('Заявок', default=0)
+    total_seconds = models.FloatField('Суммарное время до заявки (сек)', default=0)
+
+    class Meta:
+        verbose_name = 'Атрибуция заявок'
+        verbose_name_plural = 'Атрибуция заявок'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['model', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.model}: {self.source} {self.landing_page} ({self.leads})"
+
+
+class LeadBulkOperation(models.Model):
+    """
+    Audit record of a bulk change made through the bulk leads API.
+
+    One row is written per operation, however many leads it touched.
+    lead_ids is filled for explicit id selections only; filter selections
+    are recorded by their criteria and the affected count.
+    """
+    ACTION_CHOICES = [
+        ('update', 'Изменение'),
+        ('delete', 'Удаление'),
+        ('tag', 'Добавление тегов'),
+        ('untag', 'Удаление тегов'),
+    ]
+
+    action = models.CharField('Действие', max_length=20, choices=ACTION_CHOICES)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='lead_bulk_operations',
+        verbose_name='Пользователь'
+    )
+    criteria = models.JSONField('Условия выбора', default=dict, blank=True)
+    changes = models.JSONField('Изменения', default=dict, blank=True)
+    lead_ids = models.JSONField('ID заявок', default=list, blank=True)
+    affected = models.IntegerField('Затронуто заявок', default=0)
+    created_at = models.DateTimeField('Дата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Массовая операция'
+        verbose_name_plural = 'Массовые операции'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_action_display()}: {self.affected} ({self.created_at:%d.%m.%Y %H:%M})"
@@ -0,0 +1,236 @@
+"""
+Full-text search over leads.
+
+PostgreSQL uses a stored, generated ``search_vector`` tsvector column with a
+GIN index (Russian, English and "simple" configurations; there is no Uzbek
+stemmer, so Uzbek words are matched by prefix). SQLite uses the FTS5 shadow
+table ``leads_lead_fts`` kept in sync by the Lead save/delete signals. Other
+backends fall back to icontains. Phone-like queries are answered from the
+indexed ``phone_digits`` column (E.164 digits) as prefix ranges, so a
+partial number finds the leads whose number starts with it, with or without
+the country code.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from core.utils.helpers import get_phone_digits, normalize_phone
+
+FTS_TABLE = 'leads_lead_fts'
+FTS_FIELDS = ('name', 'company', 'email', 'message')
+
+# bm25 column weights: name, company, email, message
+FTS_WEIGHTS = '10.0, 10.0, 5.0, 1.0'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+PHONE_RE = re.compile(r'^[\d\s()+\-.]+$')
+# Sorts right after the digits: ``prefix <= value < prefix + PREFIX_END``
+# is a prefix match the B-tree index can serve (LIKE 'x%' can't on SQLite,
+# nor on PostgreSQL with a non-C collation)
+PREFIX_END = chr(ord('9') + 1)
+CYRILLIC_RE = re.compile('[а-яё]')
+
+# Inflection endings stripped from query words so that prefix matching
+# covers the other forms of the word. Longest endings first.
+RUSSIAN_SUFFIXES = sorted([
+    'иями', 'ями', 'ами', 'его', 'ого', 'ему', 'ому', 'ыми', 'ими',
+    'ых', 'их', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+    'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ую', 'юю', 'ию', 'ия',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+], key=len, reverse=True)
+UZBEK_SUFFIXES = sorted([
+    'larning', 'lardan', 'larga', 'larda', 'lari', 'lar',
+    'ning', 'dan', 'ga', 'da', 'ni', 'si',
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+SEARCH_FIELDS = ('name', 'company', 'phone', 'email', 'message')
+
+
+def stem_prefix(word):
+    """Strip a Russian or Uzbek inflection ending, keeping a usable prefix."""
+    word = word.lower()
+    suffixes = RUSSIAN_SUFFIXES if CYRILLIC_RE.search(word) else UZBEK_SUFFIXES
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+
+def query_words(term):
+    return [word for word in WORD_RE.findall(term or '') if word]
+
+
+def is_phone_query(term):
+    return bool(PHONE_RE.match(term.strip())) and len(get_phone_digits(term)) >= 5
+
+
+def phone_prefixes(term):
+    """E.164 digit prefixes a (possibly partial) phone query can stand for."""
+    digits = get_phone_digits(term)
+    if digits.startswith('00'):
+        return {digits[2:]}
+    if term.strip().startswith('+'):
+        return {digits}
+    country_code = settings.DEFAULT_PHONE_COUNTRY_CODE
+    # Typed with the country code, or a local number
+    prefixes = {digits, country_code + digits}
+    if digits.startswith('8') and country_code == '998':
+        # Legacy trunk prefix: 8 90 ...
+        prefixes.add(country_code + digits[1:])
+    return prefixes
+
+
+def _fts5_match(words):
+    # Every word is a quoted prefix query, so user input can't inject FTS syntax
+    return ' '.join('"{}"*'.format(stem_prefix(word).replace('"', '')) for word in words)
+
+
+def _postgres_tsquery_sql():
+    return (
+        "(websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s)"
+        " || to_tsquery('simple', %s))"
+    )
+
+
+def search_leads(queryset, term):
+    """
+    Filter a Lead queryset by a search term and annotate ``search_rank``.
+
+    Higher ``search_rank`` means a better match on every backend.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    if is_phone_query(term):
+        condition = Q()
+        for prefix in phone_prefixes(term):
+            condition |= Q(phone_digits__gte=prefix, phone_digits__lt=prefix + PREFIX_END)
+        # The complete number ranks above longer numbers it is a prefix of
+        return queryset.filter(condition).annotate(search_rank=Case(
+            When(phone_digits=normalize_phone(term), then=Value(2.0)),
+            default=Value(1.0),
+            output_field=FloatField(),
+        ))
+
+    words = query_words(term)
+    if not words:
+        return queryset.none()
+
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        prefix_query = ' & '.join(f'{stem_prefix(word)}:*' for word in words)
+        tsquery = _postgres_tsquery_sql()
+        params = [term, term, prefix_query]
+        return queryset.annotate(
+            search_match=RawSQL(
+                f'leads_lead.search_vector @@ {tsquery}', params, output_field=BooleanField()
+            ),
+            search_rank=RawSQL(
+                f'ts_rank(leads_lead.search_vector, {tsquery})', params, output_field=FloatField()
+            ),
+        ).filter(search_match=True)
+
+    if vendor == 'sqlite':
+        match = _fts5_match(words)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = leads_lead.id',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': term})
+    return queryset.filter(condition).annotate(search_rank=Value(1.0, output_field=FloatField()))
+
+
+def index_lead(lead):
+    """Insert or refresh a lead in the SQLite FTS5 table."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [lead.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, company, email, message) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [lead.pk, lead.name, lead.company, lead.email or '', lead.message or ''],
+        )
+
+
+def index_leads(leads):
+    """Add newly created leads (e.g. from bulk_create) to the SQLite FTS5 table."""
+    if connection.vendor != 'sqlite' or not leads:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, company, email, message) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [[lead.pk, lead.name, lead.company, lead.email or '', lead.message or ''] for lead in leads],
+        )
+
+
+def unindex_lead(lead_id):
+    """Remove a lead from the SQLite FTS5 table."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [lead_id])
+
+
+def unindex_leads(lead_ids):
+    """Remove several leads from the SQLite FTS5 table in one statement."""
+    if connection.vendor != 'sqlite' or not lead_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(lead_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(lead_ids))
+
+
+def rebuild_index():
+    """
+    Rebuild derived search data from the Lead table.
+
+    Returns:
+        bool: True if the backend has a full-text index to rebuild
+    """
+    if connection.vendor != 'sqlite':
+        # The PostgreSQL tsvector is a generated column and can't drift
+        return connection.vendor == 'postgresql'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, company, email, message) '
+            "SELECT id, name, company, COALESCE(email, ''), message FROM leads_lead"
+        )
+    return True
+
+
+class LeadSearchFilter(BaseFilterBackend):
+    """
+    Full-text replacement for SearchFilter on the ``search`` query parameter.
+
+    Results are ordered by relevance unless the client asks for an explicit
+    ``ordering``, so this backend must come after OrderingFilter.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '')
+        if not term.strip():
+            return queryset
+        queryset = search_leads(queryset, term)
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return queryset
+        return queryset.order_by('-search_rank', *queryset.query.order_by)
@@ -1,5 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Lead
+from .models import Lead, LeadTag
+from .services import BULK_UPDATE_FIELDS
+from .duplicates import find_duplicate, normalized_fields
+from . import spam
+from core.serializers import FastRepresentationMixin
+from core.utils.uploads import store_content_addressed
 
 
 class LeadSerializer(serializers.ModelSerializer):
@@ -18,14 +24,15 @@ class LeadSerializer(serializers.ModelSerializer):
 class LeadCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating new leads (from contact form).
-    Validates file uploads and required fields.
+    Validates file uploads and required fields, normalizes phone/email,
+    flags repeat submissions as duplicates and likely spam as 'spam'.
     """
     class Meta:
         model = Lead
         fields = [
             'name', 'company', 'phone', 'email',
             'product_type', 'quantity', 'message', 'file',
-            'language', 'source'
+            'language', 'source', 'session_id'
         ]
     
     def validate_phone(self, value):
@@ -39,9 +46,10 @@ class LeadCreateSerializer(serializers.ModelSerializer):
     def validate_file(self, value):
         """Validate uploaded file."""
         if value:
-            # Check file size (10MB max)
-            if value.size > 10 * 1024 * 1024:
-                raise serializers.ValidationError("Размер файла не должен превышать 10 МБ")
+            # Check file size (LEAD_FILE_MAX_SIZE, 10MB by default)
+            if value.size > settings.LEAD_FILE_MAX_SIZE:
+                limit_mb = settings.LEAD_FILE_MAX_SIZE // (1024 * 1024)
+                raise serializers.ValidationError(f"Размер файла не должен превышать {limit_mb} МБ")
             
             # Check file extension
             allowed_extensions = ['.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.gif']
@@ -52,9 +60,101 @@ class LeadCreateSerializer(serializers.ModelSerializer):
                 )
         
         return value
+    
+    def validate(self, attrs):
+        """Add normalized lookup columns used for deduplication."""
+        attrs.update(normalized_fields(attrs.get('phone'), attrs.get('email'), attrs.get('company')))
+        return attrs
+    
+    def create(self, validated_data):
+        """
+        Link the new lead to the earlier lead it duplicates, if any, and
+        store the attachment by content hash so repeated files are kept once.
+        """
+        if validated_data.get('file'):
+            validated_data['file'] = store_content_addressed(validated_data['file'], 'leads/files')
+        duplicate_of_id, reason = find_duplicate(
+            validated_data['phone_digits'],
+            validated_data['email_normalized'],
+            validated_data.get('company', ''),
+            validated_data['company_key'],
+        )
+        if duplicate_of_id:
+            validated_data['duplicate_of_id'] = duplicate_of_id
+            validated_data['duplicate_reason'] = reason
+        spam_score = spam.score(
+            validated_data.get('name'),
+            validated_data.get('company'),
+            validated_data.get('message'),
+            validated_data.get('email'),
+        )
+        validated_data['spam_score'] = spam_score
+        if spam.is_spam(spam_score):
+            validated_data['status'] = 'spam'
+        return super().create(validated_data)
+
+
+class LeadBulkPatchSerializer(serializers.ModelSerializer):
+    """
+    Field values applied by a bulk update; all fields are optional.
+    """
+    class Meta:
+        model = Lead
+        fields = list(BULK_UPDATE_FIELDS)
+        extra_kwargs = {field: {'required': False} for field in BULK_UPDATE_FIELDS}
+
+
+class LeadBulkSerializer(serializers.Serializer):
+    """
+    Request body of the bulk leads endpoint.
+
+    Leads are selected either by ``ids`` or by a ``filter`` using the same
+    parameters as the list endpoint. A filter must narrow the selection and
+    match at most MAX_FILTER_LEADS leads; ``"all": true`` lifts both checks,
+    so touching every lead is always explicit.
+    """
+    ACTION_CHOICES = ['update', 'delete', 'tag', 'untag']
+    MAX_IDS = 5000
+    MAX_FILTER_LEADS = 5000
 
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False, max_length=MAX_IDS
+    )
+    filter = serializers.DictField(required=False, allow_empty=False)
+    all = serializers.BooleanField(required=False, default=False)
+    patch = serializers.DictField(required=False, allow_empty=False)
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=LeadTag._meta.get_field('name').max_length),
+        required=False,
+        allow_empty=False,
+    )
 
-class LeadListSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        """Check that the selection and the payload match the action."""
+        if ('ids' in attrs) == ('filter' in attrs or attrs['all']):
+            raise serializers.ValidationError('Укажите либо ids, либо filter или all')
+
+        action = attrs['action']
+        if action == 'update':
+            patch = attrs.get('patch')
+            if not patch:
+                raise serializers.ValidationError({'patch': ['Обязательное поле для update']})
+            unknown = set(patch) - set(BULK_UPDATE_FIELDS)
+            if unknown:
+                raise serializers.ValidationError({
+                    'patch': [f"Недопустимые поля: {', '.join(sorted(unknown))}"]
+                })
+            patch_serializer = LeadBulkPatchSerializer(data=patch, partial=True)
+            if not patch_serializer.is_valid():
+                raise serializers.ValidationError({'patch': patch_serializer.errors})
+            attrs['patch'] = patch_serializer.validated_data
+        elif action in ('tag', 'untag') and not attrs.get('tags'):
+            raise serializers.ValidationError({'tags': [f'Обязательное поле для {action}']})
+        return attrs
+
+
+class LeadListSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     """
     Simplified serializer for listing leads.
     """
@@ -67,10 +167,35 @@ class LeadListSerializer(serializers.ModelSerializer):
             'id', 'name', 'company', 'phone', 'email',
             'product_type', 'product_type_display',
             'status', 'status_display',
+            'duplicate_of', 'spam_score',
             'created_at', 'language'
         ]
 
 
+class LeadAttributionSerializer(serializers.ModelSerializer):
+    """
+    Lead with the analytics journey it came from (see leads.attribution).
+    """
+    landing_page = serializers.CharField(read_only=True, allow_null=True)
+    referrer = serializers.CharField(read_only=True, allow_null=True)
+    first_seen = serializers.DateTimeField(read_only=True, allow_null=True)
+    pages_viewed = serializers.IntegerField(read_only=True)
+    time_to_convert = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Lead
+        fields = [
+            'id', 'name', 'company', 'status', 'source', 'session_id', 'created_at',
+            'landing_page', 'referrer', 'first_seen', 'pages_viewed', 'time_to_convert'
+        ]
+    
+    def get_time_to_convert(self, obj):
+        """Seconds from the first event of the session to the lead."""
+        if obj.first_seen is None:
+            return None
+        return max((obj.created_at - obj.first_seen).total_seconds(), 0.0)
+
+
 class LeadStatsSerializer(serializers.Serializer):
     """
     Serializer for lead statistics.
@@ -84,4 +209,5 @@ class LeadStatsSerializer(serializers.Serializer):
     leads_this_month = serializers.IntegerField()
     by_product_type = serializers.DictField()
     by_language = serializers.DictField()
+    daily = serializers.ListField()
     recent_leads = LeadListSerializer(many=True)
@@ -0,0 +1,214 @@
+"""
+Bulk operations on leads.
+
+queryset.update() bypasses model signals, so these helpers keep the
+derived data (daily counters, status history, full-text index) in sync
+with set-based changes. Each helper does a fixed number of queries
+however many leads it touches.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from . import counters, history, search
+from .models import Lead, LeadBulkOperation, LeadTag
+
+# Fields that bulk updates may change. The first three are part of the
+# daily counter key and are moved between counters in bulk.
+BULK_UPDATE_FIELDS = ('status', 'product_type', 'language', 'source')
+COUNTER_FIELDS = ('status', 'product_type', 'language')
+
+_bulk_operation = ContextVar('lead_bulk_operation', default=False)
+
+
+@contextmanager
+def bulk_operation():
+    """Mute the per-row Lead signal handlers while a bulk helper runs."""
+    token = _bulk_operation.set(True)
+    try:
+        yield
+    finally:
+        _bulk_operation.reset(token)
+
+
+def in_bulk_operation():
+    return _bulk_operation.get()
+
+
+def update_leads(queryset, values, user=None, origin='bulk'):
+    """
+    Change fields of every lead in the queryset with a single UPDATE.
+
+    Args:
+        queryset: Lead queryset to change
+        values: new values, limited to BULK_UPDATE_FIELDS
+        user: user making the change, for the status history
+        origin: where the change comes from, for the status history
+
+    Returns:
+        int: number of updated leads
+    """
+    unknown = set(values) - set(BULK_UPDATE_FIELDS)
+    if unknown:
+        raise ValueError(f"Fields can't be bulk updated: {', '.join(sorted(unknown))}")
+
+    now = timezone.now()
+    changes = dict(values)
+    with transaction.atomic():
+        moved = counters.count_queryset(queryset) if set(values) & set(COUNTER_FIELDS) else {}
+        transitions = []
+        if 'status' in values:
+            new_status = values['status']
+            transitions = list(
+                queryset.exclude(status=new_status)
+                .values_list('id', 'status', 'status_changed_at')
+            )
+            # Restart the status clock only on rows whose status changes
+            changes['status_changed_at'] = Case(
+                When(~Q(status=new_status), then=Value(now)),
+                default=F('status_changed_at'),
+            )
+        updated = queryset.update(updated_at=now, **changes)
+
+        deltas = {}
+        for (date, *old_values), count in moved.items():
+            old = dict(zip(COUNTER_FIELDS, old_values))
+            new = {**old, **{f: v for f, v in values.items() if f in COUNTER_FIELDS}}
+            if new == old:
+                continue
+            old_key = (date, *old.values())
+            new_key = (date, *new.values())
+            deltas[old_key] = deltas.get(old_key, 0) - count
+            deltas[new_key] = deltas.get(new_key, 0) + count
+        counters.apply_deltas(deltas)
+
+        if transitions:
+            history.record_transitions(transitions, values['status'], now, user=user, origin=origin)
+    return updated
+
+
+def update_status(queryset, status, user=None, origin='bulk'):
+    """
+    Set the status of every lead in the queryset with a single UPDATE.
+
+    Args:
+        queryset: Lead queryset to change
+        status: new status value
+        user: user making the change, for the status history
+        origin: where the change comes from, for the status history
+
+    Returns:
+        int: number of updated leads
+    """
+    return update_leads(queryset, {'status': status}, user=user, origin=origin)
+
+
+def delete_leads(queryset):
+    """
+    Delete every lead in the queryset.
+
+    Counters are decremented with one grouped query instead of once per
+    lead, and the leads are dropped from the full-text index together.
+
+    Returns:
+        int: number of deleted leads
+    """
+    with transaction.atomic(), bulk_operation():
+        ids = list(queryset.values_list('id', flat=True))
+        if not ids:
+            return 0
+        leads = Lead.objects.filter(id__in=ids)
+        removed = counters.count_queryset(leads)
+        _, deleted = leads.delete()
+        counters.apply_deltas({key: -count for key, count in removed.items()})
+        search.unindex_leads(ids)
+    return deleted.get(Lead._meta.label, 0)
+
+
+def get_or_create_tags(names):
+    """Return LeadTag objects for the given names, creating missing ones."""
+    names = sorted({name.strip() for name in names if name and name.strip()})
+    LeadTag.objects.bulk_create([LeadTag(name=name) for name in names], ignore_conflicts=True)
+    return list(LeadTag.objects.filter(name__in=names))
+
+
+def add_tags(queryset, names):
+    """
+    Attach tags to every lead in the queryset.
+
+    Returns:
+        int: number of leads in the queryset
+    """
+    Through = Lead.tags.through
+    with transaction.atomic():
+        ids = list(queryset.values_list('id', flat=True))
+        tags = get_or_create_tags(names)
+        Through.objects.bulk_create(
+            [Through(lead_id=lead_id, leadtag_id=tag.id) for lead_id in ids for tag in tags],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        Lead.objects.filter(id__in=ids).update(updated_at=timezone.now())
+    return len(ids)
+
+
+def remove_tags(queryset, names):
+    """
+    Detach tags from every lead in the queryset.
+
+    Returns:
+        int: number of leads in the queryset
+    """
+    with transaction.atomic():
+        ids = list(queryset.values_list('id', flat=True))
+        Lead.tags.through.objects.filter(lead_id__in=ids, leadtag__name__in=names).delete()
+        Lead.objects.filter(id__in=ids).update(updated_at=timezone.now())
+    return len(ids)
+
+
+def run_bulk_operation(queryset, action, changes=None, tags=None, user=None, criteria=None):
+    """
+    Run one bulk action in a single transaction and record it for audit.
+
+    Args:
+        queryset: leads to act on
+        action: 'update', 'delete', 'tag' or 'untag'
+        changes: field values for 'update'
+        tags: tag names for 'tag' and 'untag'
+        user: user performing the operation
+        criteria: ids or filter the leads were selected by (stored as is)
+
+    The ids of the affected leads are stored only for explicit ``ids``
+    selections. A filter or ``all`` selection can cover the whole table, so
+    its audit record keeps the criteria and the affected count instead.
+
+    Returns:
+        LeadBulkOperation: the audit record, with ``affected`` set
+    """
+    with transaction.atomic():
+        # Fix the set of leads first so the audit record matches the change
+        ids = list(queryset.select_for_update().values_list('id', flat=True))
+        leads = Lead.objects.filter(id__in=ids)
+
+        if action == 'update':
+            affected = update_leads(leads, changes, user=user)
+        elif action == 'delete':
+            affected = delete_leads(leads)
+        elif action == 'tag':
+            affected = add_tags(leads, tags)
+        elif action == 'untag':
+            affected = remove_tags(leads, tags)
+        else:
+            raise ValueError(f'Unknown bulk action: {action}')
+
+        return LeadBulkOperation.objects.create(
+            action=action,
+            user=user if user is not None and user.is_authenticated else None,
+            criteria=criteria or {},
+            changes=changes or ({'tags': sorted(tags)} if tags else {}),
+            lead_ids=ids if criteria and 'ids' in criteria else [],
+            affected=affected,
+        )
@@ -0,0 +1,115 @@
+"""
+Signal handlers for the Leads app.
+
+Keep the daily counters, the status history and the SQLite full-text
+index in sync with individual Lead saves and deletes. Bulk changes made with queryset.update()
+or inside services.bulk_operation() are handled by leads.services instead.
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Lead
+from . import counters, history, search, services
+
+TRACKED_FIELDS = ('created_at', 'status', 'product_type', 'language')
+
+
+def _snapshot(instance):
+    # Read from __dict__ so deferred fields are not loaded from the database
+    values = tuple(instance.__dict__.get(field) for field in TRACKED_FIELDS)
+    return values if all(value is not None for value in values) else None
+
+
+@receiver(post_init, sender=Lead)
+def remember_counter_values(sender, instance, **kwargs):
+    """Remember the values the counters were last updated with."""
+    instance._counter_snapshot = _snapshot(instance)
+
+
+@receiver(post_save, sender=Lead)
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Increment counters for new leads and move them on status changes."""
+    if raw:
+        return
+
+    current = _snapshot(instance)
+    previous = None if created else instance._counter_snapshot
+    if current == previous:
+        return
+
+    deltas = {}
+    if previous is not None:
+        deltas[counters.counter_key(*previous)] = -1
+    if current is not None:
+        key = counters.counter_key(*current)
+        deltas[key] = deltas.get(key, 0) + 1
+    counters.apply_deltas(deltas)
+    instance._counter_snapshot = current
+
+
+@receiver(pre_save, sender=Lead)
+def stamp_status_change(sender, instance, raw=False, **kwargs):
+    """Restart the status clock when the status changes."""
+    instance._status_transition = None
+    if raw:
+        return
+    snapshot = instance._counter_snapshot
+    if instance._state.adding or snapshot is None:
+        if instance.status_changed_at is None:
+            instance.status_changed_at = timezone.now()
+        return
+    previous_status = snapshot[TRACKED_FIELDS.index('status')]
+    if previous_status != instance.status:
+        instance._status_transition = (previous_status, instance.status_changed_at or instance.created_at)
+        instance.status_changed_at = timezone.now()
+
+
+@receiver(post_save, sender=Lead)
+def log_status_change(sender, instance, raw=False, **kwargs):
+    """
+    Append the status change to the history.
+
+    Callers can set ``_status_changed_by`` and ``_status_change_origin`` on
+    the instance before saving to attribute the change.
+    """
+    transition = getattr(instance, '_status_transition', None)
+    if raw or transition is None:
+        return
+    previous_status, since = transition
+    history.record_transitions(
+        [(instance.pk, previous_status, since)],
+        instance.status,
+        instance.status_changed_at,
+        user=getattr(instance, '_status_changed_by', None),
+        origin=getattr(instance, '_status_change_origin', 'system'),
+    )
+    instance._status_transition = None
+
+
+@receiver(post_delete, sender=Lead)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Decrement counters for deleted leads."""
+    if services.in_bulk_operation():
+        return
+    snapshot = instance._counter_snapshot
+    if snapshot is not None:
+        counters.apply_deltas({counters.counter_key(*snapshot): -1})
+
+
+@receiver(post_save, sender=Lead)
+def update_search_index_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Refresh the lead's full-text index entry."""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(search.FTS_FIELDS):
+        return
+    search.index_lead(instance)
+
+
+@receiver(post_delete, sender=Lead)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    """Drop the lead from the full-text index."""
+    if services.in_bulk_operation():
+        return
+    search.unindex_lead(instance.pk)
@@ -0,0 +1,234 @@
+"""
+Spam scoring for contact form submissions.
+
+A naive Bayes classifier over hashed features of the name, company,
+message and email, plus link density and a few shape features. It is
+trained by the train_spam_model command from leads the admin rejected
+(spam) and leads that were worked on (not spam), and saved as JSON. Each
+worker loads the model once and reloads it when the file changes. Scoring
+is a few dozen dict lookups, well under a millisecond.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+HASH_BUCKETS = 1 << 18
+SMOOTHING = 1.0
+# How often a worker checks whether the model file was retrained (seconds)
+RELOAD_INTERVAL = 60
+
+SPAM_STATUSES = ('rejected',)
+HAM_STATUSES = ('contacted', 'qualified', 'closed')
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+URL_RE = re.compile(r'(?:https?://|www\.)\S+|\b[\w-]+\.(?:com|net|org|ru|uz|info|biz|xyz|top|io|me|site|online)\b', re.I)
+CYRILLIC_RE = re.compile('[а-яёА-ЯЁ]')
+LATIN_RE = re.compile('[a-zA-Z]')
+
+
+def _bucket(value, limits):
+    for limit in limits:
+        if value <= limit:
+            return str(limit)
+    return f'>{limits[-1]}'
+
+
+def extract_features(name, company, message, email):
+    """
+    Build the set of feature strings for a submission.
+
+    Returns:
+        set: feature names (hashed later)
+    """
+    name = name or ''
+    company = company or ''
+    message = message or ''
+    email = (email or '').lower()
+
+    features = set()
+    for prefix, text in (('n', name), ('c', company), ('m', message)):
+        for word in WORD_RE.findall(text.lower()):
+            if len(word) > 1:
+                features.add(f'{prefix}:{word[:20]}')
+
+    if email:
+        local, _, domain = email.partition('@')
+        features.add(f'ed:{domain}')
+        features.add(f'et:{domain.rsplit(".", 1)[-1]}')
+        features.add(f'eld:{_bucket(sum(c.isdigit() for c in local), (0, 2, 4))}')
+    else:
+        features.add('e:none')
+
+    words = WORD_RE.findall(message)
+    links = len(URL_RE.findall(message)) + len(URL_RE.findall(name)) + len(URL_RE.findall(company))
+    features.add(f'links:{_bucket(links, (0, 1, 2, 4))}')
+    features.add(f'link_density:{_bucket(int(100 * links / max(len(words), 1)), (0, 5, 15, 30))}')
+    features.add(f'msg_len:{_bucket(len(message), (0, 40, 200, 800))}')
+    letters = [c for c in message if c.isalpha()]
+    if letters:
+        upper = sum(c.isupper() for c in letters) / len(letters)
+        features.add(f'upper:{_bucket(int(upper * 10), (1, 3, 6))}')
+    text = f'{name} {company} {message}'
+    features.add(f'script:{bool(CYRILLIC_RE.search(text))}:{bool(LATIN_RE.search(text))}')
+    if name and name.strip().lower() == company.strip().lower():
+        features.add('name_is_company')
+    return features
+
+
+def hash_features(features):
+    """Map feature names to stable bucket numbers (hash() is salted per process)."""
+    return {zlib.crc32(feature.encode('utf-8')) % HASH_BUCKETS for feature in features}
+
+
+def lead_features(lead):
+    return hash_features(extract_features(lead.name, lead.company, lead.message, lead.email))
+
+
+class SpamModel:
+    """
+    Naive Bayes model with precomputed log-likelihood ratios.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        spam_total = sum(data['spam_counts'].values())
+        ham_total = sum(data['ham_counts'].values())
+        spam_denominator = spam_total + SMOOTHING * HASH_BUCKETS
+        ham_denominator = ham_total + SMOOTHING * HASH_BUCKETS
+
+        self.prior = math.log((data['spam_docs'] + 1) / (data['ham_docs'] + 1))
+        # Buckets never seen in training are not stored and count as
+        # neutral: with smoothing alone their ratio would only reflect how
+        # many tokens each class has, so long novel messages would drift to
+        # the class with fewer tokens
+        self.ratios = {}
+        for bucket in set(data['spam_counts']) | set(data['ham_counts']):
+            spam = data['spam_counts'].get(bucket, 0) + SMOOTHING
+            ham = data['ham_counts'].get(bucket, 0) + SMOOTHING
+            self.ratios[int(bucket)] = math.log(spam / spam_denominator) - math.log(ham / ham_denominator)
+
+    @classmethod
+    def train(cls, spam_documents, ham_documents):
+        """
+        Train from hashed feature sets.
+
+        Args:
+            spam_documents: iterable of bucket sets for spam leads
+            ham_documents: iterable of bucket sets for legitimate leads
+        """
+        spam_counts, ham_counts = Counter(), Counter()
+        spam_docs = ham_docs = 0
+        for buckets in spam_documents:
+            spam_counts.update(buckets)
+            spam_docs += 1
+        for buckets in ham_documents:
+            ham_counts.update(buckets)
+            ham_docs += 1
+        return cls({
+            'version': MODEL_VERSION,
+            'trained_at': timezone.now().isoformat(),
+            'spam_docs': spam_docs,
+            'ham_docs': ham_docs,
+            'spam_counts': {str(bucket): count for bucket, count in spam_counts.items()},
+            'ham_counts': {str(bucket): count for bucket, count in ham_counts.items()},
+        })
+
+    def score_buckets(self, buckets):
+        """Probability (0..1) that a hashed feature set is spam."""
+        log_odds = self.prior
+        ratios = self.ratios
+        for bucket in buckets:
+            log_odds += ratios.get(bucket, 0.0)
+        if log_odds >= 0:
+            return 1 / (1 + math.exp(-log_odds))
+        odds = math.exp(log_odds)
+        return odds / (1 + odds)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"Unsupported spam model version: {data.get('version')}")
+        return cls(data)
+
+
+class _ModelCache:
+    """Per-worker model holder that reloads when the model file changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        self.mtime = None
+        self.checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if now - self.checked_at < RELOAD_INTERVAL:
+            return self.model
+        with self.lock:
+            self.checked_at = now
+            path = settings.LEAD_SPAM_MODEL_PATH
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                self.model = self.mtime = None
+                return None
+            if mtime != self.mtime:
+                try:
+                    self.model = SpamModel.load(path)
+                    self.mtime = mtime
+                    logger.info(f"Loaded spam model from {path}")
+                except (OSError, ValueError, KeyError) as e:
+                    logger.error(f"Failed to load spam model {path}: {e}")
+            return self.model
+
+    def reset(self):
+        with self.lock:
+            self.model = self.mtime = None
+            self.checked_at = 0.0
+
+
+_cache = _ModelCache()
+
+
+def get_model():
+    return _cache.get()
+
+
+def score(name, company, message, email):
+    """
+    Spam probability for a submission.
+
+    Returns:
+        float or None: probability, or None when no model has been trained
+    """
+    model = get_model()
+    if model is None:
+        return None
+    return model.score_buckets(hash_features(extract_features(name, company, message, email)))
+
+
+def is_spam(spam_score):
+    return spam_score is not None and spam_score >= settings.LEAD_SPAM_THRESHOLD
@@ -1,3 +1,153 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import spam
+from .models import Lead, LeadBulkOperation
+from .serializers import LeadBulkSerializer
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, RATE_LIMIT_ENABLED=False)
+class ContactSubmitUploadTests(TestCase):
+    """Files rejected while streaming get a 400, not a server error."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.url = reverse('leads:contact-submit')
+
+    def submit(self, file):
+        return self.client.post(self.url, {
+            'name': 'Тест',
+            'company': 'ООО Тест',
+            'phone': '+998901234567',
+            'product_type': 'woven',
+            'file': file,
+        })
+
+    def test_disallowed_extension(self):
+        response = self.submit(SimpleUploadedFile('setup.exe', b'MZ' + b'\0' * 100))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json()['error']['details'])
+        self.assertFalse(Lead.objects.exists())
+
+    @override_settings(LEAD_FILE_MAX_SIZE=1024 * 1024)
+    def test_oversized_file(self):
+        response = self.submit(SimpleUploadedFile('brief.pdf', b'%PDF' + b'0' * (1024 * 1024)))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json()['error']['details'])
+        self.assertFalse(Lead.objects.exists())
+
+    def test_mismatched_content(self):
+        response = self.submit(SimpleUploadedFile('brief.pdf', b'not a pdf at all'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json()['error']['details'])
+        self.assertFalse(Lead.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeadBulkFilterTests(TestCase):
+    """Filter selections of the bulk endpoint must be narrow or explicit."""
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('leads:lead-bulk')
+        user = get_user_model().objects.create_user('manager', password='secret')
+        self.client.force_login(user)
+        for status, phone in [('new', '+998901111111'), ('new', '+998902222222'), ('contacted', '+998903333333')]:
+            Lead.objects.create(
+                name='Тест', company='ООО Тест', phone=phone, product_type='woven', status=status,
+            )
+
+    def bulk(self, **data):
+        return self.client.post(self.url, {'action': 'update', 'patch': {'status': 'closed'}, **data},
+                                content_type='application/json')
+
+    def test_blank_filter_is_rejected(self):
+        for filter_data in ({'status': ''}, {'search': '  '}, {'status': '', 'language': ''}):
+            response = self.bulk(filter=filter_data)
+            self.assertEqual(response.status_code, 400, filter_data)
+            self.assertIn('filter', response.json()['error']['details'])
+        self.assertFalse(Lead.objects.filter(status='closed').exists())
+
+    def test_narrowing_filter(self):
+        response = self.bulk(filter={'status': 'new'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['affected'], 2)
+        self.assertEqual(Lead.objects.filter(status='closed').count(), 2)
+
+    def test_all_selects_every_lead(self):
+        response = self.bulk(all=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['affected'], 3)
+
+    def test_audit_keeps_ids_of_explicit_selections_only(self):
+        ids = list(Lead.objects.filter(status='new').values_list('id', flat=True))
+
+        self.bulk(ids=ids)
+        self.assertEqual(sorted(LeadBulkOperation.objects.latest('id').lead_ids), sorted(ids))
+
+        for selection in ({'filter': {'status': 'closed'}}, {'all': True}):
+            self.bulk(**selection)
+            operation = LeadBulkOperation.objects.latest('id')
+            self.assertEqual(operation.lead_ids, [], selection)
+            self.assertEqual(operation.affected, 3 if selection.get('all') else 2, selection)
+            self.assertEqual(operation.criteria, {'filter': selection.get('filter', {}), 'all': 'all' in selection})
+
+    def test_filter_over_the_cap_is_rejected(self):
+        with mock.patch.object(LeadBulkSerializer, 'MAX_FILTER_LEADS', 1):
+            response = self.bulk(filter={'status': 'new'})
+            self.assertEqual(response.status_code, 400)
+
+            response = self.bulk(filter={'status': 'new'}, all=True)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(Lead.objects.filter(status='closed').count(), 2)
+
+
+class SpamModelTests(TestCase):
+    """Words never seen in training don't move the score."""
+
+    def setUp(self):
+        spam_leads = [
+            ('Buy', 'Cheap SEO', 'cheap seo backlinks casino http://spam.xyz', 'bot@spam.xyz'),
+            ('Promo', 'Crypto', 'crypto casino bonus www.win.top', 'win@promo.top'),
+        ] * 5
+        ham_leads = [
+            ('Анна', 'ООО Текстиль', 'Нужны вшивные этикетки для футболок, тираж 5000 штук, '
+             'логотип в две краски, просим прислать цену и сроки изготовления', 'anna@textile.uz'),
+            ('Bobur', 'Moda Group', 'Печатные этикетки с составом ткани и уходом, атласная лента, '
+             'нужен образец перед заказом партии для новой коллекции', 'bobur@moda.uz'),
+        ] * 1000
+        self.model = spam.SpamModel.train(
+            [spam.hash_features(spam.extract_features(*lead)) for lead in spam_leads],
+            [spam.hash_features(spam.extract_features(*lead)) for lead in ham_leads],
+        )
+
+    def score(self, *lead):
+        return self.model.score_buckets(spam.hash_features(spam.extract_features(*lead)))
+
+    def test_long_novel_ham_message(self):
+        message = ' '.join(f'слово{n}' for n in range(300))
+        probability = self.score('Дилноза', 'Шелковый путь', message, 'dilnoza@silkroad.uz')
+
+        self.assertLess(probability, 0.5)
+
+    def test_known_spam(self):
+        self.assertGreater(self.score('Buy', 'Cheap SEO', 'cheap casino bonus http://x.xyz', 'a@spam.xyz'), 0.5)
@@ -1,48 +1,72 @@
 """
 Views and API endpoints for the Leads app.
 """
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, filters
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django_ratelimit.decorators import ratelimit
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import ValidationError
+from django_filters.rest_framework import DjangoFilterBackend
 from django.http import HttpResponse
-from django.db.models import Count, Q
-from django.utils import timezone
+from django.core.validators import EMPTY_VALUES
+from django.db.models import Q
 from django.db import transaction
-from datetime import timedelta
 import csv
 import logging
+import math
 
 logger = logging.getLogger('leads')
 
 from .models import Lead
+from . import attribution, counters, history, services
+from .search import LeadSearchFilter, search_leads
 from .serializers import (
     LeadSerializer,
     LeadCreateSerializer,
     LeadListSerializer,
-    LeadStatsSerializer
+    LeadStatsSerializer,
+    LeadBulkSerializer,
+    LeadAttributionSerializer
 )
 from core.utils.helpers import get_client_ip, get_user_agent
+from core.utils.uploads import streaming_uploads
+from core.mixins import SparseFieldsetMixin
+from core.ratelimit import rate_limit
+from core.idempotency import idempotent
+from core.pagination import CreatedAtCursorPagination
 from core.utils.email import send_lead_notification, send_auto_reply
 from core.utils.telegram import send_telegram_notification
 
 
-class LeadViewSet(viewsets.ModelViewSet):
+class LeadViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing leads (protected, requires authentication).
     
     Provides CRUD operations for leads with filtering, searching, and ordering.
+    Lists use cursor pagination (`?with_total=1` adds a count) and accept
+    `?fields=` to return only some fields.
     """
     permission_classes = [IsAuthenticated]
+    # Full-text search runs last so it can order results by relevance
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, LeadSearchFilter]
     filterset_fields = ['status', 'product_type', 'language', 'created_at']
-    search_fields = ['name', 'company', 'phone', 'email', 'message']
     ordering_fields = ['created_at', 'updated_at', 'status', 'name', 'company']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
+    pagination_class = CreatedAtCursorPagination
     
     def get_queryset(self):
         """Optimize queryset with select_related for better performance."""
-        return Lead.objects.all().select_related().order_by('-created_at')
+        return Lead.objects.all().select_related().order_by('-created_at', '-id')
+    
+    @property
+    def paginator(self):
+        """Relevance-ranked search results are paginated by page number."""
+        if not hasattr(self, '_paginator'):
+            searching = self.request is not None and self.request.query_params.get(api_settings.SEARCH_PARAM)
+            self._paginator = PageNumberPagination() if searching else self.pagination_class()
+        return self._paginator
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -50,67 +74,208 @@ class LeadViewSet(viewsets.ModelViewSet):
             return LeadListSerializer
         return LeadSerializer
     
+    def perform_update(self, serializer):
+        """Attribute status changes to the user for the status history."""
+        serializer.instance._status_changed_by = self.request.user
+        serializer.instance._status_change_origin = 'api'
+        serializer.save()
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
         Get statistical overview of leads.
         
+        Served from the daily counters table, so the cost does not grow
+        with the number of leads.
+        
+        Query parameters:
+            - days: Length of the daily time series (default: 30, max: 365)
+        
         Returns:
             - Total leads count
             - Leads by status
             - Leads this week/month
             - Breakdown by product type and language
+            - Daily time series by status
             - Recent leads
         """
-        # Calculate date ranges
-        now = timezone.now()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
-        # Count leads by status
-        total_leads = Lead.objects.count()
-        new_leads = Lead.objects.filter(status='new').count()
-        contacted_leads = Lead.objects.filter(status='contacted').count()
-        qualified_leads = Lead.objects.filter(status='qualified').count()
-        closed_leads = Lead.objects.filter(status='closed').count()
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            days = 30
         
-        # Time-based counts
-        leads_this_week = Lead.objects.filter(created_at__gte=week_ago).count()
-        leads_this_month = Lead.objects.filter(created_at__gte=month_ago).count()
-        
-        # Breakdown by product type
-        by_product_type = dict(
-            Lead.objects.values('product_type')
-            .annotate(count=Count('id'))
-            .values_list('product_type', 'count')
-        )
-        
-        # Breakdown by language
-        by_language = dict(
-            Lead.objects.values('language')
-            .annotate(count=Count('id'))
-            .values_list('language', 'count')
-        )
+        counter_stats = counters.get_stats(days=days)
+        by_status = counter_stats['by_status']
         
         # Recent leads
         recent_leads = Lead.objects.all()[:5]
         
         stats_data = {
-            'total_leads': total_leads,
-            'new_leads': new_leads,
-            'contacted_leads': contacted_leads,
-            'qualified_leads': qualified_leads,
-            'closed_leads': closed_leads,
-            'leads_this_week': leads_this_week,
-            'leads_this_month': leads_this_month,
-            'by_product_type': by_product_type,
-            'by_language': by_language,
+            'total_leads': counter_stats['total_leads'],
+            'new_leads': by_status.get('new', 0),
+            'contacted_leads': by_status.get('contacted', 0),
+            'qualified_leads': by_status.get('qualified', 0),
+            'closed_leads': by_status.get('closed', 0),
+            'leads_this_week': counter_stats['leads_this_week'],
+            'leads_this_month': counter_stats['leads_this_month'],
+            'by_product_type': counter_stats['by_product_type'],
+            'by_language': counter_stats['by_language'],
+            'daily': counter_stats['daily'],
             'recent_leads': recent_leads,
         }
         
         serializer = LeadStatsSerializer(stats_data)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def pipeline(self, request):
+        """
+        Pipeline velocity metrics from the status history.
+        
+        Served from daily transition aggregates, not from the full history.
+        
+        Query parameters:
+            - days: Window of status changes to include (default: 30, max: 365)
+        
+        Returns:
+            - time_in_status: exits and average hours spent per status
+            - conversion: share of exits from each status to each next status
+            - transitions: count and average hours per (from, to) pair
+            - current: leads in each status now and the oldest waiting since
+        """
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            days = 30
+        return Response(history.get_pipeline_metrics(days=days))
+    
+    @action(detail=False, methods=['get'])
+    def attribution(self, request):
+        """
+        Leads with the analytics journey they came from.
+        
+        Accepts the list filters and cursor pagination. Each lead's session
+        is read through the (session_id, -timestamp) index of analytics
+        events, so only the leads on the page are looked up.
+        
+        Returns per lead:
+            - landing_page, referrer, first_seen: first event of the session
+            - pages_viewed: page views before the lead was submitted
+            - time_to_convert: seconds from the first event to the lead
+        """
+        queryset = attribution.annotate_journeys(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        serializer = LeadAttributionSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'], url_path='attribution/summary')
+    def attribution_summary(self, request):
+        """
+        First-touch and last-touch attribution of leads by source and landing page.
+        
+        Served from daily aggregates precomputed by the
+        rebuild_lead_attribution command (run it daily).
+        
+        Query parameters:
+            - days: Window of lead creation dates (default: 30, max: 365)
+        """
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            days = 30
+        return Response(attribution.get_attribution_summary(days=days))
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Update, delete or tag many leads in one request and one transaction.
+        
+        POST data:
+            - action: 'update', 'delete', 'tag' or 'untag'
+            - ids: list of lead ids, or
+            - filter: list filters, e.g. {"status": "new", "search": "..."};
+              must narrow the selection to at most 5000 leads
+            - all: true to select every lead (with filter: every match)
+            - patch: field values for 'update', e.g. {"status": "contacted"}
+            - tags: tag names for 'tag' and 'untag'
+        
+        Returns:
+            200: Number of affected leads and the audit record id
+            400: Validation error
+        """
+        serializer = LeadBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        if 'ids' in data:
+            queryset = Lead.objects.filter(id__in=data['ids'])
+            criteria = {'ids': data['ids']}
+        else:
+            filter_data = data.get('filter', {})
+            queryset = self.filter_bulk_queryset(filter_data, select_all=data['all'])
+            criteria = {'filter': filter_data, 'all': data['all']}
+        
+        operation = services.run_bulk_operation(
+            queryset,
+            data['action'],
+            changes=data.get('patch'),
+            tags=data.get('tags'),
+            user=request.user,
+            criteria=criteria,
+        )
+        logger.info(
+            f"Bulk {operation.action} of {operation.affected} leads by {request.user} "
+            f"(operation {operation.id})"
+        )
+        return Response({
+            'success': True,
+            'action': operation.action,
+            'affected': operation.affected,
+            'operation_id': operation.id,
+        })
+    
+    def filter_bulk_queryset(self, filter_data, select_all=False):
+        """
+        Select leads with the list endpoint's filter and search parameters.
+        
+        Unless ``select_all`` is set, the filter must narrow the selection
+        (blank values are dropped by the filterset, so ``{"status": ""}``
+        alone would match every lead) and match at most
+        LeadBulkSerializer.MAX_FILTER_LEADS leads.
+        """
+        queryset = Lead.objects.all()
+        filter_data = dict(filter_data)
+        term = filter_data.pop(api_settings.SEARCH_PARAM, None)
+        
+        filterset_class = DjangoFilterBackend().get_filterset_class(self, queryset)
+        unknown = set(filter_data) - set(filterset_class.base_filters)
+        if unknown:
+            raise ValidationError({'filter': [f"Неизвестные фильтры: {', '.join(sorted(unknown))}"]})
+        filterset = filterset_class(data=filter_data, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise ValidationError({'filter': filterset.errors})
+        queryset = filterset.qs
+        
+        term = str(term or '').strip()
+        if term:
+            queryset = search_leads(queryset, term)
+        if select_all:
+            return queryset
+        
+        narrowed = term or any(
+            value not in EMPTY_VALUES for value in filterset.form.cleaned_data.values()
+        )
+        if not narrowed:
+            raise ValidationError({
+                'filter': ['Фильтр не ограничивает выборку. Чтобы выбрать все заявки, передайте "all": true']
+            })
+        limit = LeadBulkSerializer.MAX_FILTER_LEADS
+        if queryset.order_by()[:limit + 1].count() > limit:
+            raise ValidationError({
+                'filter': [f'Фильтр выбирает больше {limit} заявок. Уточните его или передайте "all": true']
+            })
+        return queryset
+    
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
         """
@@ -158,14 +323,23 @@ class LeadViewSet(viewsets.ModelViewSet):
         return response
 
 
+@streaming_uploads
 @api_view(['POST'])
 @permission_classes([AllowAny])
-@ratelimit(key='ip', rate='5/h', method='POST')
+@idempotent('contact_submit')
+@rate_limit('contact_submit')
 def contact_submit(request):
     """
     Public endpoint for submitting contact form.
     
-    Rate limited to 5 submissions per hour per IP.
+    Rate limited per IP across all workers (RATE_LIMITS['contact_submit'],
+    5 submissions per hour by default).
+    
+    Retries are safe with an `Idempotency-Key` header (or `idempotency_key`
+    form field): repeats of a completed submission get the stored response
+    with `Idempotent-Replayed: true` and create no lead or notifications;
+    a repeat while the first request is still running gets 409. Keys are
+    per client, and a key reused with different data gets 422.
     
     POST data:
         - name: str (required)
@@ -175,13 +349,16 @@ def contact_submit(request):
         - product_type: str (required)
         - quantity: int (optional)
         - message: str (optional)
-        - file: file (optional)
+        - file: file (optional, streamed to disk and checked while uploading)
         - language: str (default: 'ru')
         - source: str (optional)
+        - session_id: str (optional) - Analytics session the form was sent from
     
     Returns:
         201: Lead created successfully
         400: Validation error
+        409: Same idempotency key still being processed
+        422: Idempotency key reused with different data
         429: Rate limit exceeded
         500: Server error
     """
@@ -198,12 +375,30 @@ def contact_submit(request):
                     'details': {}
                 }
             },
-            status=status.HTTP_429_TOO_MANY_REQUESTS
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(math.ceil(request.retry_after))}
         )
     
     try:
+        # Parsing the body runs the streaming upload handler
+        data = request.data
+        upload_error = getattr(request, 'upload_error', None)
+        if upload_error:
+            logger.warning(f"Rejected upload in contact form: {upload_error}")
+            return Response(
+                {
+                    'success': False,
+                    'error': {
+                        'code': 400,
+                        'message': 'Ошибка валидации данных',
+                        'details': {'file': [upload_error]}
+                    }
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         # Create serializer with request data
-        serializer = LeadCreateSerializer(data=request.data)
+        serializer = LeadCreateSerializer(data=data)
         
         if serializer.is_valid():
             # Save lead with additional metadata using atomic transaction
@@ -213,24 +408,29 @@ def contact_submit(request):
                     user_agent=get_user_agent(request),
                 )
             
-            # Send notifications asynchronously (you can use Celery in production)
-            # Don't fail the request if notifications fail
-            try:
-                send_lead_notification(lead)
-            except Exception as e:
-                logger.error(f"Failed to send email notification for lead {lead.id}: {str(e)}")
-            
-            try:
-                send_auto_reply(lead)
-            except Exception as e:
-                logger.error(f"Failed to send auto-reply for lead {lead.id}: {str(e)}")
-            
-            try:
-                send_telegram_notification(lead)
-            except Exception as e:
-                logger.error(f"Failed to send Telegram notification for lead {lead.id}: {str(e)}")
-            
-            logger.info(f"New lead created: {lead.id} from {lead.company}")
+            if lead.status == 'spam':
+                # Stored for review and training, but nobody is notified.
+                # The client gets the usual answer so spammers learn nothing.
+                logger.info(f"Spam lead stored: {lead.id} (score {lead.spam_score:.3f})")
+            else:
+                # Send notifications asynchronously (you can use Celery in production)
+                # Don't fail the request if notifications fail
+                try:
+                    send_lead_notification(lead)
+                except Exception as e:
+                    logger.error(f"Failed to send email notification for lead {lead.id}: {str(e)}")
+                
+                try:
+                    send_auto_reply(lead)
+                except Exception as e:
+                    logger.error(f"Failed to send auto-reply for lead {lead.id}: {str(e)}")
+                
+                try:
+                    send_telegram_notification(lead)
+                except Exception as e:
+                    logger.error(f"Failed to send Telegram notification for lead {lead.id}: {str(e)}")
+                
+                logger.info(f"New lead created: {lead.id} from {lead.company}")
             
             return Response(
                 {
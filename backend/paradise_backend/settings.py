@@ -6,6 +6,7 @@ logging, and performance optimizations.
 """
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 import environ
 import os
 import logging.config
@@ -67,6 +68,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise (after SecurityMiddleware)
     'corsheaders.middleware.CorsMiddleware',  # CORS (before CommonMiddleware)
+    'core.middleware.AdmissionControlMiddleware',  # Load shedding (after CORS so shed responses keep CORS headers)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -112,6 +114,61 @@ if 'postgresql' in DATABASES['default'].get('ENGINE', ''):
     }
 
 
+# Cache
+# File-based by default so every gunicorn worker shares the same entries
+CACHES = {
+    'default': env.cache('CACHE_URL', default=f'filecache://{BASE_DIR / "var" / "cache"}')
+}
+# Cached API responses (content API); entries are invalidated when the data changes
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=24 * 3600)
+# How long the last good response is kept to serve while the database is down
+RESPONSE_CACHE_STALE_TIMEOUT = env.int('RESPONSE_CACHE_STALE_TIMEOUT', default=7 * 24 * 3600)
+# Cache generations (one small file per namespace, shared by the workers of the host)
+RESPONSE_CACHE_GENERATION_DIR = env('RESPONSE_CACHE_GENERATION_DIR', default=str(BASE_DIR / 'var' / 'generations'))
+# Published catalog pre-serialized per language, memory-mapped by every worker
+CATALOG_SNAPSHOT_PATH = env('CATALOG_SNAPSHOT_PATH', default=str(BASE_DIR / 'var' / 'catalog.snapshot'))
+
+
+# Rate limiting
+# Token buckets in a SQLite WAL database shared by all worker processes
+RATE_LIMIT_ENABLED = env.bool('RATE_LIMIT_ENABLED', default=True)
+RATE_LIMIT_DB = env('RATE_LIMIT_DB', default=str(BASE_DIR / 'var' / 'ratelimit.sqlite3'))
+# Budgets per client IP: '<count>/<period>', period in s, m, h or d (e.g. '100/10m')
+RATE_LIMITS = {
+    'contact_submit': env('CONTACT_SUBMIT_RATE_LIMIT', default='5/h'),
+    'track_event': env('TRACK_EVENT_RATE_LIMIT', default='120/m'),
+}
+
+
+# Admission control (per worker)
+# Above the "sample" thresholds only SAMPLE_RATE of analytics events are
+# stored; above the "shed" thresholds all of them are dropped with a 204.
+# The contact form is never shed. Queue time needs the proxy to set
+# X-Request-Start; it is the signal for sync gunicorn workers, which serve
+# one request at a time, so the in-flight thresholds only apply to
+# threaded or async workers.
+ADMISSION_CONTROL = {
+    'ENABLED': env.bool('ADMISSION_CONTROL_ENABLED', default=True),
+    'LATENCY_SAMPLE_MS': env.float('ADMISSION_LATENCY_SAMPLE_MS', default=50.0),  # Average DB query time
+    'LATENCY_SHED_MS': env.float('ADMISSION_LATENCY_SHED_MS', default=200.0),
+    'QUEUE_SAMPLE_MS': env.float('ADMISSION_QUEUE_SAMPLE_MS', default=100.0),  # Average wait since X-Request-Start
+    'QUEUE_SHED_MS': env.float('ADMISSION_QUEUE_SHED_MS', default=500.0),
+    'IN_FLIGHT_SAMPLE': env.int('ADMISSION_IN_FLIGHT_SAMPLE', default=8),  # Concurrent requests per worker
+    'IN_FLIGHT_SHED': env.int('ADMISSION_IN_FLIGHT_SHED', default=16),
+    'SAMPLE_RATE': env.float('ADMISSION_SAMPLE_RATE', default=0.25),
+    'RECOVERY_RATIO': env.float('ADMISSION_RECOVERY_RATIO', default=0.7),  # Load must drop below thresholds x ratio
+    'MIN_DWELL_SECONDS': env.float('ADMISSION_MIN_DWELL_SECONDS', default=5.0),  # Minimum time before stepping down
+    'LATENCY_ALPHA': 0.1,
+    'SHEDDABLE_PATHS': ['/api/analytics/track/'],
+    'PROTECTED_PATHS': ['/api/leads/submit/'],
+}
+
+
+# Idempotency keys
+# Responses to requests with an Idempotency-Key are replayed for this long (seconds)
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=86400)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -160,6 +217,8 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files (uploads)
 MEDIA_URL = env('MEDIA_URL', default='/media/')
 MEDIA_ROOT = BASE_DIR / 'media'
+# Widths of the WebP/JPEG variants generated for catalog images (see content.images)
+IMAGE_VARIANT_WIDTHS = env.list('IMAGE_VARIANT_WIDTHS', cast=int, default=[160, 320, 640, 1024, 1600])
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -202,6 +261,9 @@ CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After']
+
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -220,13 +282,22 @@ TELEGRAM_CHAT_ID = env('TELEGRAM_CHAT_ID', default='')
 
 
 # File Upload Settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = env.int('FILE_UPLOAD_MAX_MEMORY_SIZE', 10485760)  # 10MB
+# Uploads above this size are streamed to a temporary file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = env.int('FILE_UPLOAD_MAX_MEMORY_SIZE', 2621440)  # 2.5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = env.int('DATA_UPLOAD_MAX_MEMORY_SIZE', 10485760)  # 10MB
 
 ALLOWED_UPLOAD_EXTENSIONS = ['.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.gif']
 
-# Rate limiting
-RATE_LIMIT_CONTACT_FORM = env.int('RATE_LIMIT_CONTACT_FORM', 5)  # requests per hour
+# Contact form attachments (streamed, checked while uploading, stored by SHA-256)
+LEAD_FILE_MAX_SIZE = env.int('LEAD_FILE_MAX_SIZE', 10485760)  # 10MB
+
+# Lead normalization and duplicate detection
+DEFAULT_PHONE_COUNTRY_CODE = env('DEFAULT_PHONE_COUNTRY_CODE', default='998')  # Uzbekistan
+LEAD_DUPLICATE_COMPANY_SIMILARITY = env.float('LEAD_DUPLICATE_COMPANY_SIMILARITY', 0.6)  # trigram Jaccard
+
+# Spam filtering (train with: python manage.py train_spam_model)
+LEAD_SPAM_MODEL_PATH = env('LEAD_SPAM_MODEL_PATH', default=str(BASE_DIR / 'var' / 'spam_model.json'))
+LEAD_SPAM_THRESHOLD = env.float('LEAD_SPAM_THRESHOLD', 0.9)  # spam probability above which notifications are skipped
 
 
 # Security Settings